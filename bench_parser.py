@@ -0,0 +1,139 @@
+#Microbenchmark for the serial line parser.
+#Replays the captured logs under "CSV Exports/" through the old if/elif chain and
+#the compiled LineParser, and reports how much headroom each has at common baud rates.
+#
+#usage: python bench_parser.py [--repeat N] [--dir "CSV Exports"]
+import argparse
+import time
+from datetime import datetime
+
+from bms_parser import LineParser, split_line
+from bms_synth import EXPORT_DIR, export_lines
+
+#8N1 framing: 10 bits on the wire per byte
+BAUD_RATES = [115200, 230400, 460800, 921600]
+
+
+def legacy_parse(line):
+    #The original SerialMonitor.populate_cells chain, kept as the baseline
+    cells_update = {}
+    if (("cell" in line) and ("volt" in line) and (not "dev" in line) and (not "pack" in line)):
+        cells_update['volt' + line[1]] = line[3]
+    elif (('mean' in line) and ('cell' in line) and ('voltage' in line)):
+        cells_update['mean_cell_voltage'] = line[7]
+        cells_update['pack_volt'] = line[3]
+    elif ("term" in line):
+        cells_update['term_volt'] = line[2]
+    elif ("drain" in line):
+        cells_update['drain_volt'] = line[2]
+    elif (("current" in line) and (not 'Charging' in line)):
+        cells_update['current'] = line[2]
+    elif (("soc" in line) and (not "zp" in line) and (not "total" in line)):
+        cells_update[line[0] + line[1]] = line[3]
+    elif (("total" in line) and ("soc" in line) and (not 'volt' in line)):
+        cells_update['total_soc'] = line[2]
+        cells_update['time_remaining'] = line[7]
+        cells_update['capacity'] = line[4]
+    elif ('deviation' in line):
+        cells_update['temperature_gradient'] = line[3]
+        cells_update['mean_temp'] = line[6]
+    elif ('Vsafe' in line):
+        cells_update['Vsafe'] = line[1].partition('=')[2]
+    elif ('Charging' in line):
+        cells_update['Charging_Mode'] = line[2]
+        cells_update['max_current'] = line[5].partition('=')[2]
+        cells_update['Vbus'] = line[3].partition('=')[2]
+    elif ("adc" in line):
+        cells_update[line[0] + line[1]] = line[3]
+    elif ('DTC' in line):
+        cells_update['Error_Codes'] = line[1]
+    return cells_update
+
+
+def legacy_populate(cells, cells_update):
+    #Per-line bookkeeping the reader thread used to do around the chain
+    def populate(line):
+        cells_update['Timestamp'] = datetime.now().strftime("%m-%d-%y-%H:%M:%S")
+        cells_update.update(legacy_parse(line))
+        if not (cells == cells_update):
+            cells.update(cells_update)
+    return populate
+
+
+def compiled_populate(cells, parser):
+    #Same bookkeeping as SerialMonitor.populate_cells does it now
+    stamp = [None]
+    def populate(line):
+        now = int(time.time())
+        if now != stamp[0]:
+            stamp[0] = now
+            cells['Timestamp'] = datetime.fromtimestamp(now).strftime("%m-%d-%y-%H:%M:%S")
+        changed = False
+        for field, value in parser.parse(line):
+            if cells.get(field) != value:
+                cells[field] = value
+                changed = True
+        return changed
+    return populate
+
+
+def check(lines, parser):
+    #Both parsers must agree on every line before their timings mean anything.
+    #Lines with corrupted numbers are rejected by the compiled parser (the old
+    #chain stored them as-is), so those are only counted.
+    for raw in lines:
+        tokens = split_line(raw)
+        errors = parser.errors
+        expected = {field: str(value) for field, value in legacy_parse(tokens).items()}
+        got = {field: str(value) for field, value in parser.parse(tokens)}
+        if expected != got and parser.errors == errors:
+            raise SystemExit(f"Parser mismatch on {raw!r}: {expected} != {got}")
+    return parser.errors
+
+
+def run(name, parse, lines, repeat):
+    tokenised = [split_line(raw) for raw in lines]
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for tokens in tokenised:
+            parse(tokens)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return name, len(lines) / best
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmark the BMS line parser against the captured logs")
+    argparser.add_argument("--dir", default=EXPORT_DIR, help="directory of CSV exports to replay")
+    argparser.add_argument("--repeat", type=int, default=20, help="passes over the replayed lines")
+    argparser.add_argument("--scale", type=int, default=100, help="copies of the captured logs per pass")
+    args = argparser.parse_args()
+
+    lines = export_lines(args.dir)
+    if not lines:
+        raise SystemExit(f"No CSV exports found in {args.dir!r}")
+    parser = LineParser()
+    rejected = check(lines, parser)
+    lines = lines * args.scale
+    bytes_per_line = sum(len(raw) for raw in lines) / len(lines)
+
+    print(f"{len(lines)} lines, {bytes_per_line:.1f} bytes/line on average, {rejected * args.scale} malformed")
+    header = "parser".ljust(12) + "lines/s".rjust(12) + "".join(f"{baud:>10}" for baud in BAUD_RATES)
+    print(header)
+    results = [
+        run("legacy", legacy_parse, lines, args.repeat),
+        run("compiled", parser.parse, lines, args.repeat),
+        #Parsing plus timestamping and change detection, i.e. populate_cells
+        run("legacy+", legacy_populate({}, {}), lines, args.repeat),
+        run("compiled+", compiled_populate({}, parser), lines, args.repeat),
+    ]
+    for name, rate in results:
+        #Headroom = how many times faster than the line rate the link can deliver
+        headroom = [rate / (baud / 10 / bytes_per_line) for baud in BAUD_RATES]
+        print(name.ljust(12) + f"{rate:12.0f}" + "".join(f"{h:9.1f}x" for h in headroom))
+
+
+if __name__ == "__main__":
+    main()
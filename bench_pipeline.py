@@ -0,0 +1,252 @@
+#Benchmark of the acquisition hot path, stage by stage.
+#Synthetic BMS sessions are read from a replayed port in byte chunks and pushed
+#through engine.feed like the reader thread does: read -> decode (StreamDecoder,
+#text lines or binary frames) -> handle_line / handle_record (parse, cells, raw
+#log, queue) -> write_to_parsed_log, then update_data and the log flush, timing
+#every call. The engine's stages are timed by wrapping them on the instance, so
+#feed nests decode and the handlers, and the handlers nest write_to_parsed_log.
+#
+#usage: python bench_pipeline.py [--frames N] [--cells N] [--binary] [--chunk BYTES] [--json results.json]
+#
+#Reports p50/p90/p99/max latency per stage, end-to-end lines (or frames) and bytes
+#per second and peak traced memory. --json writes the same numbers for comparing releases.
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+
+from bms_display import CELL_SCHEMA, DISPLAY_SCHEMA, FieldBindings
+from bms_engine import AcquisitionEngine
+from bms_parser import CELL_COUNT, make_fields
+from bms_pipeline import TelemetryQueue
+from bms_replay import ReplaySerial, to_binary
+from bms_synth import synthetic_lines
+
+STAGES = ['read', 'feed', 'decode', 'handle_line', 'handle_record', 'write_to_parsed_log', 'update_data', 'log_flush']
+#Engine methods timed in place, (stage, path from the engine)
+ENGINE_STAGES = (
+    ('decode', 'decoder.feed'),
+    ('handle_line', 'handle_line'),
+    ('handle_record', 'handle_record'),
+    ('write_to_parsed_log', 'write_to_parsed_log'),
+)
+#Bytes per read; a busy port at 115200 baud has a few hundred bytes waiting per read
+CHUNK_BYTES = 512
+#Bytes per GUI frame and per logger flush, roughly what 115200 baud gives at 20 fps / 1 s
+BYTES_PER_FRAME = 576
+BYTES_PER_FLUSH = 11520
+
+
+class _NullLabel:
+    #Stands in for a Tk label so update_data can run without a display
+    def configure(self, **options):
+        pass
+
+
+class _NullTable:
+    #Stands in for a bms_celltable.CellTable
+    def __init__(self):
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def resize(self, count):
+        self.count = count
+
+    def setter(self, index):
+        return lambda value: None
+
+
+def _bindings(cells):
+    owner = SimpleNamespace(**{attribute: _NullLabel() for _, attribute, _ in DISPLAY_SCHEMA})
+    for _, attribute in CELL_SCHEMA:
+        setattr(owner, attribute, _NullTable())
+    bindings = FieldBindings(owner)
+    bindings.bind_pack(owner, make_fields(cells, cells))
+    bindings.bind('Error_Codes', lambda codes: None)
+    return bindings
+
+
+def stream(lines, binary=False):
+    #The session as the bytes the board sends, text lines or one binary frame per cycle
+    stamped = [(0.0, line) for line in lines]
+    if binary:
+        return b''.join(frame for _, frame in to_binary(stamped))
+    return ''.join(lines).encode("utf-8")
+
+
+def _chunks(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def _timed(timings, function):
+    clock = time.perf_counter_ns
+
+    def timed(*args):
+        start = clock()
+        try:
+            return function(*args)
+        finally:
+            timings.append(clock() - start)
+    return timed
+
+
+def _instrument(engine, timings):
+    for stage, path in ENGINE_STAGES:
+        *parents, attribute = path.split('.')
+        owner = engine
+        for parent in parents:
+            owner = getattr(owner, parent)
+        setattr(owner, attribute, _timed(timings[stage], getattr(owner, attribute)))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_pipeline(data, output, timings=None, cells=CELL_COUNT, chunk=CHUNK_BYTES):
+    #One pass over data; with timings (stage -> list) every stage call is timed in ns
+    chunks = _chunks(data, chunk)
+    queue = TelemetryQueue(capacity=len(data) // 8 + 1)
+    #Alarm and DTC events go to the queue like in the GUI, not to stderr.
+    #delta_t 0 logs every frame, which is the worst case for the logger.
+    engine = AcquisitionEngine(delta_t=0, output=output, queue=queue)
+    engine.start_logging(background=False)
+    bindings = _bindings(cells)
+    source = ReplaySerial([(0.0, piece) for piece in chunks], speed=0, timeout=0)
+    clock = time.perf_counter_ns
+    timed = timings is not None
+    if timed:
+        _instrument(engine, timings)
+    frame_bytes = flush_bytes = 0
+
+    for piece in chunks:
+        t0 = clock() if timed else 0
+        received = source.read(len(piece))
+        t1 = clock() if timed else 0
+        engine.feed(received)
+        t2 = clock() if timed else 0
+        if timed:
+            timings['read'].append(t1 - t0)
+            timings['feed'].append(t2 - t1)
+
+        frame_bytes += len(received)
+        flush_bytes += len(received)
+        if frame_bytes >= BYTES_PER_FRAME:
+            frame_bytes = 0
+            t0 = clock() if timed else 0
+            carry, items = queue.drain()
+            bindings.update(carry)
+            for _, _, item_changes in items:
+                bindings.update(item_changes)
+            bindings.flush()
+            if timed:
+                timings['update_data'].append(clock() - t0)
+        if flush_bytes >= BYTES_PER_FLUSH:
+            flush_bytes = 0
+            t0 = clock() if timed else 0
+            for log in engine.logs():
+                log.pump()
+            if timed:
+                timings['log_flush'].append(clock() - t0)
+    engine.stop_logging()
+    return engine
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmark the BMS acquisition pipeline")
+    argparser.add_argument("--frames", type=int, default=2000, help="synthetic BMS report cycles")
+    argparser.add_argument("--cells", type=int, default=CELL_COUNT, help="cells (and temperature sensors) of the pack")
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument("--binary", action="store_true", help="send the session as binary frames instead of text")
+    argparser.add_argument("--chunk", type=int, default=CHUNK_BYTES, help="bytes per read (default: %(default)s)")
+    argparser.add_argument("--repeat", type=int, default=3, help="untimed end-to-end passes, best is reported")
+    argparser.add_argument("--json", default=None, help="write machine-readable results here")
+    args = argparser.parse_args()
+
+    lines = synthetic_lines(args.frames, args.seed, args.cells)
+    data = stream(lines, args.binary)
+    output = tempfile.mkdtemp(prefix="bms_bench_")
+    try:
+        #Per-stage latencies
+        timings = {stage: [] for stage in STAGES}
+        engine = run_pipeline(data, output, timings, args.cells, args.chunk)
+        items = engine.lines + engine.records
+
+        #End-to-end throughput without the timing overhead
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run_pipeline(data, output, cells=args.cells, chunk=args.chunk)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        #Peak memory, in its own pass because tracing slows everything down
+        tracemalloc.start()
+        run_pipeline(data, output, cells=args.cells, chunk=args.chunk)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(output, ignore_errors=True)
+
+    stages = {}
+    for stage in STAGES:
+        values = sorted(timings[stage])
+        stages[stage] = {
+            'calls': len(values),
+            'p50_us': percentile(values, 0.50) / 1000,
+            'p90_us': percentile(values, 0.90) / 1000,
+            'p99_us': percentile(values, 0.99) / 1000,
+            'max_us': (values[-1] if values else 0) / 1000,
+            'total_ms': sum(values) / 1e6,
+        }
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        revision = ''
+    results = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'frames': args.frames,
+        'cells': args.cells,
+        'binary': args.binary,
+        'chunk_bytes': args.chunk,
+        'lines': len(lines),
+        'bytes': len(data),
+        #Text lines or binary frames handled per second
+        'items': items,
+        'items_per_second': items / best,
+        'bytes_per_second': len(data) / best,
+        'peak_memory_bytes': peak,
+        'stages': stages,
+    }
+
+    unit = "frames" if args.binary else "lines"
+    print(f"{items} {unit}, {len(data)} bytes, {results['items_per_second']:.0f} {unit}/s, "
+          f"{results['bytes_per_second'] / 1e6:.2f} MB/s end to end, "
+          f"peak traced memory {peak / 1024:.0f} KiB")
+    print("stage".ljust(22) + "calls".rjust(8) + "p50 us".rjust(10) + "p90 us".rjust(10)
+          + "p99 us".rjust(10) + "max us".rjust(10) + "total ms".rjust(10))
+    for stage, row in stages.items():
+        print(stage.ljust(22) + f"{row['calls']:8d}{row['p50_us']:10.2f}{row['p90_us']:10.2f}"
+              f"{row['p99_us']:10.2f}{row['max_us']:10.1f}{row['total_ms']:10.1f}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
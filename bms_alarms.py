@@ -0,0 +1,171 @@
+#Alarm rules and DTC tracking, evaluated once per frame.
+#Each rule is (name, field, condition, trip, clear, debounce):
+#  condition  'above' / 'below' compare the field's value, 'rate_above' / 'rate_below'
+#             its change per minute since the previous frame
+#  trip       the alarm is raised once the condition holds past this value...
+#  clear      ...and cleared only once it is back beyond this one (hysteresis)
+#  debounce   seconds the new state has to hold before it is reported
+#The whole table is compiled into one generated function, like the parser's, that
+#only reports rules whose wanted state differs from their current one.
+#Event texts end up in the raw log, so they must not look like a BMS line to the
+#parser (no bare field names or "DTC" tokens).
+import json
+from collections import deque
+
+from bms_parser import STRING_FIELDS
+
+ALARM_RULES = (
+    ('cell_overvoltage', 'max_cell_volt', 'above', 36500, 36000, 2.0),
+    ('cell_undervoltage', 'min_cell_volt', 'below', 25000, 26000, 2.0),
+    ('cell_imbalance', 'cell_spread', 'above', 500, 300, 10.0),
+    ('overtemperature', 'temp_max', 'above', 60, 55, 5.0),
+    ('temperature_rise', 'temp_max', 'rate_above', 5, 2, 10.0),
+    ('charge_overcurrent', 'current', 'above', 20000, 18000, 1.0),
+    ('discharge_overcurrent', 'current', 'below', -30000, -27000, 1.0),
+    ('fast_voltage_drop', 'pack_dvdt', 'below', -1000, -500, 5.0),
+)
+
+CONDITIONS = ('above', 'below', 'rate_above', 'rate_below')
+#Error_Codes value meaning no DTC is set
+NO_CODES = ('', '0')
+
+
+def load_rules(path):
+    #JSON list of [name, field, condition, trip, clear, debounce]
+    with open(path) as file:
+        return tuple(tuple(rule) for rule in json.load(file))
+
+
+def check_rule(rule):
+    name, field, condition, trip, clear, debounce = rule
+    if condition not in CONDITIONS:
+        raise ValueError(f"{name}: unknown condition {condition!r}")
+    if field in STRING_FIELDS:
+        raise ValueError(f"{name}: {field} is not numeric")
+    rising = condition.endswith('above')
+    if (rising and clear > trip) or (not rising and clear < trip):
+        raise ValueError(f"{name}: clear level must be on the safe side of the trip level")
+    return name, field, condition, float(trip), float(clear), float(debounce)
+
+
+def compile_checks(rules):
+    #Generates check(values, previous, per_minute, active) -> indexes of the rules
+    #whose condition disagrees with active[index]
+    source = ["def check(values, previous, per_minute, active):",
+              "    hits = []",
+              "    get = values.get",
+              "    last = previous.get"]
+    for index, (_, field, condition, trip, clear, _) in enumerate(rules):
+        rising = condition.endswith('above')
+        raised, cleared = ('>', '<') if rising else ('<', '>')
+        source.append(f"    x = get({field!r})")
+        if condition.startswith('rate'):
+            source.append(f"    y = last({field!r})")
+            source.append("    if x is not None and y is not None and per_minute:")
+            source.append("        x = (x - y) * per_minute")
+        else:
+            source.append("    if x is not None:")
+        source.append(f"        if active[{index}]:")
+        source.append(f"            if x {cleared} {clear!r}:")
+        source.append(f"                hits.append({index})")
+        source.append(f"        elif x {raised} {trip!r}:")
+        source.append(f"            hits.append({index})")
+    source.append("    return hits")
+    namespace = {}
+    exec(compile('\n'.join(source), '<bms alarms>', 'exec'), namespace)
+    return namespace['check']
+
+
+def parse_codes(text):
+    if text is None or text in NO_CODES:
+        return frozenset()
+    return frozenset(code for code in text.replace(',', ' ').split() if code != '0')
+
+
+class AlarmEngine:
+    def __init__(self, rules=ALARM_RULES, history=1000):
+        self.rules = [check_rule(rule) for rule in rules]
+        self._check = compile_checks(self.rules)
+        self.active = [False] * len(self.rules)
+        #rule index -> monotonic time its new state was first seen
+        self.pending = {}
+        #rule name -> epoch second raised, for the active ones
+        self.raised = {}
+        #DTCs currently set, when each was set this time, first seen ever and last cleared (epoch seconds)
+        self.error_codes = set()
+        self.since = {}
+        self.first_seen = {}
+        self.cleared = {}
+        self.last_codes = None
+        #(epoch second, 'raised' / 'cleared', name, message), newest last
+        self.events = deque(maxlen=history)
+        #Bumped on every event so displays know when to redraw, with an immutable
+        #copy of active_alarms() that other threads can read
+        self.version = 0
+        self.summary = ()
+        self.previous = {}
+        self.previous_time = None
+
+    def check(self, frame):
+        #Evaluates every rule against one frame; returns the events it caused
+        values = frame.values
+        now = frame.monotonic
+        per_minute = 0
+        if self.previous_time is not None and now > self.previous_time:
+            per_minute = 60 / (now - self.previous_time)
+        hits = self._check(values, self.previous, per_minute, self.active)
+        self.previous = values
+        self.previous_time = now
+
+        events = []
+        pending = self.pending
+        if pending:
+            #Rules that went back to their current state before the debounce ran out
+            for index in [index for index in pending if index not in hits]:
+                del pending[index]
+        for index in hits:
+            since = pending.setdefault(index, now)
+            name, field, condition, trip, clear, debounce = self.rules[index]
+            if now - since < debounce:
+                continue
+            del pending[index]
+            state = not self.active[index]
+            self.active[index] = state
+            value = values.get(field)
+            if state:
+                self.raised[name] = frame.timestamp
+                text = f"ALARM {name}: {field}={value} {condition.replace('_', ' ')} {trip:g}"
+            else:
+                self.raised.pop(name, None)
+                text = f"Cleared {name}: {field}={value} back past {clear:g}"
+            events.append((frame.timestamp, 'raised' if state else 'cleared', name, text))
+
+        codes = values.get('Error_Codes')
+        if codes != self.last_codes:
+            self.last_codes = codes
+            events += self._update_codes(parse_codes(codes), frame.timestamp)
+
+        if events:
+            self.events.extend(events)
+            self.summary = tuple(self.active_alarms())
+            self.version += 1
+        return events
+
+    def _update_codes(self, codes, timestamp):
+        events = []
+        for code in sorted(codes - self.error_codes):
+            self.first_seen.setdefault(code, timestamp)
+            self.since[code] = timestamp
+            events.append((timestamp, 'raised', 'DTC ' + code, f"Error code {code} set"))
+        for code in sorted(self.error_codes - codes):
+            self.cleared[code] = timestamp
+            self.since.pop(code, None)
+            events.append((timestamp, 'cleared', 'DTC ' + code, f"Error code {code} cleared"))
+        self.error_codes.clear()
+        self.error_codes.update(codes)
+        return events
+
+    def active_alarms(self):
+        #(name, epoch second raised) for every active rule and DTC
+        alarms = sorted(self.raised.items(), key=lambda item: item[1])
+        return alarms + [('DTC ' + code, self.since[code]) for code in sorted(self.error_codes)]
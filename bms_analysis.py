@@ -0,0 +1,275 @@
+#Offline analysis of logged sessions.
+#CSV exports (and columnar sessions) are loaded into numpy arrays, one file per
+#worker process, and reduced to a handful of per-session statistics:
+#cell imbalance, temperature spread, SOC drift, coulomb count and charge-mode segments.
+#
+#usage: python bms_analysis.py ["CSV Exports" | files ...] [--workers N] [--json results.json]
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from bms_parser import STRING_FIELDS
+from bms_columnar import CSV_TIMESTAMP_FORMAT, SESSION_EXT, open_session
+from bms_rollup import is_rollup
+from bms_synth import pack_size
+
+#Raw cell voltage the BMS reports for a cell it can't measure
+INVALID_VOLT = 65535
+#Raw units -> V / % as shown in the GUI; current is already mA
+VOLT_SCALE = 10000
+SOC_SCALE = 10
+#Rows further apart than this are treated as a gap in the recording and not integrated
+MAX_GAP = 60
+#|current| below this (mA) counts as idle for segmentation
+IDLE_CURRENT = 50
+
+
+def _numbers(texts):
+    #Column of CSV text as float64, NaN for blanks and garbage
+    values = np.array(texts)
+    try:
+        return np.where(values == '', 'nan', values).astype(np.float64)
+    except ValueError:
+        out = np.empty(len(texts))
+        for i, text in enumerate(texts):
+            try:
+                out[i] = float(text)
+            except ValueError:
+                out[i] = np.nan
+        return out
+
+
+def load_csv(path):
+    #{'timestamps': int64 epoch seconds, field: float64 or list of str}
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None) or []
+        rows = [row for row in reader if row]
+    width = len(header)
+    rows = [row[:width] + [''] * (width - len(row)) for row in rows]
+    columns = list(zip(*rows)) if rows else [()] * width
+    data = {}
+    stamps = {}
+    for name, texts in zip(header, columns):
+        if name == 'Timestamp':
+            out = np.zeros(len(texts), np.int64)
+            for i, text in enumerate(texts):
+                stamp = stamps.get(text)
+                if stamp is None:
+                    try:
+                        stamp = int(time.mktime(datetime.strptime(text, CSV_TIMESTAMP_FORMAT).timetuple()))
+                    except ValueError:
+                        stamp = out[i - 1] if i else 0
+                    stamps[text] = stamp
+                out[i] = stamp
+            data['timestamps'] = out
+        elif name in STRING_FIELDS:
+            data[name] = [text or None for text in texts]
+        else:
+            data[name] = _numbers(texts)
+    data.setdefault('timestamps', np.zeros(len(rows), np.int64))
+    return data
+
+
+def load_session(path):
+    #Same shape as load_csv, from a columnar session
+    session = open_session(path)
+    data = {'timestamps': np.asarray(session.timestamps, np.int64)}
+    for field in session.fields:
+        if field in session.encoded:
+            data[field] = session.values(field)
+        else:
+            values = np.asarray(session.column(field), np.float64)
+            values[values == session.missing] = np.nan
+            data[field] = values
+    return data
+
+
+def load(path):
+    if path.rstrip('/\\').endswith(SESSION_EXT):
+        return load_session(path)
+    return load_csv(path)
+
+
+def pack_fields(fields):
+    #(cell voltage, temperature, cell SOC) fields of the pack a file's columns describe,
+    #so 16s and 24s logs are analysed over all their cells
+    cells, sensors = pack_size(fields)
+    return (['volt' + str(i) for i in range(cells)], ['adc' + str(i) for i in range(sensors)],
+            ['soc' + str(i) for i in range(cells)])
+
+
+def _matrix(data, fields):
+    #rows x fields, NaN where a column is missing
+    rows = len(data['timestamps'])
+    return np.column_stack([data.get(field, np.full(rows, np.nan)) for field in fields]) if rows else np.empty((0, len(fields)))
+
+
+def _summary(values):
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return None
+    return {'min': float(values.min()), 'mean': float(values.mean()), 'max': float(values.max())}
+
+
+def segments(data):
+    #Runs of the same (charging mode, direction) as dicts with start/end/rows/charge
+    stamps = data['timestamps']
+    if not len(stamps):
+        return []
+    current = data.get('current', np.full(len(stamps), np.nan))
+    direction = np.where(np.isnan(current), 0, np.sign(current) * (np.abs(current) >= IDLE_CURRENT)).astype(np.int8)
+    modes = data.get('Charging_Mode') or [None] * len(stamps)
+    codes = {}
+    mode_codes = np.array([codes.setdefault(mode, len(codes)) for mode in modes], np.int32)
+    names = {code: mode for mode, code in codes.items()}
+    #Segment boundaries wherever mode or direction changes, or the recording has a gap
+    change = (np.diff(mode_codes) != 0) | (np.diff(direction) != 0) | (np.diff(stamps) > MAX_GAP)
+    starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+    ends = np.concatenate((starts[1:], [len(stamps)]))
+    charge = coulombs(stamps, current, cumulative=True)
+    labels = {1: 'charging', -1: 'discharging', 0: 'idle'}
+    return [{
+        'mode': names[int(mode_codes[start])],
+        'direction': labels[int(direction[start])],
+        'start': int(stamps[start]),
+        'end': int(stamps[end - 1]),
+        'rows': int(end - start),
+        'charge_mAh': float(charge[end - 1] - charge[start]),
+    } for start, end in zip(starts, ends)]
+
+
+def coulombs(stamps, current, cumulative=False):
+    #Trapezoidal integral of current (mA) over time in mAh; gaps over MAX_GAP and NaN are skipped
+    if len(stamps) < 2:
+        return np.zeros(len(stamps)) if cumulative else 0.0
+    dt = np.diff(stamps).astype(np.float64)
+    dt[(dt > MAX_GAP) | (dt < 0)] = 0
+    average = (current[1:] + current[:-1]) / 2
+    steps = np.where(np.isnan(average), 0, average) * dt / 3600
+    if cumulative:
+        return np.concatenate(([0.0], np.cumsum(steps)))
+    return float(steps.sum())
+
+
+def analyze(data):
+    stamps = data['timestamps']
+    rows = len(stamps)
+    result = {'rows': rows}
+    if not rows:
+        return result
+    result['start'] = int(stamps[0])
+    result['end'] = int(stamps[-1])
+    result['duration_s'] = int(stamps[-1] - stamps[0])
+    volt_fields, temp_fields, soc_fields = pack_fields(data)
+    result['cells'] = len(volt_fields)
+    result['sensors'] = len(temp_fields)
+
+    volts = _matrix(data, volt_fields)
+    volts[volts >= INVALID_VOLT] = np.nan
+    valid = ~np.isnan(volts).all(axis=1)
+    imbalance = np.full(rows, np.nan)
+    imbalance[valid] = (np.nanmax(volts[valid], axis=1) - np.nanmin(volts[valid], axis=1)) / VOLT_SCALE
+    result['imbalance_V'] = _summary(imbalance)
+    if valid.any():
+        #Which cell is lowest most often
+        weakest = np.bincount(np.nanargmin(volts[valid], axis=1), minlength=len(volt_fields))
+        result['weakest_cell'] = int(weakest.argmax())
+
+    temps = _matrix(data, temp_fields)
+    valid = ~np.isnan(temps).all(axis=1)
+    spread = np.full(rows, np.nan)
+    spread[valid] = np.nanmax(temps[valid], axis=1) - np.nanmin(temps[valid], axis=1)
+    result['temp_spread'] = _summary(spread)
+    result['temp_max'] = float(np.nanmax(temps)) if valid.any() else None
+
+    socs = _matrix(data, soc_fields) / SOC_SCALE
+    valid = ~np.isnan(socs).all(axis=1)
+    if valid.any():
+        #Deviation of each cell from the pack mean, first vs last valid row
+        deviation = socs[valid] - np.nanmean(socs[valid], axis=1, keepdims=True)
+        result['soc_drift_pct'] = [None if np.isnan(d) else round(float(d), 3) for d in deviation[-1] - deviation[0]]
+        result['soc_spread_pct'] = _summary(np.nanmax(socs[valid], axis=1) - np.nanmin(socs[valid], axis=1))
+
+    current = data.get('current', np.full(rows, np.nan))
+    result['charge_mAh'] = coulombs(stamps, current)
+    result['current_mA'] = _summary(current)
+    result['segments'] = segments(data)
+    return result
+
+
+def analyze_path(path):
+    #Worker side: load and reduce in the same process so only the summary comes back
+    started = time.perf_counter()
+    try:
+        result = analyze(load(path))
+    except (OSError, ValueError) as e:
+        result = {'error': str(e)}
+    result['path'] = path
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def find_sessions(paths):
+    #Expands directories into the CSV exports and columnar sessions inside them
+    found = []
+    for path in paths:
+        if os.path.isdir(path) and not path.rstrip('/\\').endswith(SESSION_EXT):
+            found += sorted(name for name in glob.glob(os.path.join(path, "*.csv")) if not is_rollup(name))
+            found += sorted(glob.glob(os.path.join(path, "*" + SESSION_EXT)))
+        else:
+            found.append(path)
+    return found
+
+
+def analyze_files(paths, workers=None):
+    #One result dict per file, in order; workers=1 runs in this process
+    if workers == 1 or len(paths) < 2:
+        return [analyze_path(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(analyze_path, paths, chunksize=max(1, len(paths) // (4 * (workers or os.cpu_count() or 1)))))
+
+
+def _fmt(summary, key='max', digits=3):
+    return '-' if not summary else f"{summary[key]:.{digits}f}"
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Statistics over logged BMS sessions")
+    argparser.add_argument("paths", nargs="*", default=["CSV Exports"], help="files or directories (default: CSV Exports)")
+    argparser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    argparser.add_argument("--json", default=None, help="write the full results here")
+    args = argparser.parse_args()
+
+    paths = find_sessions(args.paths)
+    started = time.perf_counter()
+    results = analyze_files(paths, args.workers)
+    elapsed = time.perf_counter() - started
+
+    print("file".ljust(36) + "rows".rjust(7) + "imb max V".rjust(11) + "dT max".rjust(8)
+          + "charge mAh".rjust(12) + "segments".rjust(10) + "  weakest")
+    for result in results:
+        name = os.path.basename(result['path'].rstrip('/\\'))
+        if 'error' in result:
+            print(f"{name[:35].ljust(36)}  error: {result['error']}")
+            continue
+        print(name[:35].ljust(36) + f"{result['rows']:7d}" + _fmt(result.get('imbalance_V')).rjust(11)
+              + _fmt(result.get('temp_spread'), digits=0).rjust(8) + f"{result.get('charge_mAh', 0):12.1f}"
+              + f"{len(result.get('segments', [])):10d}" + f"  {result.get('weakest_cell', '-')}")
+    rows = sum(result.get('rows', 0) for result in results)
+    print(f"{len(results)} files, {rows} rows in {elapsed:.2f} s")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
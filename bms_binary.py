@@ -0,0 +1,148 @@
+#Binary framed BMS protocol, for firmware that streams full-rate telemetry.
+#One frame carries a whole report cycle:
+#  sync     2 bytes   A5 5A
+#  length   uint16    payload bytes
+#  payload  version, cells, sensors, DTC count (uint8 each), then one int32 per
+#           field in bms_parser.make_fields order, Charging_Mode as 4 ASCII bytes
+#           and the DTCs as uint16 each
+#  crc      uint16    CRC-16/CCITT (binascii.crc_hqx, initial 0xFFFF) of the payload
+#All integers are little endian. Frames are decoded in place from one reusable
+#buffer with struct.unpack_from; the result is the same (field, value) updates
+#the text parser produces, ending in Error_Codes so the frame assembler closes
+#the cycle on it.
+import struct
+from binascii import crc_hqx
+from functools import lru_cache
+
+from bms_parser import make_fields
+
+SYNC = b'\xa5\x5a'
+VERSION = 1
+HEADER = struct.Struct('<2sH')
+PREFIX = struct.Struct('<BBBB')
+CRC = struct.Struct('<H')
+CRC_INIT = 0xFFFF
+#Anything longer is a corrupt length, not a frame (a 64 cell pack is ~600 bytes)
+MAX_PAYLOAD = 4096
+MODE_FIELD = 'Charging_Mode'
+CODES_FIELD = 'Error_Codes'
+
+
+@lru_cache(maxsize=None)
+def _layout(cells, sensors):
+    #(Struct of the fixed fields, their names, index of the charging mode) for one pack size
+    fields = make_fields(cells, sensors)
+    fields.remove(CODES_FIELD)
+    fmt = '<' + ''.join('4s' if field == MODE_FIELD else 'i' for field in fields)
+    return struct.Struct(fmt), tuple(fields), fields.index(MODE_FIELD)
+
+
+def decode_payload(buffer, offset, length):
+    #(field, value) updates of the payload at buffer[offset:offset + length]
+    version, cells, sensors, count = PREFIX.unpack_from(buffer, offset)
+    if version != VERSION:
+        raise ValueError(f"unsupported frame version {version}")
+    layout, fields, mode = _layout(cells, sensors)
+    if PREFIX.size + layout.size + 2 * count != length:
+        raise ValueError("frame length doesn't match its pack size")
+    values = list(layout.unpack_from(buffer, offset + PREFIX.size))
+    values[mode] = values[mode].rstrip(b'\0').decode('ascii', 'replace')
+    updates = list(zip(fields, values))
+    codes = struct.unpack_from(f'<{count}H', buffer, offset + PREFIX.size + layout.size)
+    updates.append((CODES_FIELD, ','.join(map(str, codes)) if codes else '0'))
+    return updates
+
+
+def encode_frame(record, cells, sensors):
+    #One frame for a record of field -> value; used by replays, benchmarks and firmware tests
+    layout, fields, mode = _layout(cells, sensors)
+    values = []
+    for field in fields:
+        value = record.get(field)
+        if field == MODE_FIELD:
+            values.append(str(value or '').encode('ascii', 'replace')[:4])
+        else:
+            values.append(int(value or 0))
+    codes = [int(code) for code in str(record.get(CODES_FIELD) or '').replace(',', ' ').split() if code != '0']
+    payload = PREFIX.pack(VERSION, cells, sensors, len(codes)) + layout.pack(*values)
+    payload += struct.pack(f'<{len(codes)}H', *codes)
+    return HEADER.pack(SYNC, len(payload)) + payload + CRC.pack(crc_hqx(payload, CRC_INIT))
+
+
+class FrameDecoder:
+    #Finds and checks frames in a byte stream, keeping partial frames between feeds
+    def __init__(self):
+        self.buffer = bytearray()
+        #Counters
+        self.frames = 0
+        self.crc_errors = 0
+        self.bad_frames = 0
+        #Bytes skipped looking for a sync, in total and since the last good frame,
+        #and the skipped bytes themselves, so a stream that turns out to be text
+        #can be handed back to the line framer
+        self.skipped = 0
+        self.junk = 0
+        self.junk_bytes = bytearray()
+
+    def feed(self, data):
+        #Returns the updates of every complete frame in data
+        buffer = self.buffer
+        buffer += data
+        size = len(buffer)
+        frames = []
+        position = 0
+        with memoryview(buffer) as view:
+            while True:
+                start = buffer.find(SYNC, position)
+                if start < 0:
+                    #A trailing A5 may be the first half of the next sync
+                    start = size - 1 if buffer.endswith(SYNC[:1]) else size
+                    self._skip(view, position, start)
+                    position = start
+                    break
+                self._skip(view, position, start)
+                position = start
+                if start + HEADER.size > size:
+                    break
+                length = HEADER.unpack_from(buffer, start)[1]
+                if length < PREFIX.size or length > MAX_PAYLOAD:
+                    self.bad_frames += 1
+                    position = self._skip(view, start, start + 1)
+                    continue
+                end = start + HEADER.size + length + CRC.size
+                if end > size:
+                    break
+                payload = start + HEADER.size
+                if crc_hqx(view[payload:payload + length], CRC_INIT) != CRC.unpack_from(buffer, end - CRC.size)[0]:
+                    self.crc_errors += 1
+                    position = self._skip(view, start, start + 1)
+                    continue
+                try:
+                    frames.append(decode_payload(buffer, payload, length))
+                except (ValueError, struct.error):
+                    self.bad_frames += 1
+                    position = self._skip(view, start, start + 1)
+                    continue
+                self.frames += 1
+                self.drop_junk()
+                position = end
+        del buffer[:position]
+        return frames
+
+    def _skip(self, view, start, end):
+        #Counts and keeps buffer[start:end]; returns end
+        if end > start:
+            self.skipped += end - start
+            self.junk += end - start
+            self.junk_bytes += view[start:end]
+        return end
+
+    def drop_junk(self):
+        self.junk = 0
+        self.junk_bytes.clear()
+
+    def take(self):
+        #Hands back the unconsumed bytes, e.g. to the text framer
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
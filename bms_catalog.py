@@ -0,0 +1,289 @@
+#Catalog of logged sessions for time-range queries.
+#Every CSV export gets a sidecar index (<file>.idx) holding a sparse
+#timestamp -> (byte offset, row) table, and the directory gets a manifest
+#(catalog.json) with the time span of every file. A query only opens the files
+#that overlap the range, seeks to the nearest index entry and stops at the end
+#of the range. Columnar sessions are included through their memory-mapped timestamps.
+#Indexes are extended incrementally while a log is still growing.
+#
+#usage: python bms_catalog.py index ["CSV Exports"]
+#       python bms_catalog.py query ["CSV Exports"] --start "2024-08-08 13:40" --stop "2024-08-08 13:45" [--fields volt6 ...]
+import argparse
+import bisect
+import csv
+import glob
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from bms_columnar import CSV_TIMESTAMP_FORMAT, SESSION_EXT, TIMESTAMP, open_session
+from bms_logger import EXPORT_DIR
+from bms_rollup import is_rollup
+
+INDEX_EXT = ".idx"
+MANIFEST_NAME = "catalog.json"
+INDEX_VERSION = 1
+#One index entry per this many rows
+INDEX_STEP = 256
+
+
+class _StampParser:
+    #CSV timestamp text -> epoch seconds, cached since rows share seconds
+    def __init__(self):
+        self.last_text = None
+        self.last_stamp = None
+
+    def __call__(self, text):
+        if text != self.last_text:
+            self.last_stamp = int(time.mktime(datetime.strptime(text, CSV_TIMESTAMP_FORMAT).timetuple()))
+            self.last_text = text
+        return self.last_stamp
+
+
+def _blank_index(path):
+    return {'version': INDEX_VERSION, 'path': os.path.basename(path), 'header': None, 'end': 0,
+            'rows': 0, 'first': None, 'last': None, 'sorted': True, 'entries': []}
+
+
+def _read_index(path):
+    try:
+        with open(path + INDEX_EXT) as file:
+            index = json.load(file)
+        if index.get('version') == INDEX_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _write_json(path, data):
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+def index_csv(path, step=INDEX_STEP):
+    #Builds or extends the sidecar index of one CSV export and returns it
+    index = _read_index(path)
+    size = os.path.getsize(path)
+    if index is None or index['end'] > size:
+        index = _blank_index(path)
+    if index['end'] == size:
+        return index
+    parse = _StampParser()
+    entries = index['entries']
+    rows = index['rows']
+    last = index['last']
+    with open(path, "rb") as file:
+        file.seek(index['end'])
+        offset = index['end']
+        if index['header'] is None:
+            line = file.readline()
+            if not line.endswith(b'\n'):
+                return index
+            index['header'] = next(csv.reader([line.decode("utf-8", "replace")]))
+            offset += len(line)
+        for line in file:
+            if not line.endswith(b'\n'):
+                #Row still being written
+                break
+            text = line[:line.find(b',')].decode("utf-8", "replace").strip()
+            try:
+                stamp = parse(text)
+            except ValueError:
+                stamp = None
+            if stamp is not None:
+                if last is not None and stamp < last:
+                    index['sorted'] = False
+                if index['first'] is None:
+                    index['first'] = stamp
+                if rows % step == 0 or not entries:
+                    entries.append([stamp, offset, rows])
+                last = stamp if last is None else max(last, stamp)
+            rows += 1
+            offset += len(line)
+    index['rows'] = rows
+    index['last'] = last
+    index['end'] = offset
+    _write_json(path + INDEX_EXT, index)
+    return index
+
+
+def _session_span(path):
+    session = open_session(path)
+    stamps = session.timestamps
+    if not len(session):
+        return None, None, 0
+    return int(stamps[0]), int(stamps[-1]), len(session)
+
+
+def build_manifest(directory=EXPORT_DIR):
+    #Indexes new or grown files and rewrites the manifest; returns it
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        manifest = {}
+    files = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.csv"))):
+        if is_rollup(path):
+            #Aggregates of the sessions next to them, not sessions of their own
+            continue
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        known = manifest.get(name)
+        if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+            files[name] = known
+            continue
+        index = index_csv(path)
+        files[name] = {'kind': 'csv', 'size': stat.st_size, 'mtime': stat.st_mtime, 'rows': index['rows'],
+                       'first': index['first'], 'last': index['last']}
+    for path in sorted(glob.glob(os.path.join(directory, "*" + SESSION_EXT))):
+        name = os.path.basename(path)
+        meta = os.path.join(path, "meta.json")
+        if not os.path.exists(meta):
+            continue
+        mtime = os.stat(meta).st_mtime
+        known = manifest.get(name)
+        if known and known['mtime'] == mtime:
+            files[name] = known
+            continue
+        try:
+            first, last, rows = _session_span(path)
+        except ImportError:
+            #numpy not installed, sessions can't be queried
+            continue
+        files[name] = {'kind': 'session', 'size': 0, 'mtime': mtime, 'rows': rows, 'first': first, 'last': last}
+    if files != manifest:
+        _write_json(manifest_path, files)
+    return files
+
+
+def _query_csv(path, start, stop, fields):
+    index = index_csv(path)
+    header = index['header'] or []
+    columns = [header.index(field) if field in header else None for field in fields] if fields else None
+    entries = index['entries']
+    if index['sorted'] and entries:
+        #Last entry at or before start; the row it points to may still be before start
+        position = max(0, bisect.bisect_right([entry[0] for entry in entries], start) - 1)
+        offset = entries[position][1]
+    elif entries:
+        offset = entries[0][1]
+    else:
+        return
+    parse = _StampParser()
+    with open(path, "rb") as file:
+        file.seek(offset)
+        remaining = index['end'] - offset
+        reader = csv.reader(io.TextIOWrapper(_Limited(file, remaining), encoding="utf-8", errors="replace", newline=""))
+        for row in reader:
+            if not row:
+                continue
+            try:
+                stamp = parse(row[0])
+            except ValueError:
+                continue
+            if stamp < start:
+                continue
+            if stamp >= stop:
+                if index['sorted']:
+                    return
+                continue
+            if columns is None:
+                yield stamp, dict(zip(header[1:], row[1:]))
+            else:
+                yield stamp, {field: (row[column] if column is not None and column < len(row) else None)
+                              for field, column in zip(fields, columns)}
+
+
+class _Limited(io.RawIOBase):
+    #Reads at most limit bytes of file, so a row being appended isn't read half written
+    def __init__(self, file, limit):
+        self.file = file
+        self.limit = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.limit <= 0:
+            return 0
+        data = self.file.read(min(len(buffer), self.limit))
+        self.limit -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _query_session(session, start, stop, fields):
+    wanted = fields or session.fields
+    span = session.between(start, stop)
+    stamps = session.timestamps[span].tolist()
+    columns = [session.values(field, span.start, span.stop) if field in session.fields else [None] * len(stamps)
+               for field in wanted]
+    for row, stamp in enumerate(stamps):
+        yield stamp, {field: column[row] for field, column in zip(wanted, columns)}
+
+
+def query(directory, start, stop, fields=None):
+    #Yields (epoch seconds, {field: value}) for start <= t < stop over every file
+    #in the directory, file by file in time order. CSV values stay text.
+    manifest = build_manifest(directory)
+    spans = [(info['first'], name, info) for name, info in manifest.items()
+             if info['rows'] and info['first'] is not None and info['first'] < stop and info['last'] >= start]
+    for _, name, info in sorted(spans):
+        path = os.path.join(directory, name)
+        if info['kind'] == 'session':
+            try:
+                session = open_session(path)
+            except ImportError:
+                #numpy not installed, sessions can't be read
+                continue
+            yield from _query_session(session, start, stop, fields)
+        else:
+            yield from _query_csv(path, start, stop, fields)
+
+
+def _epoch(text):
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        moment = datetime.strptime(text, CSV_TIMESTAMP_FORMAT)
+    return int(time.mktime(moment.timetuple()))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Index and query logged BMS sessions by time")
+    commands = argparser.add_subparsers(dest="command", required=True)
+    index = commands.add_parser("index", help="build or refresh the indexes and manifest")
+    index.add_argument("directory", nargs="?", default=EXPORT_DIR)
+    search = commands.add_parser("query", help="print the rows in a time range as CSV")
+    search.add_argument("directory", nargs="?", default=EXPORT_DIR)
+    search.add_argument("--start", required=True, help='e.g. "2024-08-08 13:40" or 08-08-24-13:40:00')
+    search.add_argument("--stop", required=True)
+    search.add_argument("--fields", nargs="+", default=None)
+    args = argparser.parse_args()
+
+    if args.command == "index":
+        started = time.perf_counter()
+        manifest = build_manifest(args.directory)
+        rows = sum(info['rows'] for info in manifest.values())
+        print(f"{len(manifest)} files, {rows} rows indexed in {time.perf_counter() - started:.2f} s")
+        return
+    start, stop = _epoch(args.start), _epoch(args.stop)
+    writer = csv.writer(sys.stdout)
+    header = None
+    for stamp, values in query(args.directory, start, stop, args.fields):
+        if header is None:
+            header = list(values)
+            writer.writerow([TIMESTAMP] + header)
+        writer.writerow([datetime.fromtimestamp(stamp).strftime(CSV_TIMESTAMP_FORMAT)] + [values.get(field) for field in header])
+
+
+if __name__ == "__main__":
+    main()
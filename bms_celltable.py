@@ -0,0 +1,51 @@
+#Per cell readouts drawn on one Canvas.
+#Each cell is a label and a value text item laid out in columns of ROWS_PER_COLUMN,
+#so a 24 cell pack costs one widget instead of 48 Labels, and a repaint is an
+#itemconfigure on the items whose value changed.
+import tkinter as tk
+
+ROWS_PER_COLUMN = 8
+ROW_HEIGHT = 20
+LABEL_WIDTH = 95
+VALUE_WIDTH = 60
+COLUMN_GAP = 10
+FONT = ('Arial', 9)
+
+
+class CellTable:
+    def __init__(self, parent, label, divisor=None):
+        #label is the text before the 1 based cell number, e.g. "Voltage"
+        self.label = label
+        self.divisor = divisor
+        self.canvas = tk.Canvas(parent, width=LABEL_WIDTH + VALUE_WIDTH, height=0, highlightthickness=0)
+        #Value text item of each cell
+        self.items = []
+
+    def pack(self, **options):
+        self.canvas.pack(**options)
+
+    def __len__(self):
+        return len(self.items)
+
+    def resize(self, count):
+        #Adds the cells up to count; existing items and their values are kept
+        canvas = self.canvas
+        for index in range(len(self.items), count):
+            column, row = divmod(index, ROWS_PER_COLUMN)
+            x = column * (LABEL_WIDTH + VALUE_WIDTH + COLUMN_GAP)
+            y = row * ROW_HEIGHT + ROW_HEIGHT // 2
+            canvas.create_text(x, y, text=f"{self.label} {index + 1}", anchor=tk.W, font=FONT)
+            self.items.append(canvas.create_text(x + LABEL_WIDTH, y, text='', anchor=tk.W, font=FONT))
+        columns = -(-len(self.items) // ROWS_PER_COLUMN)
+        rows = min(len(self.items), ROWS_PER_COLUMN)
+        canvas.configure(width=max(1, columns) * (LABEL_WIDTH + VALUE_WIDTH + COLUMN_GAP) - COLUMN_GAP,
+                         height=rows * ROW_HEIGHT)
+
+    def setter(self, index):
+        #Painter for FieldBindings.bind
+        item = self.items[index]
+        configure = self.canvas.itemconfigure
+        divisor = self.divisor
+        if divisor is None:
+            return lambda value: configure(item, text='' if value is None else value)
+        return lambda value: configure(item, text='' if value is None else value / divisor)
@@ -0,0 +1,230 @@
+#Columnar on-disk session format.
+#A session is a directory holding one raw little-endian file per column
+#(Timestamp as int64 epoch seconds, every schema field as int32, text fields
+#dictionary encoded) plus meta.json with the field list and the string table.
+#Columns are appended as the session runs and memory-mapped when read back,
+#so opening a session with tens of millions of rows costs nothing up front.
+#
+#usage: python bms_columnar.py convert "CSV Exports/serial_log_1.csv" ... [--output DIR]
+#       python bms_columnar.py info session.bmscol
+import argparse
+import json
+import os
+import sys
+from array import array
+from datetime import datetime
+
+from bms_parser import FIELDS, STRING_FIELDS
+from bms_store import MISSING, CHUNK_ROWS
+
+SESSION_EXT = ".bmscol"
+META_NAME = "meta.json"
+FORMAT_VERSION = 1
+TIMESTAMP = "Timestamp"
+#CSV exports use this timestamp format
+CSV_TIMESTAMP_FORMAT = "%m-%d-%y-%H:%M:%S"
+
+_SWAP = sys.byteorder != "little"
+
+
+def _column_path(path, field):
+    return os.path.join(path, field + ".bin")
+
+
+class ColumnarWriter:
+    #Appends rows to a new session directory; rows are buffered and written
+    #column by column every flush_rows rows (or on flush())
+    def __init__(self, path, fields=FIELDS, flush_rows=CHUNK_ROWS):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.fields = list(fields)
+        self.flush_rows = flush_rows
+        #(column index, dictionary encoded) for each field
+        self.slots = [(index, field in STRING_FIELDS) for index, field in enumerate(self.fields)]
+        self.files = [open(_column_path(path, TIMESTAMP), "wb")]
+        self.files += [open(_column_path(path, field), "wb") for field in self.fields]
+        self.stamps = array('q')
+        self.columns = [array('i') for _ in self.fields]
+        self.codes = {}
+        self.strings = []
+        #Rows on disk, and values that didn't fit in int32
+        self.rows = 0
+        self.overflows = 0
+        self._write_meta()
+
+    def encode(self, text):
+        code = self.codes.get(text)
+        if code is None:
+            code = self.codes[text] = len(self.strings)
+            self.strings.append(text)
+        return code
+
+    def append(self, timestamp, values):
+        #values in field order, None for fields the BMS hasn't reported
+        self.stamps.append(int(timestamp))
+        columns = self.columns
+        for index, encoded in self.slots:
+            value = values[index]
+            if value is None:
+                value = MISSING
+            elif encoded:
+                value = self.encode(str(value))
+            try:
+                columns[index].append(value)
+            except (OverflowError, TypeError):
+                columns[index].append(MISSING)
+                self.overflows += 1
+        if len(self.stamps) >= self.flush_rows:
+            self.flush()
+
+    def append_cells(self, timestamp, cells):
+        get = cells.get
+        self.append(timestamp, [get(field) for field in self.fields])
+
+    def flush(self):
+        if self.stamps:
+            buffers = [self.stamps] + self.columns
+            for file, buffer in zip(self.files, buffers):
+                if _SWAP:
+                    buffer.byteswap()
+                buffer.tofile(file)
+                file.flush()
+            self.rows += len(self.stamps)
+            self.stamps = array('q')
+            self.columns = [array('i') for _ in self.fields]
+        self._write_meta()
+
+    def sync(self):
+        for file in self.files:
+            os.fsync(file.fileno())
+
+    def tell(self):
+        #Bytes written so far, used for size based rotation
+        return self.rows * (8 + 4 * len(self.fields))
+
+    def close(self):
+        if self.files:
+            self.flush()
+            for file in self.files:
+                file.close()
+            self.files = []
+
+    def _write_meta(self):
+        #Rewritten on every flush, replaced atomically so a reader never sees half of it
+        meta = {
+            'version': FORMAT_VERSION,
+            'rows': self.rows,
+            'missing': MISSING,
+            'timestamp': {'name': TIMESTAMP, 'dtype': '<i8'},
+            'fields': [{'name': field, 'dtype': '<i4', 'encoded': field in STRING_FIELDS} for field in self.fields],
+            'strings': self.strings,
+        }
+        temporary = os.path.join(self.path, META_NAME + ".tmp")
+        with open(temporary, "w") as file:
+            json.dump(meta, file)
+        os.replace(temporary, os.path.join(self.path, META_NAME))
+
+
+class Session:
+    #Read side of a session directory; columns are numpy memmaps created on first use
+    def __init__(self, path):
+        #numpy is only needed to read sessions back, not to log them
+        import numpy as np
+        self.np = np
+        self.path = path
+        with open(os.path.join(path, META_NAME)) as file:
+            meta = json.load(file)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported session version {meta.get('version')}")
+        self.fields = [column['name'] for column in meta['fields']]
+        self.dtypes = {column['name']: column['dtype'] for column in meta['fields']}
+        self.dtypes[TIMESTAMP] = meta['timestamp']['dtype']
+        self.encoded = {column['name'] for column in meta['fields'] if column['encoded']}
+        self.strings = meta['strings']
+        self.missing = meta['missing']
+        #Columns may be longer than meta says if the writer stopped between the
+        #column writes and the meta update, never shorter
+        self.rows = meta['rows']
+        self._columns = {}
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, field):
+        #Raw int column (MISSING where not reported), read lazily from disk
+        values = self._columns.get(field)
+        if values is None:
+            dtype = self.np.dtype(self.dtypes[field])
+            if self.rows == 0:
+                values = self.np.empty(0, dtype)
+            else:
+                values = self.np.memmap(_column_path(self.path, field), dtype=dtype, mode='r', shape=(self.rows,))
+            self._columns[field] = values
+        return values
+
+    @property
+    def timestamps(self):
+        return self.column(TIMESTAMP)
+
+    def values(self, field, start=0, stop=None):
+        #Decoded values of one field as a list, None where not reported
+        codes = self.column(field)[start:stop].tolist()
+        missing = self.missing
+        if field in self.encoded:
+            strings = self.strings
+            return [None if code == missing else strings[code] for code in codes]
+        return [None if value == missing else value for value in codes]
+
+    def between(self, start, stop):
+        #Row slice covering epoch seconds start <= t < stop (rows are in time order)
+        stamps = self.timestamps
+        return slice(int(stamps.searchsorted(start, 'left')), int(stamps.searchsorted(stop, 'left')))
+
+    def rows_between(self, start, stop):
+        #Yields (timestamp, values) for start <= t < stop
+        span = self.between(start, stop)
+        stamps = self.timestamps[span].tolist()
+        columns = [self.values(field, span.start, span.stop) for field in self.fields]
+        for row, timestamp in enumerate(stamps):
+            yield timestamp, [column[row] for column in columns]
+
+
+def open_session(path):
+    return Session(path)
+
+
+def convert_csv(path, output=None):
+    #Converts one CSV export into a session directory next to it (or in output)
+    from bms_convert import convert_file, plan
+
+    (_, target), = plan([path], output)
+    convert_file(path, target)
+    return target
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Columnar BMS session files")
+    commands = argparser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="convert CSV exports to sessions")
+    convert.add_argument("paths", nargs="+")
+    convert.add_argument("--output", default=None, help="directory for the sessions (default: next to the CSV)")
+    info = commands.add_parser("info", help="describe a session")
+    info.add_argument("path")
+    args = argparser.parse_args()
+
+    if args.command == "convert":
+        for path in args.paths:
+            target = convert_csv(path, args.output)
+            print(f"{path} -> {target} ({len(open_session(target))} rows)")
+    else:
+        session = open_session(args.path)
+        stamps = session.timestamps
+        print(f"{args.path}: {len(session)} rows, {len(session.fields)} fields")
+        if len(session):
+            first = datetime.fromtimestamp(int(stamps[0]))
+            last = datetime.fromtimestamp(int(stamps[-1]))
+            print(f"{first} .. {last}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#Bounded log console on top of the ScrolledText widget.
+#Text is collected during a frame and inserted in one call, and the widget is
+#trimmed to a fixed number of lines. The full history lives in the raw log on disk.
+import tkinter as tk
+from collections import deque
+
+MAX_LINES = 2000
+
+
+class LogConsole:
+    def __init__(self, widget, max_lines=MAX_LINES):
+        self.widget = widget
+        self.max_lines = max_lines
+        #Text waiting for the next flush; never more than one widget's worth
+        self.pending = deque(maxlen=max_lines)
+        #Lines currently held by the widget
+        self.lines = 0
+        #Counters
+        self.trimmed = 0
+        self.skipped = 0
+
+    def write(self, text):
+        #text should end in a newline
+        if len(self.pending) == self.max_lines:
+            #Would be trimmed straight away after the insert anyway
+            self.skipped += 1
+        self.pending.append(text)
+
+    def extend(self, texts):
+        for text in texts:
+            self.write(text)
+
+    def clear(self):
+        self.pending.clear()
+        self.widget.delete(1.0, tk.END)
+        self.lines = 0
+
+    def flush(self):
+        #Called once per frame from the Tk main loop
+        if not self.pending:
+            return
+        text = ''.join(self.pending)
+        self.pending.clear()
+        widget = self.widget
+        widget.insert(tk.END, text)
+        self.lines += text.count('\n')
+        excess = self.lines - self.max_lines
+        if excess > 0:
+            widget.delete('1.0', f'{excess + 1}.0')
+            self.lines -= excess
+            self.trimmed += excess
+        widget.see(tk.END)
@@ -0,0 +1,324 @@
+#Bulk conversion of archived exports into columnar sessions.
+#CSV exports (whose column order depends on the order the fields first arrived in)
+#and TXT exports / raw captures are normalized to one canonical schema - the
+#bms_parser.make_fields order for the file's pack size followed by the derived
+#fields, i.e. what the engine logs today - and written as .bmscol sessions.
+#Files are converted one per worker process. Each worker streams its file through
+#a large read buffer and the columnar writer flushes every CHUNK_ROWS rows, so
+#memory stays flat whatever the file size. A session is written under a .part name
+#and renamed once complete, and every finished file is recorded in the checkpoint,
+#so an interrupted run picks up where it stopped.
+#
+#usage: python bms_convert.py "CSV Exports" archive/ --output sessions [--workers N]
+#       python bms_convert.py archive/ --output sessions --restart   (ignore the checkpoint)
+import argparse
+import csv
+import glob
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from bms_columnar import CSV_TIMESTAMP_FORMAT, SESSION_EXT, TIMESTAMP, ColumnarWriter
+from bms_frames import FrameAssembler, PackSchema
+from bms_metrics import DERIVED_FIELDS, FrameMetrics
+from bms_parser import STRING_FIELDS, LineParser, make_fields, split_line
+from bms_replay import TXT_STAMP, TXT_STAMP_FORMAT
+from bms_rollup import is_rollup
+from bms_synth import pack_size
+
+#Read buffer per file; also how much of a TXT file is scanned for its pack size
+CHUNK_BYTES = 1 << 20
+CHECKPOINT_NAME = "convert_checkpoint.json"
+PART_SUFFIX = ".part"
+PATTERNS = ("serial_log_*.csv", "serial_log_*.txt")
+
+
+def canonical_fields(cells, sensors):
+    return make_fields(cells, sensors) + DERIVED_FIELDS
+
+
+def _number(field, text):
+    if not text or text == 'None':
+        return None
+    if field in STRING_FIELDS:
+        return text
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def csv_rows(path, cells=0, sensors=0):
+    #(fields, rows) of a CSV export; rows yields (epoch second, values in field order).
+    #cells and sensors are a minimum pack size, the file's own is used if larger.
+    #Derived fields the file has no column for (logs from before they existed) are
+    #computed from the row like txt_rows does.
+    file = open(path, newline="", buffering=CHUNK_BYTES)
+    reader = csv.reader(file)
+    header = next(reader, None) or []
+    found = pack_size(header)
+    cells = max(cells, found[0])
+    sensors = max(sensors, found[1])
+    fields = canonical_fields(cells, sensors)
+    #Columns in the file order, mapped onto the schema
+    positions = [header.index(field) if field in header else None for field in fields]
+    slots = list(zip(fields, positions))
+    stamp_at = header.index(TIMESTAMP) if TIMESTAMP in header else None
+    derive = {field: fields.index(field) for field in DERIVED_FIELDS if field not in header}
+    metrics = FrameMetrics(cells, sensors) if derive else None
+
+    def rows():
+        last_text = None
+        last_stamp = 0
+        with file:
+            for row in reader:
+                if not row:
+                    continue
+                if stamp_at is not None and row[stamp_at] != last_text:
+                    last_text = row[stamp_at]
+                    try:
+                        last_stamp = int(time.mktime(datetime.strptime(last_text, CSV_TIMESTAMP_FORMAT).timetuple()))
+                    except ValueError:
+                        pass
+                size = len(row)
+                values = [None if position is None or position >= size else _number(field, row[position])
+                          for field, position in slots]
+                if metrics is not None:
+                    for field, value in metrics.compute(dict(zip(fields, values)), last_stamp):
+                        if field in derive:
+                            values[derive[field]] = value
+                yield last_stamp, values
+    return fields, rows()
+
+
+def _txt_pack_size(path):
+    #Pack size from the first chunk of a TXT file; a chunk holds many report cycles
+    schema = PackSchema()
+    parser = LineParser()
+    with open(path, encoding="utf-8", errors="replace", newline="") as file:
+        for text in file.read(CHUNK_BYTES).splitlines():
+            match = TXT_STAMP.match(text)
+            for field, _ in parser.parse(split_line(match.group(2) if match else text)):
+                schema.observe(field)
+    return schema.cells, schema.sensors
+
+
+def txt_rows(path, cells=0, sensors=0):
+    #(fields, rows) of a TXT export or raw capture, assembled into report cycles
+    #like the live engine does; one row per complete cycle
+    found = _txt_pack_size(path)
+    cells = max(cells, found[0])
+    sensors = max(sensors, found[1])
+    fields = canonical_fields(cells, sensors)
+    parser = LineParser()
+    assembler = FrameAssembler(PackSchema(cells, sensors))
+    metrics = FrameMetrics(cells, sensors)
+    #Raw captures carry no time at all; their rows get the file's modification time
+    fallback = int(os.path.getmtime(path))
+
+    def rows():
+        stamped = False
+        last_text = None
+        stamp = fallback
+        with open(path, encoding="utf-8", errors="replace", newline="", buffering=CHUNK_BYTES) as file:
+            for text in file:
+                match = TXT_STAMP.match(text)
+                if match:
+                    stamped = True
+                    if match.group(1) != last_text:
+                        last_text = match.group(1)
+                        stamp = int(datetime.strptime(last_text, TXT_STAMP_FORMAT).timestamp())
+                    text = match.group(2)
+                elif stamped:
+                    #Console messages in a TXT export never came from the board
+                    continue
+                for frame in assembler.add(parser.parse(split_line(text)), stamp):
+                    values = frame.values
+                    values.update(metrics.compute(values, frame.timestamp))
+                    if frame.filled:
+                        get = values.get
+                        yield frame.timestamp, [get(field) for field in fields]
+    return fields, rows()
+
+
+def convert_file(path, target, cells=0, sensors=0):
+    #Writes one export as a session at target. Returns (rows, overflows).
+    part = target + PART_SUFFIX
+    if os.path.exists(part):
+        #Left behind by an interrupted run
+        shutil.rmtree(part)
+    reader = csv_rows if path.lower().endswith('.csv') else txt_rows
+    fields, rows = reader(path, cells, sensors)
+    writer = ColumnarWriter(part, fields=fields)
+    try:
+        for timestamp, values in rows:
+            writer.append(timestamp, values)
+    finally:
+        writer.close()
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(part, target)
+    return writer.rows, writer.overflows
+
+
+def convert_path(job):
+    #Worker side; only the report comes back
+    path, target, cells, sensors = job
+    started = time.perf_counter()
+    result = {'path': path, 'target': target, 'bytes': os.path.getsize(path)}
+    try:
+        result['rows'], result['overflows'] = convert_file(path, target, cells, sensors)
+    except (OSError, ValueError, csv.Error) as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def find_exports(paths):
+    #Expands directories into the CSV and TXT exports inside them, leaving out
+    #rollups (serial_log_1s_*.csv) that older versions wrote next to the logs
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in PATTERNS:
+                found += sorted(name for name in glob.glob(os.path.join(path, pattern)) if not is_rollup(name))
+        else:
+            found.append(path)
+    return found
+
+
+def plan(paths, output=None):
+    #(source, target) pairs; a CSV and a TXT export with the same name keep the
+    #extension in the session name instead of overwriting each other
+    pairs = []
+    taken = set()
+    for path in paths:
+        stem, extension = os.path.splitext(os.path.basename(path))
+        directory = output or os.path.dirname(path)
+        target = os.path.join(directory, stem + SESSION_EXT)
+        if target in taken:
+            target = os.path.join(directory, stem + extension + SESSION_EXT)
+        taken.add(target)
+        pairs.append((path, target))
+    return pairs
+
+
+class Checkpoint:
+    #Files already converted, keyed by absolute path; an entry only counts while the
+    #source is unchanged and its session is still there
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if path and os.path.exists(path):
+            with open(path) as file:
+                self.done = json.load(file)
+
+    @staticmethod
+    def _key(source):
+        return os.path.abspath(source)
+
+    def finished(self, source, target):
+        entry = self.done.get(self._key(source))
+        if entry is None or entry.get('target') != os.path.abspath(target):
+            return False
+        stat = os.stat(source)
+        return (entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime
+                and os.path.isdir(target))
+
+    def record(self, result):
+        stat = os.stat(result['path'])
+        self.done[self._key(result['path'])] = {
+            'target': os.path.abspath(result['target']),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'rows': result['rows'],
+            'seconds': round(result['seconds'], 3),
+        }
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        #Replaced atomically so an interrupted run never leaves half a checkpoint
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump(self.done, file, indent=1)
+        os.replace(temporary, self.path)
+
+
+def convert_files(jobs, workers=None):
+    #Yields each job's result as it finishes; workers=1 runs in this process
+    if workers == 1 or len(jobs) < 2:
+        for job in jobs:
+            yield convert_path(job)
+        return
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(convert_path, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        #Ctrl-C: drop the files not started yet, the checkpoint has the finished ones
+        pool.shutdown(cancel_futures=True)
+
+
+def _report(result):
+    name = os.path.basename(result['path'])
+    if 'error' in result:
+        return f"{name[:35].ljust(36)}  error: {result['error']}"
+    seconds = max(result['seconds'], 1e-9)
+    megabytes = result['bytes'] / 1e6
+    return (name[:35].ljust(36) + f"{result['rows']:9d}" + f"{megabytes:9.1f}" + f"{result['seconds']:8.2f}"
+            + f"{megabytes / seconds:8.1f}" + f"{result['rows'] / seconds:11.0f}")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Convert archived CSV/TXT exports to columnar sessions")
+    argparser.add_argument("paths", nargs="*", default=["CSV Exports"], help="files or directories (default: CSV Exports)")
+    argparser.add_argument("--output", default=None, help="directory for the sessions (default: next to each export)")
+    argparser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    argparser.add_argument("--checkpoint", default=None,
+                           help=f"progress file (default: {CHECKPOINT_NAME} in the output directory or the current one)")
+    argparser.add_argument("--restart", action="store_true", help="convert every file again, ignoring the checkpoint")
+    argparser.add_argument("--cells", type=int, default=0, help="pad every session to at least this many cells")
+    argparser.add_argument("--sensors", type=int, default=0, help="pad every session to at least this many sensors")
+    args = argparser.parse_args()
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.output or ".", CHECKPOINT_NAME))
+    if args.restart:
+        checkpoint.done = {}
+    pairs = plan(find_exports(args.paths), args.output)
+    jobs = [(path, target, args.cells, args.sensors) for path, target in pairs
+            if not checkpoint.finished(path, target)]
+    skipped = len(pairs) - len(jobs)
+    if skipped:
+        print(f"{skipped} of {len(pairs)} files already converted, see {checkpoint.path}")
+
+    print("file".ljust(36) + "rows".rjust(9) + "MB".rjust(9) + "s".rjust(8) + "MB/s".rjust(8) + "rows/s".rjust(11))
+    started = time.perf_counter()
+    rows = size = converted = errors = 0
+    try:
+        for result in convert_files(jobs, args.workers):
+            print(_report(result), flush=True)
+            if 'error' in result:
+                errors += 1
+                continue
+            checkpoint.record(result)
+            converted += 1
+            rows += result['rows']
+            size += result['bytes']
+    except KeyboardInterrupt:
+        print("Interrupted, run again to resume")
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"{converted} files converted, {rows} rows, {size / 1e6:.1f} MB in {elapsed:.2f} s "
+          f"({size / 1e6 / elapsed:.1f} MB/s, {rows / elapsed:.0f} rows/s)"
+          + (f", {errors} failed" if errors else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#Field -> widget bindings for the live readouts.
+#Incoming values only mark a field dirty; the widgets are repainted once per
+#frame and only for fields whose value actually changed since the last paint.
+#The per cell readouts are bound once the pack's cell count is known (bind_pack).
+
+#(field, SerialMonitor widget attribute, divisor applied to the raw BMS integer)
+DISPLAY_SCHEMA = (
+    [('mean_temp', 'meanTemp_textField', None),
+     ('temperature_gradient', 'tempGrad_textField', None)]
+    + [('mean_cell_voltage', 'meanVoltage_textField', 1000),
+       ('pack_volt', 'packVoltage_textField', 10000),
+       ('term_volt', 'termVolt_textField', 10000),
+       ('drain_volt', 'drainVolt_textField', 10000),
+       ('Vsafe', 'vSafe_textField', 1000),
+       ('Vbus', 'vBus_textField', 10000),
+       ('current', 'c0_textField', None),
+       ('max_current', 'maxCurr_textField', None)]
+    + [('total_soc', 'packSOC_textField', 10),
+       ('capacity', 'packCap_textField', 10000),
+       ('time_remaining', 'timeRem_textField', 10000),
+       ('Charging_Mode', 'chargeMode_textField', None)]
+    #Derived metrics from bms_metrics
+    + [('cell_spread', 'cellSpread_textField', 10),
+       ('pack_power', 'packPower_textField', 1000),
+       ('temp_max', 'tempMax_textField', None),
+       ('pack_dvdt', 'packDvdt_textField', None)]
+)
+
+#(field prefix, SerialMonitor bms_celltable.CellTable attribute) for the per cell
+#fields volt0, volt1, ...; the tables hold their own divisors
+CELL_SCHEMA = (
+    ('volt', 'cell_table'),
+    ('adc', 'temp_table'),
+    ('soc', 'soc_table'),
+)
+
+
+#Marks a field that has never been painted
+_NOT_RENDERED = object()
+
+
+def _label_setter(widget, divisor):
+    if divisor is None:
+        return lambda value: widget.configure(text=value)
+    #Derived metrics can be None until there is enough data
+    return lambda value: widget.configure(text='' if value is None else value / divisor)
+
+
+class FieldBindings:
+    def __init__(self, owner, schema=DISPLAY_SCHEMA):
+        #field -> function that paints a value
+        self.setters = {}
+        for field, attribute, divisor in schema:
+            self.setters[field] = _label_setter(getattr(owner, attribute), divisor)
+        #Last value painted per field and values waiting for the next paint
+        self.rendered = {}
+        self.dirty = {}
+
+    def bind(self, field, setter):
+        #Register a custom painter, e.g. for a text widget
+        self.setters[field] = setter
+
+    def bind_pack(self, owner, fields, schema=CELL_SCHEMA):
+        #Grows the cell tables to the pack's fields and binds the cells that are new.
+        #Returns the newly bound fields.
+        added = []
+        for prefix, attribute in schema:
+            table = getattr(owner, attribute)
+            count = sum(1 for field in fields if field.startswith(prefix) and field[len(prefix):].isdigit())
+            bound = len(table)
+            if count > bound:
+                table.resize(count)
+                for index in range(bound, count):
+                    self.setters[prefix + str(index)] = table.setter(index)
+                    added.append(prefix + str(index))
+        return added
+
+    def update(self, updates):
+        #Accepts a dict or a list of (field, value) pairs
+        if isinstance(updates, dict):
+            updates = updates.items()
+        setters = self.setters
+        rendered = self.rendered
+        dirty = self.dirty
+        for field, value in updates:
+            if field not in setters:
+                continue
+            if rendered.get(field, _NOT_RENDERED) == value:
+                #Changed back to what is already on screen
+                dirty.pop(field, None)
+            else:
+                dirty[field] = value
+
+    def get(self, field, default=None):
+        #Latest known value of a field, painted or not
+        return self.dirty.get(field, self.rendered.get(field, default))
+
+    def flush(self):
+        #Paints every dirty field once. Returns the number of widgets touched.
+        dirty = self.dirty
+        if not dirty:
+            return 0
+        setters = self.setters
+        for field, value in dirty.items():
+            setters[field](value)
+        self.rendered.update(dirty)
+        count = len(dirty)
+        self.dirty = {}
+        return count
@@ -0,0 +1,336 @@
+#GUI-free acquisition engine: serial reader, parser, per-cycle metrics and session logs.
+#Nothing in here imports Tk or matplotlib, so it runs on a headless logger too.
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+from serial import Serial
+
+from bms_parser import FIELDS, LineParser, split_line
+from bms_framing import StreamDecoder
+from bms_frames import FrameAssembler
+from bms_metrics import DERIVED_FIELDS, FrameMetrics
+from bms_alarms import AlarmEngine, ALARM_RULES
+from bms_logger import StreamingLogger, RawLogger, ColumnarLogger, RollupLogger, EXPORT_DIR
+from bms_rollup import Rollup, ROLLUPS, ROLLUP_DIR
+
+#Seconds a read waits for the first byte; also how long stop() can take at most
+READ_TIMEOUT = 0.2
+#Reads shorter than this are followed by a short pause so the next one picks up
+#several lines at once (20 ms is ~230 bytes at 115200 baud)
+BATCH_BYTES = 256
+BATCH_SECONDS = 0.02
+#Backoff between attempts to reopen a port that went away
+RECONNECT_MIN = 0.5
+RECONNECT_MAX = 30.0
+
+#Logged columns of the standard pack: the parsed fields followed by the derived
+#metrics. Packs with other cell counts switch to their own on the first frame.
+LOG_FIELDS = FIELDS + DERIVED_FIELDS
+
+
+class AcquisitionEngine:
+    def __init__(self, delta_t=5, output=EXPORT_DIR, queue=None, log_prefix="serial_log_", columnar=False,
+                 rollups=ROLLUPS, alarm_rules=ALARM_RULES):
+        #Seconds between logged rows, fractions allowed (0 logs every line once all fields are known)
+        self.delta_t = delta_t
+        #Directory and file name prefix of the CSV stream
+        self.output = output
+        self.log_prefix = log_prefix
+        #Also write the rows as a columnar session next to the CSV
+        self.columnar = columnar
+        #Bucket lengths (s) of the aggregated min/max/mean/last streams, empty for none
+        self.rollups = tuple(rollups)
+        #Optional TelemetryQueue that receives (stamp, line, changed fields) per line
+        self.queue = queue
+
+        #Flag to indicate if the serial connection is active
+        self.connection_active = False
+        self.ser = None
+        self.thread = None
+        #Port and baud rate to reopen after the adapter drops; None for attached sources
+        self.port = None
+        self.baud = None
+        #Set by stop() to cut short the reader's pauses and reconnect backoff
+        self.stopping = threading.Event()
+        #Monotonic time of the last logged row
+        self.t_ref = time.monotonic()
+
+        #Container for each cell connected to BMS along with information related to each cell
+        self.cells = {}
+        self.stamp_second = None
+        self.log_stamp = ''
+        #Splits the port's bytes into text lines or binary frames, whichever the board sends
+        self.decoder = StreamDecoder()
+        #Compiled once, turns each serial line into (field, value) updates
+        self.parser = LineParser()
+        #Logged columns and the frame schema they were built from
+        self.log_fields = LOG_FIELDS
+        self.schema = None
+        #Groups each BMS report cycle into one Frame (see bms_frames)
+        self.assembler = FrameAssembler()
+        self.last_frame = None
+        #Called on the reader thread with every frame, after the derived metrics are added
+        self.frame_listeners = []
+        #Spread, weakest cell, power, hottest sensor and dV/dt once per cycle
+        self.metrics = FrameMetrics()
+        #Threshold, rate and DTC alarms, checked once per frame
+        self.alarms = AlarmEngine(alarm_rules)
+        #Rows and raw console lines are streamed to the output directory while connected
+        self.logger = None
+        self.raw_log = None
+        self.columnar_log = None
+        #Aggregates every parsed sample while logging, see bms_rollup
+        self.rollup = None
+        self.rollup_logs = {}
+
+        #Counters
+        self.lines = 0
+        self.records = 0
+        self.read_errors = 0
+        self.reads = 0
+        self.reconnects = 0
+        #Bytes per second received, updated about once a second
+        self.byte_rate = 0.0
+
+    def start(self, port, baud):
+        #Opens the port and starts logging; raises if the port can't be opened
+        self.port = port
+        self.baud = baud
+        self.attach(Serial(port, baud, timeout=READ_TIMEOUT))
+
+    def attach(self, source):
+        #Starts reading from an already open Serial, or anything with the same
+        #read()/in_waiting/is_open/close() interface such as bms_replay.ReplaySerial
+        self.ser = source
+        self.connection_active = True
+        self.stopping.clear()
+        self.start_logging()
+        self.thread = threading.Thread(target=self.read_from_port, name="bms-reader", daemon=True)
+        self.thread.start()
+
+    def stop_reader(self, timeout=None):
+        #Stops the reader thread and waits up to timeout for it; the logs stay open
+        self.connection_active = False  # Set the flag to False to stop the reading thread
+        self.stopping.set()
+        ser = self.ser
+        if ser is not None and hasattr(ser, 'cancel_read'):
+            #Wakes a read blocked on the port right away
+            try:
+                ser.cancel_read()
+            except Exception:
+                pass
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def stop(self):
+        self.stop_reader(READ_TIMEOUT * 5)
+        if self.ser is not None and self.ser.is_open:
+            self.ser.close()
+        self.stop_logging()
+
+    @property
+    def rows_logged(self):
+        #Rows the CSV logger has written so far
+        return self.logger.rows_written if self.logger is not None else 0
+
+    def start_logging(self, background=True):
+        #Used on its own when lines are fed in by something else than read_from_port
+        self.logger = StreamingLogger(directory=self.output, fields=self.log_fields, prefix=self.log_prefix)
+        self.logger.start(background)
+        self.raw_log = RawLogger(directory=self.output, prefix="raw_" + self.log_prefix)
+        self.raw_log.start(background)
+        if self.columnar:
+            self.columnar_log = ColumnarLogger(directory=self.output, fields=self.log_fields, prefix=self.log_prefix)
+            self.columnar_log.start(background)
+        if self.rollups:
+            for period in self.rollups:
+                log = RollupLogger(directory=os.path.join(self.output, ROLLUP_DIR), fields=self.log_fields,
+                                   prefix=f"{self.log_prefix}{period}s_")
+                log.start(background)
+                self.rollup_logs[period] = log
+            self.rollup = Rollup(self.write_rollup, self.rollups)
+        self.t_ref = time.monotonic()
+
+    def stop_logging(self):
+        if self.rollup is not None:
+            self.rollup.flush()
+            self.rollup = None
+        for log in self.logs():
+            log.close()
+
+    def logs(self):
+        #Every log stream currently open
+        logs = [log for log in (self.logger, self.raw_log, self.columnar_log) if log is not None]
+        return logs + list(self.rollup_logs.values())
+
+    def apply_schema(self, schema):
+        #Runs on the first frame and whenever the pack turns out to have more cells or sensors
+        self.schema = schema
+        pack = self.assembler.schema
+        self.metrics.resize(pack.cells, pack.sensors)
+        fields = list(schema) + DERIVED_FIELDS
+        if fields == self.log_fields:
+            return
+        self.log_fields = fields
+        for log in (self.logger, self.columnar_log, *self.rollup_logs.values()):
+            if log is not None:
+                log.set_fields(fields)
+
+    def write_rollup(self, period, start, stats):
+        self.rollup_logs[period].write(start, stats)
+
+    def read_from_port(self):
+        #Runs on the reader thread. Each read takes everything the port has buffered,
+        #so a busy port costs a few large reads per second instead of one per byte.
+        stopping = self.stopping
+        counted = self.decoder.bytes
+        since = time.monotonic()
+        #Wait after a failed read of an attached source, which can't be reopened
+        backoff = RECONNECT_MIN
+        while self.connection_active:  # Check the flag in the reading loop
+            try:
+                ser = self.ser
+                data = ser.read(ser.in_waiting or 1)
+                self.reads += 1
+                backoff = RECONNECT_MIN
+                if data:
+                    self.feed(data)
+                    if len(data) < BATCH_BYTES:
+                        #Let a few more lines arrive before the next read
+                        stopping.wait(BATCH_SECONDS)
+            except Exception as e:
+                if self.connection_active:  # Only report errors if the connection is still active
+                    self.read_errors += 1
+                    self.report(f"Error reading from port: {str(e)}\n")
+                    if self.port is not None:
+                        self.reconnect()
+                    else:
+                        stopping.wait(backoff)
+                        backoff = min(backoff * 2, RECONNECT_MAX)
+            now = time.monotonic()
+            if now - since >= 1.0:
+                self.byte_rate = (self.decoder.bytes - counted) / (now - since)
+                counted = self.decoder.bytes
+                since = now
+
+    def reconnect(self):
+        #Reopens the port after the adapter dropped, backing off up to RECONNECT_MAX
+        #seconds between attempts; returns early if stop() is called
+        try:
+            self.ser.close()
+        except Exception:
+            pass
+        #A partial line or frame from before the drop would be glued to the next one
+        self.decoder.reset()
+        delay = RECONNECT_MIN
+        while self.connection_active:
+            if self.stopping.wait(delay):
+                return
+            try:
+                self.ser = Serial(self.port, self.baud, timeout=READ_TIMEOUT)
+            except Exception:
+                delay = min(delay * 2, RECONNECT_MAX)
+                continue
+            self.reconnects += 1
+            self.report(f"Reconnected to {self.port}\n")
+            return
+
+    def feed(self, data):
+        #Raw bytes from the port. Returns the number of lines and binary frames handled.
+        lines, records = self.decoder.feed(data)
+        for line in lines:
+            self.handle_line(line)
+        for updates in records:
+            self.handle_record(updates)
+        return len(lines) + len(records)
+
+    def handle_line(self, line):
+        self.lines += 1
+        changes = self.populate_cells(split_line(line))
+        if self.raw_log is not None:
+            self.raw_log.write(self.log_stamp + ': ' + line.rstrip('\r\n') + '\n')
+        if self.queue is not None:
+            self.queue.put((self.log_stamp, line, changes))
+        return changes
+
+    def handle_record(self, updates):
+        #One binary frame: a whole report cycle already decoded by bms_binary
+        self.records += 1
+        changes = self.apply_updates(updates, self.tick())
+        if self.raw_log is not None:
+            #Rendered as text lines by the writer thread, so exports and replays work as before
+            self.raw_log.write_record(self.log_stamp, updates)
+        if self.queue is not None:
+            self.queue.put((self.log_stamp, None, changes))
+        return changes
+
+    def report(self, message):
+        #Status and error messages go to the GUI console if there is one, else stderr
+        if self.raw_log is not None:
+            self.raw_log.write(message)
+        if self.queue is not None:
+            self.queue.put((None, message, ()))
+        else:
+            sys.stderr.write(message)
+
+    def tick(self):
+        #The timestamps only change once a second, so only reformat them when they do
+        now = int(time.time())
+        if now != self.stamp_second:
+            self.stamp_second = now
+            stamp = datetime.fromtimestamp(now)
+            self.cells['Timestamp'] = stamp.strftime("%m-%d-%y-%H:%M:%S")
+            self.log_stamp = stamp.strftime('%Y-%m-%d %H:%M:%S')
+        return now
+
+    def populate_cells(self, line: list):
+        return self.apply_updates(self.parser.parse(line), self.tick())
+
+    def apply_updates(self, updates, now):
+        #Updating cells dictionary with freshly parsed information
+        if self.rollup is not None:
+            self.rollup.add(now, updates)
+        changes = []
+        for field, value in updates:
+            if self.cells.get(field) != value:
+                self.cells[field] = value
+                changes.append((field, value))
+        #The line that ends a BMS report cycle closes a frame
+        for frame in self.assembler.add(updates, now):
+            changes += self.handle_frame(frame)
+        return changes
+
+    def handle_frame(self, frame):
+        #Runs once per report cycle: derived metrics, then every frame consumer
+        if frame.schema is not self.schema:
+            self.apply_schema(frame.schema)
+        derived = self.metrics.compute(frame.values, frame.monotonic)
+        frame.values.update(derived)
+        if self.rollup is not None:
+            self.rollup.add(frame.timestamp, [(field, value) for field, value in derived if value is not None])
+        changes = []
+        for field, value in derived:
+            if self.cells.get(field) != value:
+                self.cells[field] = value
+                changes.append((field, value))
+        for _, _, _, text in self.alarms.check(frame):
+            self.report(f"{self.log_stamp}: {text}\n")
+        self.last_frame = frame
+        for listener in self.frame_listeners:
+            listener(frame)
+        #Rows are only logged once every field has been reported
+        if frame.filled:
+            self.write_to_parsed_log(frame)
+        return changes
+
+    #Writes a frame into the CSV stream
+    def write_to_parsed_log(self, frame):
+        if frame.monotonic - self.t_ref >= self.delta_t:
+            if self.logger is not None:
+                self.logger.write(frame.timestamp, frame.values)
+            if self.columnar_log is not None:
+                self.columnar_log.write(frame.timestamp, frame.values)
+            self.t_ref = frame.monotonic
@@ -0,0 +1,62 @@
+#Streaming exports of the on-disk raw log.
+#The XML is written element by element while the raw log is read line by line,
+#so memory use doesn't grow with the session length.
+import os
+from xml.sax.saxutils import XMLGenerator
+
+from bms_parser import LineParser, split_line
+from bms_replay import TXT_STAMP
+
+#Progress is reported at most this often (in bytes read)
+PROGRESS_STEP = 256 * 1024
+
+
+def export_xml(paths, filename, progress=None):
+    #Writes the raw log files in paths as one XML document:
+    #  <LogData><Entry time="..."><volt3>33228</volt3></Entry>...</LogData>
+    #Lines the parser doesn't know are kept as <Message> entries.
+    #progress(done, total) is called with byte counts. Returns the number of entries.
+    total = sum(os.path.getsize(path) for path in paths)
+    done = 0
+    reported = 0
+    entries = 0
+    parser = LineParser()
+    with open(filename, "w", encoding="utf-8", buffering=1024 * 1024) as file:
+        xml = XMLGenerator(file, encoding="utf-8", short_empty_elements=True)
+        xml.startDocument()
+        xml.startElement("LogData", {})
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace", newline="") as raw:
+                for text in raw:
+                    done += len(text)
+                    match = TXT_STAMP.match(text)
+                    if match:
+                        stamp, line = match.group(1), match.group(2)
+                    else:
+                        stamp, line = None, text
+                    line = line.rstrip('\r\n')
+                    if not line:
+                        continue
+                    xml.ignorableWhitespace("\n  ")
+                    xml.startElement("Entry", {"time": stamp} if stamp else {})
+                    updates = parser.parse(split_line(line))
+                    if updates:
+                        for field, value in updates:
+                            xml.startElement(field, {})
+                            xml.characters(str(value))
+                            xml.endElement(field)
+                    else:
+                        xml.startElement("Message", {})
+                        xml.characters(line)
+                        xml.endElement("Message")
+                    xml.endElement("Entry")
+                    entries += 1
+                    if progress is not None and done - reported >= PROGRESS_STEP:
+                        reported = done
+                        progress(done, total)
+        xml.ignorableWhitespace("\n")
+        xml.endElement("LogData")
+        xml.endDocument()
+    if progress is not None:
+        progress(total, total)
+    return entries
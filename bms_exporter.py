@@ -0,0 +1,260 @@
+#Publishes the live BMS state to other monitoring tools.
+#A snapshot thread renders the latest frame and the pipeline's health counters
+#once per interval; the HTTP endpoint (Prometheus text format, GET /metrics) and
+#the optional UDP push (InfluxDB line protocol) only ever send the last rendered
+#snapshot, so a scrape never touches the reader thread or its data.
+#
+#  python fle_monitor.py --headless --port /dev/ttyUSB0 --metrics-port 9108 --udp 10.0.0.5:8089
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bms_parser import STRING_FIELDS
+
+METRICS_PORT = 9108
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+#Largest UDP datagram sent; points of packs with many cells are split into several
+#points with the same tags and time, which InfluxDB merges back into one
+MAX_DATAGRAM = 1400
+
+#(metric, type, help, engine -> value) for the pipeline health counters
+HEALTH = (
+    ('bms_lines_total', 'counter', "Text lines received", lambda engine: engine.lines),
+    ('bms_binary_frames_total', 'counter', "Binary frames received", lambda engine: engine.records),
+    ('bms_frames_total', 'counter', "Report cycles assembled", lambda engine: engine.assembler.frames),
+    ('bms_parse_errors_total', 'counter', "Lines that matched a rule but could not be converted",
+     lambda engine: engine.parser.errors),
+    ('bms_framing_errors_total', 'counter', "Overlong lines and corrupt binary frames",
+     lambda engine: engine.decoder.framing_errors),
+    ('bms_read_errors_total', 'counter', "Serial read errors", lambda engine: engine.read_errors),
+    ('bms_reconnects_total', 'counter', "Times the port was reopened", lambda engine: engine.reconnects),
+    ('bms_bytes_per_second', 'gauge', "Bytes received per second", lambda engine: engine.byte_rate),
+    ('bms_rows_logged_total', 'counter', "Rows written to the CSV log", lambda engine: engine.rows_logged),
+    ('bms_queue_depth', 'gauge', "Items waiting for the GUI",
+     lambda engine: 0 if engine.queue is None else engine.queue.depth()),
+    ('bms_log_pending', 'gauge', "Entries queued for the log writers",
+     lambda engine: sum(len(log.pending) for log in engine.logs())),
+    ('bms_log_dropped_total', 'counter', "Log entries dropped because a writer fell behind",
+     lambda engine: sum(log.dropped for log in engine.logs())),
+    ('bms_log_errors_total', 'counter', "Log write errors", lambda engine: sum(log.errors for log in engine.logs())),
+    ('bms_connected', 'gauge', "1 while the port is open", lambda engine: int(engine.connection_active)),
+)
+
+
+def _label(text):
+    return str(text).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _tag(text):
+    #Line protocol tag values escape commas, spaces and equals signs
+    return str(text).replace(',', '\\,').replace(' ', '\\ ').replace('=', '\\=')
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Snapshot:
+    #Everything one pack publishes, gathered once per interval
+    def __init__(self, name, engine, previous=None, now=None):
+        now = time.monotonic() if now is None else now
+        self.name = name
+        self.time = now
+        self.epoch = time.time()
+        frame = engine.last_frame
+        self.values = {} if frame is None else frame.values
+        self.frame_age = None if frame is None else now - frame.monotonic
+        self.health = [(metric, kind, text, get(engine)) for metric, kind, text, get in HEALTH]
+        self.alarms = list(engine.alarms.summary)
+        self.lines = engine.lines + engine.records
+        #Lines (and binary frames) per second since the previous snapshot
+        self.line_rate = 0.0
+        if previous is not None and now > previous.time:
+            self.line_rate = (self.lines - previous.lines) / (now - previous.time)
+
+
+def _family(out, metric, kind, text):
+    out.append(f"# HELP {metric} {text}")
+    out.append(f"# TYPE {metric} {kind}")
+
+
+def render_prometheus(snapshots):
+    out = []
+    for index, (metric, kind, text, _) in enumerate(HEALTH):
+        _family(out, metric, kind, text)
+        for snapshot in snapshots:
+            out.append(f'{metric}{{pack="{_label(snapshot.name)}"}} {_number(snapshot.health[index][3])}')
+    _family(out, 'bms_lines_per_second', 'gauge', "Lines and binary frames received per second")
+    for snapshot in snapshots:
+        out.append(f'bms_lines_per_second{{pack="{_label(snapshot.name)}"}} {snapshot.line_rate:.3f}')
+    _family(out, 'bms_frame_age_seconds', 'gauge', "Seconds since the last complete report cycle")
+    for snapshot in snapshots:
+        if snapshot.frame_age is not None:
+            out.append(f'bms_frame_age_seconds{{pack="{_label(snapshot.name)}"}} {snapshot.frame_age:.3f}')
+    _family(out, 'bms_value', 'gauge', "Latest value of each BMS field, in raw BMS units")
+    for snapshot in snapshots:
+        pack = _label(snapshot.name)
+        for field, value in snapshot.values.items():
+            if value is not None and field not in STRING_FIELDS:
+                out.append(f'bms_value{{pack="{pack}",field="{field}"}} {value}')
+    _family(out, 'bms_charging_mode', 'gauge', "1 for the pack's current charging mode")
+    for snapshot in snapshots:
+        mode = snapshot.values.get('Charging_Mode')
+        if mode is not None:
+            out.append(f'bms_charging_mode{{pack="{_label(snapshot.name)}",mode="{_label(mode)}"}} 1')
+    _family(out, 'bms_alarm_active', 'gauge', "1 for every active alarm and DTC")
+    for snapshot in snapshots:
+        for name, _ in snapshot.alarms:
+            out.append(f'bms_alarm_active{{pack="{_label(snapshot.name)}",alarm="{_label(name)}"}} 1')
+    return ('\n'.join(out) + '\n').encode("utf-8")
+
+
+def _split_point(measurement, tags, fields, stamp):
+    #Encoded points holding fields, each at most MAX_DATAGRAM bytes unless a single
+    #field is longer than that on its own
+    head = f"{measurement},{tags} ".encode("utf-8")
+    tail = f" {stamp}".encode("utf-8")
+    room = MAX_DATAGRAM - len(head) - len(tail)
+    points = []
+    chunk = []
+    size = 0
+    for field in fields:
+        field = field.encode("utf-8")
+        if chunk and size + 1 + len(field) > room:
+            points.append(head + b','.join(chunk) + tail)
+            chunk = []
+            size = 0
+        size += len(field) + (1 if chunk else 0)
+        chunk.append(field)
+    if chunk:
+        points.append(head + b','.join(chunk) + tail)
+    return points
+
+
+def render_lines(snapshots):
+    #InfluxDB line protocol: one bms point with every field and one bms_health point
+    #per pack, each split up if it wouldn't fit in a datagram
+    points = []
+    for snapshot in snapshots:
+        stamp = int(snapshot.epoch * 1e9)
+        tags = f"pack={_tag(snapshot.name)}"
+        fields = []
+        for field, value in snapshot.values.items():
+            if value is None:
+                continue
+            if field in STRING_FIELDS:
+                fields.append(f'{field}="{_label(value)}"')
+            else:
+                fields.append(f"{field}={value}i")
+        points += _split_point("bms", tags, fields, stamp)
+        health = [f"{metric[4:]}={_number(value)}{'i' if isinstance(value, int) else ''}"
+                  for metric, _, _, value in snapshot.health]
+        health.append(f"lines_per_second={snapshot.line_rate:.3f}")
+        points += _split_point("bms_health", tags, health, stamp)
+    return points
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.server.exporter.body
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        #Scrapes every few seconds would flood stderr
+        pass
+
+
+class MetricsExporter:
+    def __init__(self, packs, interval=1.0, host="127.0.0.1", port=METRICS_PORT, udp=None):
+        #packs() returns the (name, engine) pairs to publish; udp is (host, port) or None
+        self.packs = packs
+        self.interval = interval
+        self.host = host
+        self.port = port
+        self.udp = udp
+        #Last rendered Prometheus text, swapped in whole by the snapshot thread
+        self.body = b''
+        self.previous = {}
+        self.server = None
+        self.socket = None
+        self.stopping = threading.Event()
+        self.threads = []
+        #Counters
+        self.snapshots = 0
+        self.udp_errors = 0
+
+    def start(self):
+        #Raises if the HTTP port is taken
+        self.refresh()
+        if self.port is not None:
+            self.server = ThreadingHTTPServer((self.host, self.port), _Handler)
+            self.server.daemon_threads = True
+            self.server.exporter = self
+            self.port = self.server.server_address[1]
+            self._spawn(self.server.serve_forever, "bms-metrics-http")
+        if self.udp is not None:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._spawn(self._run, "bms-metrics")
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def stop(self):
+        self.stopping.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.socket is not None:
+            self.socket.close()
+
+    def refresh(self):
+        #Takes a new snapshot of every pack; returns them
+        now = time.monotonic()
+        snapshots = [Snapshot(name, engine, self.previous.get(name), now) for name, engine in self.packs()]
+        self.previous = {snapshot.name: snapshot for snapshot in snapshots}
+        self.body = render_prometheus(snapshots)
+        self.snapshots += 1
+        return snapshots
+
+    def push(self, snapshots):
+        datagram = b''
+        for point in render_lines(snapshots):
+            if datagram and len(datagram) + len(point) + 1 > MAX_DATAGRAM:
+                self._send(datagram)
+                datagram = b''
+            datagram = datagram + b'\n' + point if datagram else point
+        if datagram:
+            self._send(datagram)
+
+    def _send(self, datagram):
+        try:
+            self.socket.sendto(datagram, self.udp)
+        except OSError:
+            self.udp_errors += 1
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            snapshots = self.refresh()
+            if self.socket is not None:
+                self.push(snapshots)
+
+
+def parse_address(text, default_port):
+    #"host:port" or "host" -> (host, port)
+    host, _, port = text.rpartition(':')
+    if not host:
+        return text, default_port
+    return host, int(port)
@@ -0,0 +1,129 @@
+#Frame assembly: groups the parsed lines of one BMS report cycle into a frame.
+#A cycle ends at its DTC line. If that line is lost, the cycle is closed as soon
+#as a field repeats, which means the next cycle has started.
+#Each frame is a snapshot of every field's latest value plus the set of fields the
+#cycle didn't report (stale), so consumers never see a row torn across two cycles.
+#The number of cells and temperature sensors is discovered from the stream.
+import time
+
+from bms_parser import make_fields
+
+#Field of the last line of a BMS report cycle
+CYCLE_END = 'Error_Codes'
+
+_NOTHING_STALE = frozenset()
+
+
+class PackSchema:
+    #Cell and sensor counts seen so far; volt/soc fields count cells, adc fields sensors
+    def __init__(self, cells=0, sensors=0):
+        self.cells = cells
+        self.sensors = sensors
+        self.fields = tuple(make_fields(cells, sensors))
+
+    def observe(self, field):
+        #Grows the schema for a field it doesn't cover yet. Returns True if it did.
+        for prefix, attribute in (('volt', 'cells'), ('soc', 'cells'), ('adc', 'sensors')):
+            if field.startswith(prefix) and field[len(prefix):].isdigit():
+                count = int(field[len(prefix):]) + 1
+                if count > getattr(self, attribute):
+                    setattr(self, attribute, count)
+                    self.fields = tuple(make_fields(self.cells, self.sensors))
+                    return True
+                return False
+        return False
+
+
+class Frame:
+    __slots__ = ('sequence', 'timestamp', 'monotonic', 'values', 'stale', 'filled', 'schema')
+
+    def __init__(self, sequence, timestamp, monotonic, values, stale, filled, schema):
+        self.sequence = sequence
+        #Epoch second and monotonic time the cycle closed at
+        self.timestamp = timestamp
+        self.monotonic = monotonic
+        #field -> value; shared with every consumer, so treat it as read only
+        self.values = values
+        #Fields this cycle didn't report; their values are carried over from earlier cycles
+        self.stale = stale
+        #Every field has been reported at least once, i.e. the row has no gaps, and the
+        #cycle that grew the schema (if any) was seen from its start
+        self.filled = filled
+        #Ordered fields of the pack as known when the frame closed; the same tuple
+        #until the schema grows, so consumers can compare it by identity
+        self.schema = schema
+
+    @property
+    def complete(self):
+        return not self.stale
+
+    def fresh(self):
+        #(field, value) for the fields this cycle reported
+        stale = self.stale
+        return [(field, value) for field, value in self.values.items() if field not in stale]
+
+
+class FrameAssembler:
+    def __init__(self, schema=None, end_field=CYCLE_END, clock=time.monotonic):
+        self.schema = PackSchema() if schema is None else schema
+        self.fields = frozenset(self.schema.fields)
+        self.end_field = end_field
+        self.clock = clock
+        #Latest value of every field and the fields reported in the open cycle
+        self.values = {}
+        self.seen = set()
+        self.sequence = 0
+        #The schema grew during the open cycle, and the field the cycle started with;
+        #unless that is the schema's first field, the cycle's start may have been missed
+        self.grown = False
+        self.first = None
+        #Counters
+        self.frames = 0
+        self.torn = 0
+
+    def add(self, updates, timestamp):
+        #updates are the (field, value) pairs of one line. Returns the frames this
+        #line closed, almost always none or one.
+        frames = None
+        seen = self.seen
+        values = self.values
+        for field, value in updates:
+            if field in seen:
+                #The end of the previous cycle was lost
+                self.torn += 1
+                frames = [self._close(timestamp)]
+                seen = self.seen
+            if not seen:
+                self.first = field
+            if field not in self.fields and self.schema.observe(field):
+                self.fields = frozenset(self.schema.fields)
+                self.grown = True
+            seen.add(field)
+            values[field] = value
+        if updates and updates[-1][0] == self.end_field:
+            frame = self._close(timestamp)
+            if frames is None:
+                return [frame]
+            frames.append(frame)
+        return frames or ()
+
+    def _close(self, timestamp):
+        seen = self.seen
+        values = self.values
+        fields = self.fields
+        if len(seen) >= len(fields) and fields <= seen:
+            stale = _NOTHING_STALE
+        else:
+            stale = frozenset(fields - seen)
+        self.sequence += 1
+        self.frames += 1
+        filled = fields <= values.keys() and (not self.grown or self.first == self.schema.fields[0])
+        frame = Frame(self.sequence, timestamp, self.clock(), dict(values), stale, filled, self.schema.fields)
+        self.seen = set()
+        self.grown = False
+        return frame
+
+    def reset(self):
+        self.values = {}
+        self.seen = set()
+        self.grown = False
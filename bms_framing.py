@@ -0,0 +1,102 @@
+#Byte stream framing for the serial readers.
+#LineFramer splits the text protocol into lines; StreamDecoder sits in front of
+#it and switches to the binary protocol (bms_binary) as soon as a frame sync
+#shows up, and back to text once valid frames stop coming.
+from bms_binary import SYNC, FrameDecoder
+
+#Longest line kept while waiting for its newline; anything longer is garbage
+MAX_LINE = 4096
+
+
+class LineFramer:
+    #Splits a byte stream into decoded text lines, keeping partial lines between reads
+    def __init__(self, max_line=MAX_LINE):
+        self.buffer = bytearray()
+        self.max_line = max_line
+        #Counters
+        self.bytes = 0
+        self.overruns = 0
+        self.decode_errors = 0
+
+    def feed(self, data):
+        #Returns the complete lines in data, each still ending in "\n"
+        self.bytes += len(data)
+        buffer = self.buffer
+        buffer += data
+        end = buffer.rfind(b'\n')
+        if end < 0:
+            if len(buffer) > self.max_line:
+                self.overruns += 1
+                buffer.clear()
+            return []
+        chunk = bytes(buffer[:end + 1])
+        del buffer[:end + 1]
+        try:
+            text = chunk.decode("utf-8")
+        except UnicodeDecodeError:
+            self.decode_errors += 1
+            text = chunk.decode("utf-8", "replace")
+        return text.splitlines(keepends=True)
+
+
+#Bytes without a valid binary frame after which the stream is taken to be text again
+FALLBACK_BYTES = 2048
+
+
+class StreamDecoder:
+    #Auto-detects the protocol; text until a binary frame sync is seen
+    def __init__(self, max_line=MAX_LINE):
+        self.lines = LineFramer(max_line)
+        self.frames = FrameDecoder()
+        self.binary = False
+        #Counters
+        self.bytes = 0
+        self.switches = 0
+
+    @property
+    def framing_errors(self):
+        #Overlong or undecodable lines and corrupt binary frames
+        lines = self.lines
+        frames = self.frames
+        return lines.overruns + lines.decode_errors + frames.crc_errors + frames.bad_frames
+
+    def reset(self):
+        #Drops partial lines and frames, e.g. after a reconnect; the protocol is detected again
+        self.lines.buffer.clear()
+        self.frames.take()
+        self.frames.drop_junk()
+        self.binary = False
+
+    def feed(self, data):
+        #Returns (text lines, binary frames as lists of (field, value) updates)
+        self.bytes += len(data)
+        if not self.binary:
+            start = data.find(SYNC)
+            partial = self.lines.buffer
+            if start < 0 and not (partial.endswith(SYNC[:1]) and data.startswith(SYNC[1:])):
+                return self.lines.feed(data), ()
+            if start < 0:
+                #The sync was split between two reads
+                del partial[-1:]
+                data = SYNC[:1] + data
+                start = 0
+            lines = self.lines.feed(data[:start]) if start else []
+            self.binary = True
+            self.switches += 1
+            self.frames.drop_junk()
+            more, frames = self._feed_frames(data[start:])
+            return lines + more, frames
+        return self._feed_frames(data)
+
+    def _feed_frames(self, data):
+        decoder = self.frames
+        frames = decoder.feed(data)
+        if decoder.junk > FALLBACK_BYTES:
+            #No valid frame for a while: a sync inside text or noise, or firmware
+            #that went back to text. Everything since the last good frame is text.
+            self.binary = False
+            self.switches += 1
+            text = bytes(decoder.junk_bytes) + decoder.take()
+            decoder.drop_junk()
+            return self.lines.feed(text), frames
+        return [], frames
@@ -0,0 +1,300 @@
+#Streaming session loggers.
+#Entries are queued by the reader thread and written by a background thread, so the
+#session is on disk as it happens and files rotate by size and age.
+#StreamingLogger writes the parsed CSV rows, RawLogger the raw console lines and
+#ColumnarLogger the parsed rows as a columnar session (see bms_columnar) and
+#RollupLogger the per-interval aggregates from bms_rollup.
+#When the columns change (a pack with more cells, see bms_frames.PackSchema) the
+#current file is closed and the rest of the session goes to a new one.
+import csv
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from bms_parser import FIELDS, STRING_FIELDS
+from bms_columnar import ColumnarWriter, SESSION_EXT
+from bms_synth import frame_lines, pack_size
+
+EXPORT_DIR = "CSV Exports"
+TIMESTAMP_FORMAT = "%m-%d-%y-%H:%M:%S"
+
+
+class _Reopen:
+    #Queued between entries when the columns change: the file is closed there and
+    #the next one is started with the new columns
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+
+class _BackgroundWriter:
+    extension = ".txt"
+
+    def __init__(self, directory=EXPORT_DIR, prefix="serial_log_", flush_interval=1.0,
+                 fsync_interval=10.0, max_bytes=50 * 1024 * 1024, max_age=24 * 3600,
+                 max_pending=100000):
+        self.directory = directory
+        self.prefix = prefix
+        #Seconds between writes to the file, and between fsyncs (None = leave it to the OS)
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        #Rotation limits, a new file is started once either is reached
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        #Entries waiting for the writer. Rows beyond max_pending are dropped (a stuck
+        #disk); _Reopen markers are always queued so rows never land under the wrong header.
+        self.pending = deque()
+        self.max_pending = max_pending
+        self.wake = threading.Event()
+        #pump() may be called from the writer thread and, for exports, the GUI thread
+        self.pump_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.file = None
+        self.path = None
+        self.paths = []
+        self.opened_at = 0
+        self.synced_at = 0
+        #Columns of the logger, as snapshotted by write() and as written to the current file
+        self.fields = []
+        self.file_fields = []
+
+        #Counters
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self, background=True):
+        #Without a background thread the owner has to call pump() regularly
+        if self.running:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.running = True
+        if background:
+            self.thread = threading.Thread(target=self._run, name="bms-logger", daemon=True)
+            self.thread.start()
+
+    def _queue(self, entry):
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.pending.append(entry)
+
+    def set_fields(self, fields):
+        #Reader thread side: rows queued from now on have these columns and go to a new file
+        fields = list(fields)
+        if fields != self.fields:
+            self.fields = fields
+            self.pending.append(_Reopen(fields))
+
+    def flush(self):
+        #Asks the writer thread to write out everything queued so far
+        self.wake.set()
+
+    def pump(self):
+        #Writes out everything queued so far on the calling thread
+        with self.pump_lock:
+            try:
+                self._write_pending()
+            except OSError:
+                self.errors += 1
+
+    def close(self):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        else:
+            self.pump()
+        with self.pump_lock:
+            self._close_file()
+
+    def _open(self, now):
+        name = f"{self.prefix}{datetime.fromtimestamp(now).strftime('%Y%m%d%H%M%S')}"
+        path = os.path.join(self.directory, name + self.extension)
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f"{name}_{suffix}{self.extension}")
+            suffix += 1
+        self.file = self._create(path)
+        self._opened()
+        self.path = path
+        self.paths.append(path)
+        self.opened_at = now
+        self.synced_at = now
+
+    def _create(self, path):
+        return open(path, "w", newline="", buffering=1024 * 1024)
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+
+    def _opened(self):
+        #Hook for writing a header
+        pass
+
+    def _write_entry(self, entry):
+        raise NotImplementedError
+
+    def _close_file(self):
+        if self.file is not None:
+            self.file.flush()
+            self._sync()
+            self.file.close()
+            self.file = None
+
+    def _write_pending(self):
+        pending = self.pending
+        if not pending:
+            return
+        now = time.time()
+        while pending:
+            entry = pending.popleft()
+            if entry.__class__ is _Reopen:
+                self._close_file()
+                self.file_fields = entry.fields
+                continue
+            if self.file is None:
+                self._open(now)
+            self._write_entry(entry)
+            self.written += 1
+        if self.file is None:
+            return
+        self.file.flush()
+        if self.fsync_interval is not None and now - self.synced_at >= self.fsync_interval:
+            self._sync()
+            self.synced_at = now
+        if self.file.tell() >= self.max_bytes or now - self.opened_at >= self.max_age:
+            self._close_file()
+
+    def _run(self):
+        while self.running:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.pump()
+        self.pump()
+
+
+class StreamingLogger(_BackgroundWriter):
+    extension = ".csv"
+
+    def __init__(self, directory=EXPORT_DIR, fields=FIELDS, prefix="serial_log_", **options):
+        super().__init__(directory, prefix, **options)
+        self.fields = list(fields)
+        self.file_fields = self.fields
+        self.writer = None
+        self.last_stamp = None
+        self.last_stamp_text = ''
+
+    @property
+    def rows_written(self):
+        return self.written
+
+    def write(self, timestamp, cells):
+        #Reader thread side: snapshots one row, the formatting happens on the writer thread
+        get = cells.get
+        self._queue((timestamp, [get(field) for field in self.fields]))
+
+    def _opened(self):
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['Timestamp'] + self.file_fields)
+
+    def _stamp(self, timestamp):
+        if timestamp != self.last_stamp:
+            self.last_stamp = timestamp
+            self.last_stamp_text = datetime.fromtimestamp(timestamp).strftime(TIMESTAMP_FORMAT)
+        return self.last_stamp_text
+
+    def _write_entry(self, entry):
+        timestamp, values = entry
+        self.writer.writerow([self._stamp(timestamp)] + values)
+
+
+class RollupLogger(StreamingLogger):
+    #One row per rollup bucket: the usual columns hold the last value, so the file
+    #reads like a normal export, followed by <field>_min/_max/_mean and sample counts
+    def __init__(self, directory=EXPORT_DIR, fields=FIELDS, prefix="serial_log_1s_", **options):
+        super().__init__(directory, fields, prefix, **options)
+        self.numeric = []
+
+    def write(self, timestamp, stats):
+        #stats is a closed bucket from bms_rollup.Rollup and isn't touched again by the reader
+        self._queue((timestamp, stats))
+
+    def _opened(self):
+        self.writer = csv.writer(self.file)
+        self.numeric = [field for field in self.file_fields if field not in STRING_FIELDS]
+        header = ['Timestamp'] + self.file_fields
+        for field in self.numeric:
+            header += [field + '_min', field + '_max', field + '_mean']
+        self.writer.writerow(header + ['samples'])
+
+    def _write_entry(self, entry):
+        timestamp, stats = entry
+        get = stats.get
+        row = [self._stamp(timestamp)]
+        for field in self.file_fields:
+            values = get(field)
+            row.append(None if values is None else values[4])
+        samples = 0
+        for field in self.numeric:
+            values = get(field)
+            if values is None:
+                row += [None, None, None]
+            else:
+                count, total, low, high, _ = values
+                row += [low, high, round(total / count, 2)]
+                samples = max(samples, count)
+        row.append(samples)
+        self.writer.writerow(row)
+
+
+class RawLogger(_BackgroundWriter):
+    #Full console history ("<stamp>: <line>"), the source for TXT and XML exports
+    def __init__(self, directory=EXPORT_DIR, prefix="raw_log_", **options):
+        super().__init__(directory, prefix, **options)
+
+    def write(self, text):
+        #text must end in a newline
+        self._queue(text)
+
+    def write_record(self, stamp, updates):
+        #A binary frame's updates, written out as the text lines the board would have sent
+        self._queue((stamp, updates))
+
+    def _write_entry(self, entry):
+        if entry.__class__ is str:
+            self.file.write(entry)
+            return
+        stamp, updates = entry
+        record = dict(updates)
+        cells, sensors = pack_size(record)
+        self.file.writelines(f"{stamp}: {line.rstrip()}\n" for line in frame_lines(record, cells, sensors))
+
+
+class ColumnarLogger(_BackgroundWriter):
+    #Same rows as StreamingLogger, written as a memory-mappable session directory
+    extension = SESSION_EXT
+
+    def __init__(self, directory=EXPORT_DIR, fields=FIELDS, prefix="serial_log_", **options):
+        super().__init__(directory, prefix, **options)
+        self.fields = list(fields)
+        self.file_fields = self.fields
+
+    def write(self, timestamp, cells):
+        get = cells.get
+        self._queue((timestamp, [get(field) for field in self.fields]))
+
+    def _create(self, path):
+        return ColumnarWriter(path, self.file_fields)
+
+    def _sync(self):
+        self.file.sync()
+
+    def _write_entry(self, entry):
+        self.file.append(*entry)
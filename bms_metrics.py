@@ -0,0 +1,93 @@
+#Derived pack metrics, computed once per BMS report cycle.
+#The results are plain (field, value) updates like the parser's, so the GUI,
+#the loggers and the alarms all read the same values instead of recomputing them.
+#All values stay integers in the BMS's own units so they fit the int32 columns.
+from collections import deque
+
+from bms_parser import CELL_COUNT
+from bms_store import MISSING
+
+#Raw cell voltage the BMS reports for a cell it can't measure
+INVALID_VOLT = 65535
+#Seconds of history behind the rolling dV/dt
+DVDT_WINDOW = 30.0
+
+DERIVED_FIELDS = [
+    'cell_spread',      #max - min cell voltage (0.1 mV)
+    'min_cell_volt',    #(0.1 mV)
+    'max_cell_volt',
+    'weakest_cell',     #index of the lowest cell, 0 based like volt0..
+    'pack_power',       #pack_volt x current (mW)
+    'temp_max',         #hottest temperature sensor reading
+    'hottest_sensor',   #index of that sensor
+    'pack_dvdt',        #pack voltage slope over DVDT_WINDOW (mV/min)
+    'cell_dvdt',        #weakest cell voltage slope over DVDT_WINDOW (0.1 mV/min)
+]
+
+
+def _slope(first, last, elapsed):
+    #Change per minute, None until there are two samples
+    if first is None or last is None or elapsed <= 0:
+        return None
+    return round((last - first) * 60 / elapsed)
+
+
+class FrameMetrics:
+    def __init__(self, cells=CELL_COUNT, sensors=CELL_COUNT, window=DVDT_WINDOW):
+        self.resize(cells, sensors)
+        self.window = window
+        #(monotonic time, pack_volt, min cell volt) for the rolling slopes
+        self.history = deque()
+        #Latest value of every derived field
+        self.values = dict.fromkeys(DERIVED_FIELDS)
+
+    def resize(self, cells, sensors):
+        #For packs with another number of cells or temperature sensors
+        self.volt_fields = ['volt' + str(i) for i in range(cells)]
+        self.temp_fields = ['adc' + str(i) for i in range(sensors)]
+
+    def compute(self, cells, now):
+        #cells is the field -> value mapping of a complete cycle, now a monotonic time.
+        #Returns the derived values as (field, value) pairs.
+        get = cells.get
+        volts = [get(field) for field in self.volt_fields]
+        valid = [v for v in volts if v is not None and v < INVALID_VOLT]
+        temps = [get(field) for field in self.temp_fields]
+        temps = [MISSING if t is None else t for t in temps]
+        values = self.values
+
+        if valid:
+            low = min(valid)
+            high = max(valid)
+            values['min_cell_volt'] = low
+            values['max_cell_volt'] = high
+            values['cell_spread'] = high - low
+            values['weakest_cell'] = volts.index(low)
+        else:
+            low = None
+            values['min_cell_volt'] = values['max_cell_volt'] = values['cell_spread'] = values['weakest_cell'] = None
+
+        hottest = max(temps, default=MISSING)
+        if hottest == MISSING:
+            values['temp_max'] = values['hottest_sensor'] = None
+        else:
+            values['temp_max'] = hottest
+            values['hottest_sensor'] = temps.index(hottest)
+
+        pack_volt = get('pack_volt')
+        current = get('current')
+        values['pack_power'] = pack_volt * current // 1000 if pack_volt is not None and current is not None else None
+
+        history = self.history
+        history.append((now, pack_volt, low))
+        while now - history[0][0] > self.window:
+            history.popleft()
+        then, first_pack, first_low = history[0]
+        elapsed = now - then
+        values['pack_dvdt'] = _slope(first_pack, pack_volt, elapsed)
+        values['cell_dvdt'] = _slope(first_low, low, elapsed)
+        return list(values.items())
+
+    def reset(self):
+        self.history.clear()
+        self.values = dict.fromkeys(DERIVED_FIELDS)
@@ -0,0 +1,134 @@
+#Table-driven parser for the BMS text protocol.
+#The rule table below is compiled once into one small function per line keyword.
+#A line is dispatched on its first token with a single dict lookup, so it is only
+#tested against the rule(s) for that keyword and comes back as typed (field, value)
+#updates. Lines starting with anything else go through the whole table in order.
+from string import Formatter
+
+CELL_COUNT = 8
+
+
+def make_fields(cells=CELL_COUNT, sensors=CELL_COUNT):
+    #Every field of a pack with this many cells and temperature sensors,
+    #in the order the BMS reports them
+    return (
+        ['adc' + str(i) for i in range(sensors)]
+        + ['temperature_gradient', 'mean_temp', 'term_volt', 'drain_volt']
+        + ['volt' + str(i) for i in range(cells)]
+        + ['mean_cell_voltage', 'pack_volt', 'current']
+        + ['soc' + str(i) for i in range(cells)]
+        + ['total_soc', 'time_remaining', 'capacity', 'Charging_Mode', 'max_current', 'Vbus', 'Vsafe', 'Error_Codes']
+    )
+
+
+#Every field the parser produces for the standard 8 cell pack; other cell counts
+#come out of the same rules (see bms_frames.PackSchema)
+FIELDS = make_fields()
+
+#Fields that are kept as text, everything else is a raw BMS integer
+STRING_FIELDS = frozenset(['Charging_Mode', 'Error_Codes'])
+
+
+def _key_value(token):
+    #"Vbus=1234" -> 1234
+    return int(token.partition('=')[2])
+
+
+#Value conversions used by the rule table
+INT = int
+KEY_VALUE = _key_value
+TEXT = str
+
+#Declarative rule table, checked in order; the first matching rule wins.
+#Each rule is (first token of the line, tokens that must appear, tokens that must
+#not appear, extractions) and each extraction is (field name, token index,
+#conversion). Field names may reference other tokens of the line, e.g. "volt{1}"
+#for "cell 3 volt 33228".
+RULES = (
+    ('cell', ('cell', 'volt'), ('dev', 'pack'), (('volt{1}', 3, INT),)),
+    ('pack', ('mean', 'cell', 'voltage'), (), (('mean_cell_voltage', 7, INT), ('pack_volt', 3, INT))),
+    ('term', ('term',), (), (('term_volt', 2, INT),)),
+    ('drain', ('drain',), (), (('drain_volt', 2, INT),)),
+    ('current', ('current',), ('Charging',), (('current', 2, INT),)),
+    ('soc', ('soc',), ('zp', 'total'), (('{0}{1}', 3, INT),)),
+    ('total', ('total', 'soc'), ('volt',), (('total_soc', 2, INT), ('time_remaining', 7, INT), ('capacity', 4, INT))),
+    ('temp', ('deviation',), (), (('temperature_gradient', 3, INT), ('mean_temp', 6, INT))),
+    ('Vsafe', ('Vsafe',), (), (('Vsafe', 1, KEY_VALUE),)),
+    ('Charging', ('Charging',), (), (('Charging_Mode', 2, TEXT), ('max_current', 5, KEY_VALUE), ('Vbus', 3, KEY_VALUE))),
+    ('adc', ('adc',), (), (('{0}{1}', 3, INT),)),
+    ('DTC', ('DTC',), (), (('Error_Codes', 1, TEXT),)),
+)
+
+
+def split_line(raw):
+    #Same tokenisation the serial reader has always used
+    return raw.rstrip('\r\n').split(' ')
+
+
+def _field_source(field):
+    #"volt{1}" -> "'volt' + line[1]"
+    parts = []
+    for literal, position, _, _ in Formatter().parse(field):
+        if literal:
+            parts.append(repr(literal))
+        if position is not None:
+            parts.append(f"line[{int(position)}]")
+    return ' + '.join(parts)
+
+
+def _rule_source(rule, namespace, known=None):
+    #Source lines testing one rule and returning its updates; known is a token
+    #the line is already known to hold, which needn't be searched for again
+    _, required, forbidden, extractions = rule
+    tests = [f"{token!r} in line" for token in required if token != known]
+    tests += [f"{token!r} not in line" for token in forbidden]
+    values = []
+    for field, position, convert in extractions:
+        name = f"convert{len(namespace)}"
+        namespace[name] = convert
+        values.append(f"({_field_source(field)}, {name}(line[{position}]))")
+    if not tests:
+        return [f"    return [{', '.join(values)}]"]
+    return [f"    if {' and '.join(tests)}:",
+            f"        return [{', '.join(values)}]"]
+
+
+def compile_rules(rules):
+    #Generates (dispatch, fallback): dispatch maps a line's first token to a function
+    #testing only that keyword's rules, fallback tests the whole table in order (for
+    #lines with an unknown first token, and keyword lines none of its rules match)
+    namespace = {}
+    source = ["def fallback(line):"]
+    for rule in rules:
+        source += _rule_source(rule, namespace)
+    source.append("    return []")
+    keywords = {}
+    for rule in rules:
+        keywords.setdefault(rule[0], []).append(rule)
+    for index, (keyword, keyword_rules) in enumerate(keywords.items()):
+        source.append(f"def keyword{index}(line):")
+        for rule in keyword_rules:
+            source += _rule_source(rule, namespace, keyword)
+        source.append("    return fallback(line)")
+    exec(compile('\n'.join(source), '<bms rules>', 'exec'), namespace)
+    dispatch = {keyword: namespace[f"keyword{index}"] for index, keyword in enumerate(keywords)}
+    return dispatch, namespace['fallback']
+
+
+class LineParser:
+    def __init__(self, rules=RULES):
+        self.rules = rules
+        self._dispatch, self._fallback = compile_rules(rules)
+        #Lines that matched a rule but could not be converted
+        self.errors = 0
+
+    def parse(self, tokens):
+        #Returns a list of (field, value) updates for one tokenised line
+        try:
+            return self._dispatch.get(tokens[0], self._fallback)(tokens)
+        except (IndexError, ValueError):
+            self.errors += 1
+            return []
+
+    def parse_line(self, raw):
+        return self.parse(split_line(raw))
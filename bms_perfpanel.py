@@ -0,0 +1,89 @@
+#Performance overlay: a small always-on-top window over the monitor showing the
+#profiler's stage table, with switches for the instrumentation, a cProfile of the
+#Tk thread and tracemalloc, and a button writing everything to a file that can be
+#sent back from the rig.
+import tkinter as tk
+
+from bms_profiler import health_counters
+
+REFRESH_MS = 1000
+FONT = ('Courier', 9)
+
+
+class PerformancePanel:
+    def __init__(self, monitor):
+        #monitor is the SerialMonitor; its profiler, engine and log() are used
+        self.monitor = monitor
+        self.profiler = monitor.profiler
+        self.window = None
+        self.text = None
+        self.instrument = tk.BooleanVar(value=self.profiler.enabled)
+        self.cprofile = tk.BooleanVar(value=False)
+        self.tracemalloc = tk.BooleanVar(value=False)
+        #Profile from the last time cProfile was switched off, kept for the next dump
+        self.last_profile = None
+
+    def show(self):
+        if self.window is not None:
+            self.window.lift()
+            return
+        window = self.window = tk.Toplevel(self.monitor.master)
+        window.title("Performance")
+        window.attributes('-topmost', True)
+        window.protocol("WM_DELETE_WINDOW", self.close)
+        switches = tk.Frame(window)
+        switches.pack(fill=tk.X)
+        tk.Checkbutton(switches, text="Instrument", variable=self.instrument, command=self.set_instrument).pack(side=tk.LEFT)
+        tk.Checkbutton(switches, text="cProfile", variable=self.cprofile, command=self.set_cprofile).pack(side=tk.LEFT)
+        tk.Checkbutton(switches, text="tracemalloc", variable=self.tracemalloc, command=self.set_tracemalloc).pack(side=tk.LEFT)
+        tk.Button(switches, text="Reset", command=self.profiler.reset).pack(side=tk.LEFT)
+        tk.Button(switches, text="Dump", command=self.dump).pack(side=tk.LEFT)
+        self.text = tk.Label(window, font=FONT, justify=tk.LEFT, anchor=tk.NW)
+        self.text.pack(fill=tk.BOTH, expand=True)
+        self.refresh()
+
+    def close(self):
+        self.window.destroy()
+        self.window = None
+        self.text = None
+
+    def refresh(self):
+        if self.window is None:
+            return
+        if self.profiler.enabled:
+            engine = self.monitor.engine
+            text = (self.profiler.table() + f"\n\n{engine.byte_rate:.0f} B/s, {engine.reads} reads, "
+                    f"queue depth {engine.queue.depth() if engine.queue is not None else 0}")
+        else:
+            text = "Instrumentation is off"
+        if text != self.text['text']:
+            self.text.configure(text=text)
+        self.window.after(REFRESH_MS, self.refresh)
+
+    def set_instrument(self):
+        if self.instrument.get():
+            self.profiler.enable()
+        else:
+            self.profiler.disable()
+
+    def set_cprofile(self):
+        if self.cprofile.get():
+            self.profiler.start_profile()
+        else:
+            self.last_profile = self.profiler.stop_profile()
+
+    def set_tracemalloc(self):
+        if self.tracemalloc.get():
+            self.profiler.start_tracing()
+        else:
+            self.profiler.stop_tracing()
+
+    def dump(self):
+        try:
+            paths = self.profiler.dump(self.monitor.engine.output, health_counters(self.monitor.engine),
+                                       self.last_profile)
+        except OSError as e:
+            self.monitor.log(f"Profile dump failed: {str(e)}\n")
+            return
+        self.last_profile = None
+        self.monitor.log(f"Profile written: {', '.join(paths)}\n")
@@ -0,0 +1,97 @@
+#Hand-off between the serial reader thread and the Tk main loop.
+#The reader only ever appends to the queue and the GUI drains it on a timer,
+#so a slow redraw can never hold up the UART.
+import threading
+from collections import deque
+
+#What to do when the queue is full
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+#Like DROP_OLDEST, but the field updates of dropped items are merged and kept
+COALESCE = "coalesce"
+
+#GUI refresh rate for the consumer
+FRAME_RATE = 20
+FRAME_MS = 1000 // FRAME_RATE
+
+
+class TelemetryQueue:
+    #Single producer / single consumer queue of (stamp, line, updates) items,
+    #where updates is a list of (field, value) pairs
+    def __init__(self, capacity=4096, policy=COALESCE):
+        if policy not in (DROP_OLDEST, DROP_NEWEST, COALESCE):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        #deque append/popleft are atomic, so the common path needs no lock
+        self.items = deque()
+        #Updates rescued from dropped items; only touched when the queue overflows.
+        #The lock makes dropping an item and draining the queue one step each, so
+        #the carry is always older than every item left in the queue.
+        self.carry = {}
+        self.carry_lock = threading.Lock()
+
+        #Counters
+        self.pushed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_water = 0
+
+    def put(self, item):
+        #Reader thread side, never blocks. Returns False if the item was dropped.
+        items = self.items
+        if len(items) >= self.capacity:
+            if self.policy == DROP_NEWEST:
+                self.dropped += 1
+                return False
+            with self.carry_lock:
+                try:
+                    oldest = items.popleft()
+                except IndexError:
+                    #The consumer emptied the queue in the meantime
+                    oldest = None
+                if oldest is not None:
+                    self.dropped += 1
+                    if self.policy == COALESCE and oldest[2]:
+                        self.carry.update(oldest[2])
+                        self.coalesced += 1
+        items.append(item)
+        self.pushed += 1
+        depth = len(items)
+        if depth > self.high_water:
+            self.high_water = depth
+        return True
+
+    def drain(self, limit=None):
+        #Consumer side. Returns (carried updates, items) where the carried
+        #updates are older than every returned item and should be applied first.
+        with self.carry_lock:
+            #Taken with the items: an item dropped after this goes to the next carry,
+            #which is then older than the items still queued
+            carry = {}
+            if self.carry:
+                carry, self.carry = self.carry, {}
+            count = len(self.items)
+            if limit is not None and count > limit:
+                count = limit
+            popleft = self.items.popleft
+            drained = []
+            #Never fewer items than counted while the lock is held; kept safe anyway
+            try:
+                for _ in range(count):
+                    drained.append(popleft())
+            except IndexError:
+                pass
+        return carry, drained
+
+    def depth(self):
+        return len(self.items)
+
+    def stats(self):
+        return {
+            'depth': len(self.items),
+            'high_water': self.high_water,
+            'pushed': self.pushed,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+        }
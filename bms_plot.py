@@ -0,0 +1,140 @@
+#Live plot of the BMS series.
+#Each series keeps its samples in a ring buffer, the visible window is
+#decimated to min/max per pixel column, and only the lines are redrawn
+#each frame (blitting) while the axes stay fixed.
+import time
+
+import numpy as np
+import matplotlib.animation as animation
+
+from bms_parser import CELL_COUNT
+
+#(subplot title, fields, divisor applied to the raw BMS integer)
+PLOT_GROUPS = (
+    ('Voltage (V)', ['volt' + str(i) for i in range(CELL_COUNT)], 10000),
+    ('Temperature (C)', ['adc' + str(i) for i in range(CELL_COUNT)], 1),
+    ('Current (mA)', ['current'], 1),
+    ('SOC (%)', ['total_soc'] + ['soc' + str(i) for i in range(CELL_COUNT)], 10),
+)
+
+FPS = 30
+#Seconds of history shown
+WINDOW = 300
+#Samples kept per series
+HISTORY = 50000
+
+
+class RingBuffer:
+    #Fixed capacity (time, value) samples, oldest overwritten first
+    def __init__(self, capacity=HISTORY):
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.capacity = capacity
+        self.head = 0
+        self.size = 0
+
+    def append(self, x, y):
+        self.x[self.head] = x
+        self.y[self.head] = y
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def last(self):
+        return self.y[self.head - 1]
+
+    def since(self, start):
+        #Samples with x >= start plus the one before it, oldest first
+        if self.size < self.capacity:
+            x = self.x[:self.size]
+            y = self.y[:self.size]
+        else:
+            x = np.concatenate((self.x[self.head:], self.x[:self.head]))
+            y = np.concatenate((self.y[self.head:], self.y[:self.head]))
+        first = max(np.searchsorted(x, start) - 1, 0)
+        return x[first:], y[first:]
+
+
+def decimate(x, y, start, stop, columns):
+    #Reduces samples to the min and max of each pixel column so spikes survive
+    if len(x) <= 2 * columns:
+        return x, y
+    bins = ((x - start) * (columns / (stop - start))).astype(np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+    low = np.minimum.reduceat(y, starts)
+    high = np.maximum.reduceat(y, starts)
+    return np.repeat(x[starts], 2), np.column_stack((low, high)).ravel()
+
+
+class LivePlot:
+    def __init__(self, figure, groups=PLOT_GROUPS, window=WINDOW):
+        self.figure = figure
+        self.window = window
+        #field -> (buffer, line, divisor)
+        self.series = {}
+        self.axes = []
+        self.lines = []
+        for index, (title, fields, divisor) in enumerate(groups):
+            axes = figure.add_subplot(2, 2, index + 1)
+            axes.set_title(title, fontsize=8)
+            axes.tick_params(labelsize=7)
+            axes.set_xlim(-window, 0)
+            axes.set_ylim(0, 1)
+            for field in fields:
+                line, = axes.plot([], [], linewidth=1, label=field)
+                self.series[field] = (RingBuffer(), line, divisor)
+                self.lines.append(line)
+            self.axes.append(axes)
+        figure.tight_layout()
+        self.animation = None
+
+    def add(self, updates, now=None):
+        #Records (field, value) updates; called on the Tk thread as queue items are applied
+        if now is None:
+            now = time.monotonic()
+        series = self.series
+        for field, value in updates:
+            entry = series.get(field)
+            if entry is not None:
+                entry[0].append(now, value / entry[2])
+
+    def start(self, fps=FPS):
+        #draw_frame is looked up on every frame so the profiler can time it
+        self.animation = animation.FuncAnimation(
+            self.figure, lambda frame: self.draw_frame(frame), init_func=self.init_frame,
+            interval=1000 // fps, blit=True, cache_frame_data=False)
+        return self.animation
+
+    def init_frame(self):
+        for line in self.lines:
+            line.set_data([], [])
+        return self.lines
+
+    def draw_frame(self, _frame):
+        now = time.monotonic()
+        start = now - self.window
+        rescale = False
+        for axes in self.axes:
+            columns = max(int(axes.bbox.width), 1)
+            low, high = axes.get_ylim()
+            seen_low, seen_high = np.inf, -np.inf
+            for line in axes.get_lines():
+                buffer, _, _ = self.series[line.get_label()]
+                if not buffer.size:
+                    continue
+                x, y = buffer.since(start)
+                x, y = decimate(x, y, start, now, columns)
+                #Hold the last value up to now so a steady series stays visible
+                x = np.append(x - now, 0)
+                y = np.append(y, buffer.last())
+                line.set_data(x, y)
+                seen_low = min(seen_low, y.min())
+                seen_high = max(seen_high, y.max())
+            if seen_low < low or seen_high > high:
+                pad = max((seen_high - seen_low) * 0.1, 1e-3)
+                axes.set_ylim(seen_low - pad, seen_high + pad)
+                rescale = True
+        if rescale:
+            #Limits can't change in a blitted frame, so redraw the whole figure once
+            self.figure.canvas.draw_idle()
+        return self.lines
@@ -0,0 +1,257 @@
+#Pipeline instrumentation: call counts and time histograms per pipeline stage.
+#A stage is a method named by a path from a root object, e.g. 'decoder.feed' on the
+#engine. Enabling the profiler replaces each of those methods on its instance with a
+#timed wrapper and disabling it puts the original back, so while it is off the
+#pipeline runs exactly the code it runs without it.
+#Callers that keep a bound method from before enable() (listeners, Tk callbacks
+#registered once) aren't timed; the stage tables only name methods that are looked
+#up on every call. Objects created while enabled (the plot) are picked up by refresh().
+#On demand the dump also holds a cProfile of the thread that started it (the Tk
+#main loop in the GUI) and the top tracemalloc allocation sites.
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from bisect import bisect_left
+from datetime import datetime
+
+#Upper bounds of the histogram buckets in seconds; one more bucket takes the rest
+BUCKETS = (0.00001, 0.00003, 0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1.0)
+#Frames kept per tracemalloc traceback, and allocation sites in a dump
+TRACE_FRAMES = 10
+TRACE_TOP = 25
+PROFILE_TOP = 40
+
+#(stage, method path from the AcquisitionEngine)
+ENGINE_STAGES = (
+    ('feed', 'feed'),                       #everything done with one serial read
+    ('decode', 'decoder.feed'),             #line framing / binary frame decoding
+    ('populate_cells', 'populate_cells'),   #parse one text line and apply it
+    ('binary_record', 'handle_record'),     #apply one binary frame
+    ('frame', 'handle_frame'),              #every consumer of a report cycle
+    ('metrics', 'metrics.compute'),
+    ('alarms', 'alarms.check'),
+)
+
+#(stage, method path from the SerialMonitor)
+GUI_STAGES = (
+    ('poll_queue', 'poll_queue'),           #one GUI frame, everything below included
+    ('update_data', 'update_data'),         #repaint of the changed readouts
+    ('console', 'console.flush'),           #ScrolledText insert and trim
+    ('alarm_box', 'show_alarms'),
+    ('plot', 'plot.draw_frame'),            #plot data update
+    ('plot_blit', 'plot.figure.canvas.blit'),
+    ('plot_redraw', 'plot.figure.canvas.draw'),
+)
+
+
+def _ms(seconds):
+    return seconds * 1000
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def record(self, seconds):
+        #Stages run on one thread each, so the counts need no lock
+        self.calls += 1
+        self.total += seconds
+        if seconds > self.longest:
+            self.longest = seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+    def percentile(self, fraction):
+        #Upper bound of the bucket holding that fraction of the calls
+        wanted = fraction * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= wanted:
+                return min(bound, self.longest)
+        return self.longest
+
+
+def _timed(function, stage):
+    clock = time.perf_counter
+    record = stage.record
+
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(clock() - start)
+    return timed
+
+
+class Profiler:
+    def __init__(self):
+        #stage name -> Stage, in the order they were registered
+        self.stages = {}
+        #(stage, root, path) for every instrumented method
+        self.points = []
+        #(owner, attribute, original or None if it came from the class) while enabled
+        self.wrapped = []
+        self.enabled = False
+        self.since = time.monotonic()
+        self.profile = None
+
+    def instrument(self, root, stages):
+        #Registers a stage table; paths that can't be resolved yet (a plot not
+        #created yet, say) are tried again on every enable() and refresh()
+        for name, path in stages:
+            self.stages.setdefault(name, Stage(name))
+            self.points.append((self.stages[name], root, path))
+        self.refresh()
+
+    def enable(self):
+        if self.enabled:
+            return
+        self._wrap()
+        self.enabled = True
+        self.reset()
+
+    def refresh(self):
+        #Wraps the stages again, e.g. after an object on a stage path was created or
+        #replaced; the numbers so far are kept
+        if self.enabled:
+            self._unwrap()
+            self._wrap()
+
+    def _wrap(self):
+        for stage, root, path in self.points:
+            *parents, attribute = path.split('.')
+            owner = root
+            try:
+                for parent in parents:
+                    owner = getattr(owner, parent)
+                function = getattr(owner, attribute)
+                original = vars(owner).get(attribute)
+                setattr(owner, attribute, _timed(function, stage))
+            except (AttributeError, TypeError):
+                #Not there yet, or an object whose methods can't be replaced
+                continue
+            self.wrapped.append((owner, attribute, original))
+
+    def disable(self):
+        self._unwrap()
+        self.enabled = False
+
+    def _unwrap(self):
+        for owner, attribute, original in reversed(self.wrapped):
+            if original is None:
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, original)
+        self.wrapped = []
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def reset(self):
+        for stage in self.stages.values():
+            stage.reset()
+        self.since = time.monotonic()
+
+    def start_profile(self):
+        #cProfile only sees the calling thread
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop_profile(self):
+        #Returns the finished profile
+        profile = self.profile
+        if profile is not None:
+            profile.disable()
+            self.profile = None
+        return profile
+
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def rows(self):
+        #(stage, calls, calls/s, mean ms, p95 ms, max ms, % of the time) of every stage called so far
+        elapsed = max(time.monotonic() - self.since, 1e-9)
+        return [(stage.name, stage.calls, stage.calls / elapsed, _ms(stage.mean), _ms(stage.percentile(0.95)),
+                 _ms(stage.longest), 100 * stage.total / elapsed)
+                for stage in self.stages.values() if stage.calls]
+
+    def table(self):
+        lines = ["stage".ljust(16) + "calls".rjust(9) + "/s".rjust(10) + "mean ms".rjust(9)
+                 + "p95 ms".rjust(9) + "max ms".rjust(9) + "load %".rjust(8)]
+        for name, calls, rate, mean, p95, longest, load in self.rows():
+            lines.append(name[:15].ljust(16) + f"{calls:9d}{rate:10.1f}{mean:9.3f}{p95:9.3f}{longest:9.3f}{load:8.1f}")
+        return '\n'.join(lines)
+
+    def dump(self, directory, counters=(), profile=None):
+        #Writes bms_profile_<date>.txt (and .prof for a cProfile) into directory;
+        #counters are (name, value) pairs such as the engine's health counters.
+        #Returns the paths written.
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"bms_profile_{datetime.now().strftime('%Y%m%d%H%M%S')}")
+        paths = [base + ".txt"]
+        out = [f"BMS pipeline profile, {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+               f"Instrumentation {'on' if self.enabled else 'off'}, "
+               f"{time.monotonic() - self.since:.1f} s since the last reset", "",
+               self.table(), "",
+               "Histograms (calls per bucket, upper bound in ms):",
+               "stage".ljust(16) + ''.join(f"{_ms(bound):g}".rjust(7) for bound in BUCKETS) + "more".rjust(7)]
+        for stage in self.stages.values():
+            if stage.calls:
+                out.append(stage.name[:15].ljust(16) + ''.join(str(count).rjust(7) for count in stage.buckets))
+        if counters:
+            out += ["", "Counters:"]
+            out += [f"{name} {value}" for name, value in counters]
+        if profile is None and self.profile is not None:
+            #A profile still running is dumped as it stands and keeps running
+            profile = self.profile
+        if profile is not None:
+            stream = io.StringIO()
+            stats = pstats.Stats(profile, stream=stream)
+            stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+            out += ["", f"cProfile, top {PROFILE_TOP} by cumulative time:", stream.getvalue()]
+            stats.dump_stats(base + ".prof")
+            paths.append(base + ".prof")
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            out += ["", f"tracemalloc: {current / 1e6:.1f} MB traced, peak {peak / 1e6:.1f} MB, "
+                        f"top {TRACE_TOP} allocation sites:"]
+            for statistic in tracemalloc.take_snapshot().statistics('lineno')[:TRACE_TOP]:
+                out.append(str(statistic))
+        with open(paths[0], "w") as file:
+            file.write('\n'.join(out) + '\n')
+        return paths
+
+
+def health_counters(engine):
+    #(name, value) of the exporter's health counters for one engine, for dumps
+    from bms_exporter import HEALTH
+
+    return [(metric, get(engine)) for metric, _, _, get in HEALTH]
@@ -0,0 +1,280 @@
+#Replays recorded BMS sessions as if they came from a live board.
+#
+#Sources: TXT exports (from export_txt), raw serial captures (one line per BMS
+#line, no timestamps) and CSV exports (rendered back into serial lines).
+#
+#  python bms_replay.py session.txt                 -> run it through the engine as fast as possible
+#  python bms_replay.py session.txt --speed 10      -> same, at 10x real time
+#  python bms_replay.py session.txt --pty --speed 1 -> serve it on a virtual serial port
+#  python bms_replay.py session.txt --binary        -> as binary frames (see bms_binary)
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bms_synth import csv_records, frame_lines, pack_size
+
+#Prefix export_txt puts in front of every received line
+TXT_STAMP = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d): (.*)$', re.DOTALL)
+TXT_STAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+CSV_STAMP_FORMAT = '%m-%d-%y-%H:%M:%S'
+
+
+def _schedule(stamped, baud):
+    #(seconds or None, text) -> (seconds from start, bytes). Lines are never due
+    #before the previous one has gone through the wire at the given baud rate.
+    lines = []
+    first = None
+    ready = 0.0
+    for stamp, text in stamped:
+        data = text if isinstance(text, bytes) else text.encode("utf-8")
+        due = ready
+        if stamp is not None:
+            if first is None:
+                first = stamp
+            due = max(due, stamp - first)
+        lines.append((due, data))
+        #8N1 framing: 10 bits per byte
+        ready = due + len(data) * 10 / baud
+    return lines
+
+
+def load_txt(path):
+    #(epoch seconds or None, raw line) for a TXT export or a raw capture
+    stamped = []
+    has_stamps = False
+    with open(path, encoding="utf-8", errors="replace", newline="") as file:
+        for text in file:
+            match = TXT_STAMP.match(text)
+            if match:
+                has_stamps = True
+                stamp = datetime.strptime(match.group(1), TXT_STAMP_FORMAT).timestamp()
+                stamped.append((stamp, match.group(2)))
+            else:
+                stamped.append((None, text))
+    if has_stamps:
+        #Console messages such as "Connected to ..." have no stamp and never came from the board
+        stamped = [(stamp, text) for stamp, text in stamped if stamp is not None]
+    return stamped
+
+
+def load_csv(path):
+    stamped = []
+    records = csv_records(path)
+    cells, sensors = pack_size(records[0]) if records else (0, 0)
+    for record in records:
+        try:
+            stamp = datetime.strptime(record.get('Timestamp', ''), CSV_STAMP_FORMAT).timestamp()
+        except ValueError:
+            stamp = None
+        for text in frame_lines(record, cells, sensors):
+            stamped.append((stamp, text))
+    return stamped
+
+
+def to_binary(stamped):
+    #Re-encodes text lines as one binary frame per complete report cycle
+    from bms_binary import encode_frame
+    from bms_frames import FrameAssembler
+    from bms_parser import LineParser, split_line
+
+    parser = LineParser()
+    assembler = FrameAssembler()
+    schema = assembler.schema
+    frames = []
+    for stamp, text in stamped:
+        for frame in assembler.add(parser.parse(split_line(text)), stamp):
+            if frame.filled:
+                frames.append((stamp, encode_frame(frame.values, schema.cells, schema.sensors)))
+    return frames
+
+
+def load(path, baud=115200, binary=False):
+    #Scheduled (seconds from start, bytes) lines for any supported recording
+    if path.lower().endswith('.csv'):
+        stamped = load_csv(path)
+    else:
+        stamped = load_txt(path)
+    if binary:
+        stamped = to_binary(stamped)
+    return _schedule(stamped, baud)
+
+
+class ReplaySerial:
+    #Serial look-alike that hands out recorded lines on their original schedule.
+    #speed is a multiple of real time; 0 means as fast as possible.
+    def __init__(self, lines, speed=1.0, loop=False, timeout=1):
+        self.lines = lines
+        self.speed = speed
+        self.loop = loop
+        self.timeout = timeout
+        self.duration = lines[-1][0] if lines else 0
+        self.index = 0
+        #Added to the schedule on every loop around the recording
+        self.offset = 0.0
+        self.pending = bytearray()
+        self.started = time.monotonic()
+        self.is_open = True
+        #Counters
+        self.bytes_read = 0
+        self.loops = 0
+
+    @property
+    def exhausted(self):
+        #Everything has been handed out and nothing more is coming
+        return self.index >= len(self.lines) and not self.loop and not self.pending
+
+    def _next_due(self):
+        if self.index >= len(self.lines):
+            return None
+        if not self.speed:
+            return 0.0
+        return self.started + (self.offset + self.lines[self.index][0]) / self.speed
+
+    def _release(self):
+        now = time.monotonic()
+        lines = self.lines
+        while True:
+            if self.index >= len(lines):
+                if not self.loop or not lines:
+                    return
+                self.index = 0
+                self.offset += self.duration + 1.0
+                self.loops += 1
+            due = self._next_due()
+            if due > now:
+                return
+            self.pending += lines[self.index][1]
+            self.index += 1
+            if not self.speed and len(self.pending) >= 65536:
+                return
+
+    def _wait(self, ready):
+        #Waits until ready() or the timeout; mirrors a blocking Serial read
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while self.is_open:
+            self._release()
+            if ready():
+                return
+            now = time.monotonic()
+            wake = self._next_due()
+            if deadline is not None:
+                if now >= deadline:
+                    return
+                wake = deadline if wake is None else min(wake, deadline)
+            elif wake is None:
+                #Nothing more is coming
+                return
+            time.sleep(max(0.0, min(wake - now, 0.1)))
+
+    @property
+    def in_waiting(self):
+        self._release()
+        return len(self.pending)
+
+    def read(self, size=1):
+        self._wait(lambda: len(self.pending) >= size)
+        data = bytes(self.pending[:size])
+        del self.pending[:size]
+        self.bytes_read += len(data)
+        return data
+
+    def readline(self):
+        self._wait(lambda: b'\n' in self.pending)
+        end = self.pending.find(b'\n')
+        end = len(self.pending) if end < 0 else end + 1
+        data = bytes(self.pending[:end])
+        del self.pending[:end]
+        self.bytes_read += len(data)
+        return data
+
+    def reset_input_buffer(self):
+        self.pending.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+def serve_pty(lines, speed=1.0, loop=False):
+    #Writes the recording to a pseudo terminal so the normal connect path can open it (POSIX only)
+    import pty
+    import tty
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    print(f"Replaying on {os.ttyname(slave)}, press Ctrl+C to stop")
+    source = ReplaySerial(lines, speed=speed, loop=loop, timeout=0.5)
+    try:
+        while not source.exhausted:
+            data = source.read(4096)
+            if data:
+                os.write(master, data)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(slave)
+        os.close(master)
+
+
+def run_engine(lines, speed=0, interval=0, output=None):
+    #Feeds the recording through the full acquisition path and reports its throughput
+    from bms_engine import AcquisitionEngine
+
+    if output is None:
+        output = tempfile.mkdtemp(prefix="bms_replay_")
+    engine = AcquisitionEngine(delta_t=interval, output=output)
+    source = ReplaySerial(lines, speed=speed, timeout=0.1)
+    started = time.perf_counter()
+    engine.attach(source)
+    try:
+        while not source.exhausted:
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.perf_counter() - started
+    #The reader may still be in handle_line, so it has to be done before the logs close
+    engine.stop_reader()
+    engine.stop()
+    return {
+        'lines': engine.lines,
+        'records': engine.records,
+        'bytes': source.bytes_read,
+        'seconds': elapsed,
+        'lines_per_second': engine.lines / elapsed if elapsed else 0,
+        'rows': engine.rows_logged,
+        'parse_errors': engine.parser.errors,
+        'output': output,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded BMS session")
+    parser.add_argument("path", help="TXT export, raw capture or CSV export")
+    parser.add_argument("--speed", type=float, default=0, help="multiple of real time, 0 = as fast as possible (default)")
+    parser.add_argument("--baud", type=int, default=115200, help="baud rate used to space lines without timestamps")
+    parser.add_argument("--loop", action="store_true", help="start over at the end of the recording")
+    parser.add_argument("--pty", action="store_true", help="serve on a virtual serial port instead of running the engine")
+    parser.add_argument("--binary", action="store_true", help="send the recording as binary frames instead of text lines")
+    parser.add_argument("--interval", type=float, default=0, help="logging interval for the engine run")
+    parser.add_argument("--output", default=None, help="directory for the engine's CSV log (default: a temp dir)")
+    args = parser.parse_args(argv)
+
+    lines = load(args.path, args.baud, args.binary)
+    if not lines:
+        print(f"Nothing to replay in {args.path!r}", file=sys.stderr)
+        return 1
+    if args.pty:
+        serve_pty(lines, args.speed, args.loop)
+        return 0
+    result = run_engine(lines, args.speed, args.interval, args.output)
+    print(f"{result['lines']} lines, {result['records']} binary frames in {result['seconds']:.2f} s "
+          f"({result['lines_per_second']:.0f} lines/s), "
+          f"{result['rows']} rows logged, {result['parse_errors']} parse errors, output in {result['output']!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
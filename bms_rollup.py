@@ -0,0 +1,106 @@
+#Multi-resolution aggregation of every parsed sample.
+#The finest bucket (1 s by default) collects count/sum/min/max/last per field from
+#every line; when it closes it is emitted and merged into the next coarser bucket,
+#so coarser rollups cost one merge per finer bucket rather than work per sample.
+#Buckets are aligned to the wall clock (13:40:00-13:41:00 and so on).
+import os
+import re
+
+from bms_parser import STRING_FIELDS
+
+#Bucket lengths in seconds, each a multiple of the one before
+ROLLUPS = (1, 60)
+#Rollup logs are written to this subdirectory of the log folder, so tools that
+#take every CSV in the folder only see the per-frame session logs
+ROLLUP_DIR = "rollups"
+#File name of a rollup log, e.g. serial_log_60s_20240808133412.csv; logs written
+#before ROLLUP_DIR existed sit next to the session logs
+ROLLUP_NAME = re.compile(r'_\d+s_\d{14}(_\d+)?\.csv$')
+
+#Indexes into a field's stats list
+COUNT, TOTAL, LOW, HIGH, LAST = range(5)
+
+
+def is_rollup(path):
+    return ROLLUP_NAME.search(os.path.basename(path)) is not None
+
+
+def merge(into, stats):
+    #Folds the stats of a closed bucket into a coarser one
+    for field, other in stats.items():
+        mine = into.get(field)
+        if mine is None:
+            into[field] = list(other)
+        elif other[TOTAL] is None:
+            mine[COUNT] += other[COUNT]
+            mine[LAST] = other[LAST]
+        else:
+            mine[COUNT] += other[COUNT]
+            mine[TOTAL] += other[TOTAL]
+            if other[LOW] < mine[LOW]:
+                mine[LOW] = other[LOW]
+            if other[HIGH] > mine[HIGH]:
+                mine[HIGH] = other[HIGH]
+            mine[LAST] = other[LAST]
+
+
+class Rollup:
+    def __init__(self, emit, periods=ROLLUPS):
+        #emit(period, bucket start in epoch seconds, {field: [count, total, low, high, last]})
+        self.emit = emit
+        self.periods = tuple(periods)
+        self.keys = [None] * len(self.periods)
+        self.buckets = [{} for _ in self.periods]
+        self.second = None
+
+    def add(self, second, updates):
+        #Every (field, value) parsed from one line, with the line's epoch second
+        if second != self.second:
+            self._advance(second)
+        stats = self.buckets[0]
+        for field, value in updates:
+            current = stats.get(field)
+            if field in STRING_FIELDS:
+                if current is None:
+                    stats[field] = [1, None, None, None, value]
+                else:
+                    current[COUNT] += 1
+                    current[LAST] = value
+            elif current is None:
+                stats[field] = [1, value, value, value, value]
+            else:
+                current[COUNT] += 1
+                current[TOTAL] += value
+                if value < current[LOW]:
+                    current[LOW] = value
+                elif value > current[HIGH]:
+                    current[HIGH] = value
+                current[LAST] = value
+
+    def _advance(self, second):
+        self.second = second
+        periods = self.periods
+        for level, period in enumerate(periods):
+            key = second // period
+            if key == self.keys[level]:
+                #Coarser buckets can't have closed either
+                break
+            self._close(level)
+            self.keys[level] = key
+
+    def _close(self, level):
+        stats = self.buckets[level]
+        if stats and self.keys[level] is not None:
+            period = self.periods[level]
+            self.emit(period, self.keys[level] * period, stats)
+            if level + 1 < len(self.periods):
+                merge(self.buckets[level + 1], stats)
+        #The emitted dict is handed over as is, so start a fresh one
+        self.buckets[level] = {}
+
+    def flush(self):
+        #Emits the partial buckets, e.g. when logging stops
+        for level in range(len(self.periods)):
+            self._close(level)
+            self.keys[level] = None
+        self.second = None
@@ -0,0 +1,265 @@
+#Monitoring several BMS boards from one process.
+#All ports are serviced by a single reader thread: on POSIX it waits on the
+#port file descriptors with a selector, elsewhere it polls in_waiting.
+#A pack whose adapter drops out is reopened in the background with the engine's
+#backoff (RECONNECT_MIN doubling up to RECONNECT_MAX) while the others keep running.
+import selectors
+import threading
+import time
+
+from serial import Serial
+
+from bms_engine import RECONNECT_MAX, RECONNECT_MIN, AcquisitionEngine
+from bms_logger import EXPORT_DIR
+from bms_rollup import ROLLUPS
+from bms_alarms import ALARM_RULES
+
+
+class PackSession:
+    #One BMS board: its port and its own engine (framing, cells, log streams)
+    def __init__(self, name, port, baud, engine):
+        self.name = name
+        self.port = port
+        self.baud = baud
+        self.engine = engine
+        self.ser = None
+        self.connected = False
+        self.error = ''
+        #Next reopen attempt (monotonic) and the wait after that one while it fails
+        self.retry_at = 0.0
+        self.delay = RECONNECT_MIN
+
+    def open(self):
+        #timeout=0: reads return whatever is buffered without blocking
+        self.ser = Serial(self.port, self.baud, timeout=0)
+        self.connected = True
+        self.error = ''
+
+    def close(self):
+        self.connected = False
+        if self.ser is not None and self.ser.is_open:
+            self.ser.close()
+
+    def drop(self, error):
+        #Read error: closes the port and schedules the first reopen
+        self.engine.read_errors += 1
+        self.engine.report(f"Error reading from {self.port}: {str(error)}\n")
+        self.error = str(error)
+        try:
+            self.close()
+        except Exception:
+            pass
+        #A partial line or frame from before the drop would be glued to the next one
+        self.engine.decoder.reset()
+        self.delay = RECONNECT_MIN
+        self.retry_at = time.monotonic() + self.delay
+
+    def reopen(self, now):
+        #Tries to reopen a dropped port once its wait is over; True if it is open again
+        if self.connected or now < self.retry_at:
+            return False
+        try:
+            self.open()
+        except Exception as e:
+            self.error = str(e)
+            self.delay = min(self.delay * 2, RECONNECT_MAX)
+            self.retry_at = now + self.delay
+            return False
+        self.engine.reconnects += 1
+        self.engine.report(f"Reconnected to {self.port}\n")
+        return True
+
+    def service(self):
+        #Reads everything buffered on the port and runs the complete lines or frames through the engine
+        waiting = self.ser.in_waiting
+        data = self.ser.read(waiting or 1)
+        if not data:
+            return 0
+        return self.engine.feed(data)
+
+    def overview(self):
+        cells = self.engine.cells
+        return {
+            'name': self.name,
+            'port': self.port,
+            'connected': self.connected,
+            'error': self.error,
+            'lines': self.engine.lines,
+            'records': self.engine.records,
+            'rows': self.engine.rows_logged,
+            'bytes': self.engine.decoder.bytes,
+            'pack_volt': cells.get('pack_volt'),
+            'current': cells.get('current'),
+            'total_soc': cells.get('total_soc'),
+            'min_cell_volt': cells.get('min_cell_volt'),
+            'max_cell_volt': cells.get('max_cell_volt'),
+            'cell_spread': cells.get('cell_spread'),
+            'Error_Codes': cells.get('Error_Codes'),
+            'alarms': [name for name, _ in self.engine.alarms.summary],
+        }
+
+
+class SessionManager:
+    def __init__(self, delta_t=5, output=EXPORT_DIR, columnar=False, rollups=ROLLUPS,
+                 alarm_rules=ALARM_RULES):
+        self.delta_t = delta_t
+        self.output = output
+        self.columnar = columnar
+        self.rollups = rollups
+        self.alarm_rules = alarm_rules
+        self.sessions = {}
+        self.lock = threading.Lock()
+        #Set when sessions are added or removed so the reader re-registers its ports
+        self.changed = False
+        self.running = False
+        self.thread = None
+        self.writer = None
+        #Counters
+        self.wakeups = 0
+        self.read_errors = 0
+
+    def add(self, port, baud, name=None):
+        #Opens the port right away; raises if it can't be opened
+        if name is None:
+            name = f"pack{len(self.sessions)}"
+        engine = AcquisitionEngine(delta_t=self.delta_t, output=self.output, log_prefix=f"serial_log_{name}_",
+                                   columnar=self.columnar, rollups=self.rollups,
+                                   alarm_rules=self.alarm_rules)
+        session = PackSession(name, port, baud, engine)
+        session.open()
+        #Log files are written by the manager's single writer thread
+        engine.start_logging(background=False)
+        with self.lock:
+            self.sessions[port] = session
+            self.changed = True
+        return session
+
+    def remove(self, port):
+        with self.lock:
+            session = self.sessions.pop(port, None)
+            self.changed = True
+        if session is not None:
+            session.close()
+            session.engine.stop_logging()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="bms-sessions", daemon=True)
+        self.thread.start()
+        self.writer = threading.Thread(target=self._write, name="bms-sessions-writer", daemon=True)
+        self.writer.start()
+
+    def stop(self):
+        self.running = False
+        for thread in (self.thread, self.writer):
+            if thread is not None:
+                thread.join()
+        self.thread = None
+        self.writer = None
+        for port in list(self.sessions):
+            self.remove(port)
+
+    def overview(self):
+        #One summary dict per pack, for status displays
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return [session.overview() for session in sessions]
+
+    def engines(self):
+        #(name, engine) of every pack, e.g. for bms_exporter
+        with self.lock:
+            return [(session.name, session.engine) for session in self.sessions.values()]
+
+    def _active(self):
+        with self.lock:
+            self.changed = False
+            return [session for session in self.sessions.values() if session.connected]
+
+    def _service(self, session):
+        try:
+            session.service()
+        except Exception as e:
+            #Adapter unplugged or similar; the other packs keep running
+            self._drop(session, e)
+
+    def _drop(self, session, error):
+        self.read_errors += 1
+        session.drop(error)
+        self.changed = True
+
+    def _reconnect(self):
+        #Reopens dropped ports whose backoff is over
+        now = time.monotonic()
+        with self.lock:
+            dropped = [session for session in self.sessions.values()
+                       if not session.connected and now >= session.retry_at]
+        for session in dropped:
+            if not session.reopen(now):
+                continue
+            with self.lock:
+                if self.sessions.get(session.port) is not session:
+                    #Removed while it was being reopened
+                    session.close()
+                self.changed = True
+
+    def _write(self):
+        #One writer thread for every pack's log stream
+        while self.running:
+            time.sleep(1.0)
+            with self.lock:
+                engines = [session.engine for session in self.sessions.values()]
+            for engine in engines:
+                for log in engine.logs():
+                    log.pump()
+
+    def _run(self):
+        if hasattr(selectors, 'PollSelector') or hasattr(selectors, 'EpollSelector'):
+            self._run_selector()
+        else:
+            self._run_polling()
+
+    def _run_selector(self):
+        selector = selectors.DefaultSelector()
+        #Registered by descriptor number so a port that was closed can still be unregistered
+        registered = []
+        self.changed = True
+        while self.running:
+            self._reconnect()
+            if self.changed:
+                for fd in registered:
+                    selector.unregister(fd)
+                registered = []
+                for session in self._active():
+                    fd = session.ser.fileno()
+                    selector.register(fd, selectors.EVENT_READ, session)
+                    registered.append(fd)
+            if not registered:
+                time.sleep(0.1)
+                continue
+            events = selector.select(0.2)
+            self.wakeups += 1
+            for key, _ in events:
+                self._service(key.data)
+        selector.close()
+
+    def _run_polling(self):
+        #Windows: serial handles can't be selected on, so poll in_waiting
+        sessions = []
+        self.changed = True
+        while self.running:
+            self._reconnect()
+            if self.changed:
+                sessions = self._active()
+            busy = False
+            for session in sessions:
+                try:
+                    waiting = session.ser.in_waiting
+                except Exception as e:
+                    self._drop(session, e)
+                    continue
+                if waiting:
+                    busy = True
+                    self._service(session)
+            self.wakeups += 1
+            if not busy:
+                time.sleep(0.005)
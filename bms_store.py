@@ -0,0 +1,110 @@
+#Columnar in-memory store for logged BMS frames.
+#Every schema field is an int32 column (text fields are dictionary encoded),
+#timestamps are int64 epoch seconds, and columns grow in preallocated chunks.
+from array import array
+
+from bms_parser import FIELDS, STRING_FIELDS
+
+#Value stored for a field the BMS has not reported (or that does not fit in int32)
+MISSING = -2 ** 31
+
+CHUNK_ROWS = 4096
+
+
+class FrameStore:
+    def __init__(self, fields=FIELDS, chunk_rows=CHUNK_ROWS, max_rows=None):
+        self.fields = list(fields)
+        self.chunk_rows = chunk_rows
+        #Oldest chunks are released once more than max_rows are held
+        self.max_rows = max_rows
+        #(column index, field, dictionary encoded) for each field
+        self.slots = [(index, field, field in STRING_FIELDS) for index, field in enumerate(self.fields)]
+        #Each chunk is (timestamps, [one column per field])
+        self.chunks = []
+        self.fill = self.chunk_rows
+        self.count = 0
+        self.released = 0
+        self.overflows = 0
+        #Dictionary encoding for text fields such as Charging_Mode
+        self.codes = {}
+        self.strings = []
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        rows = self.chunk_rows
+        blank = array('i', [MISSING]) * rows
+        self.chunks.append((array('q', bytes(8 * rows)), [array('i', blank) for _ in self.fields]))
+        self.fill = 0
+        #The full chunks alone still hold max_rows, so the oldest one can go
+        if self.max_rows is not None and (len(self.chunks) - 2) * rows >= self.max_rows:
+            del self.chunks[0]
+            self.released += rows
+            self.count -= rows
+
+    def encode(self, text):
+        code = self.codes.get(text)
+        if code is None:
+            code = self.codes[text] = len(self.strings)
+            self.strings.append(text)
+        return code
+
+    def append(self, timestamp, cells):
+        #Adds one row from a field -> value mapping; missing fields stay MISSING
+        if self.fill == self.chunk_rows:
+            self._grow()
+        stamps, columns = self.chunks[-1]
+        row = self.fill
+        stamps[row] = int(timestamp)
+        get = cells.get
+        for index, field, encoded in self.slots:
+            value = get(field)
+            if value is None:
+                continue
+            if encoded:
+                value = self.encode(str(value))
+            try:
+                columns[index][row] = value
+            except (OverflowError, TypeError):
+                self.overflows += 1
+        self.fill = row + 1
+        self.count += 1
+
+    def _spans(self):
+        #(chunk, rows used) for every held chunk
+        last = len(self.chunks) - 1
+        return [(chunk, self.fill if i == last else self.chunk_rows) for i, chunk in enumerate(self.chunks)]
+
+    def timestamps(self):
+        out = array('q')
+        for (stamps, _), used in self._spans():
+            out.extend(stamps[:used])
+        return out
+
+    def column(self, field):
+        #One field as a single contiguous int32 array
+        index = self.fields.index(field)
+        out = array('i')
+        for (_, columns), used in self._spans():
+            out.extend(columns[index][:used])
+        return out
+
+    def rows(self):
+        #Yields (timestamp, values) with text fields decoded and MISSING as None
+        strings = self.strings
+        for (stamps, columns), used in self._spans():
+            for row in range(used):
+                values = []
+                for index, _, encoded in self.slots:
+                    value = columns[index][row]
+                    if value == MISSING:
+                        value = None
+                    elif encoded:
+                        value = strings[value]
+                    values.append(value)
+                yield stamps[row], values
+
+    def nbytes(self):
+        per_row = 8 + 4 * len(self.fields)
+        return per_row * self.chunk_rows * len(self.chunks)
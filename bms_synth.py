@@ -0,0 +1,110 @@
+#Turns BMS records into the text lines the board sends over serial.
+#Used to replay the files under "CSV Exports/" through the parser, and to
+#generate synthetic sessions for benchmarks.
+import csv
+import glob
+import os
+import random
+
+from bms_parser import CELL_COUNT
+from bms_frames import PackSchema
+from bms_rollup import is_rollup
+
+EXPORT_DIR = "CSV Exports"
+
+
+def pack_size(fields):
+    #(cells, temperature sensors) of a pack from its field names, e.g. a CSV header
+    schema = PackSchema()
+    for field in fields:
+        schema.observe(field)
+    return schema.cells, schema.sensors
+
+
+def frame_lines(record, cells=CELL_COUNT, sensors=CELL_COUNT):
+    #One BMS report cycle for a record of field -> value, in the order the board sends it
+    get = record.get
+    lines = []
+    for i in range(sensors):
+        lines.append(f"adc {i} = {get('adc' + str(i), 0)}")
+    lines.append(f"temp deviation = {get('temperature_gradient', 0)} mean = {get('mean_temp', 0)}")
+    lines.append(f"term volt {get('term_volt', 0)}")
+    lines.append(f"drain volt {get('drain_volt', 0)}")
+    for i in range(cells):
+        lines.append(f"cell {i} volt {get('volt' + str(i), 0)}")
+    lines.append(f"pack volt = {get('pack_volt', 0)} mean cell voltage {get('mean_cell_voltage', 0)}")
+    lines.append(f"current = {get('current', 0)}")
+    for i in range(cells):
+        lines.append(f"soc {i} = {get('soc' + str(i), 0)}")
+    lines.append(f"total soc {get('total_soc', 0)} capacity {get('capacity', 0)} time remaining {get('time_remaining', 0)}")
+    lines.append(f"Charging Mode {get('Charging_Mode', 'CC')} Vbus={get('Vbus', 0)} Ibus=0 Imax={get('max_current', 0)}")
+    lines.append(f"Vsafe mV={get('Vsafe', 0)}")
+    lines.append(f"DTC {get('Error_Codes', 0)}")
+    return [line + '\r\n' for line in lines]
+
+
+def csv_records(path):
+    #Rows of an exported CSV as dicts; values past the header are dropped
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if not header:
+            return []
+        return [dict(zip(header, row)) for row in reader if row]
+
+
+def export_lines(directory=EXPORT_DIR):
+    #Every record in every CSV export, rendered as raw serial lines
+    lines = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.csv"))):
+        if is_rollup(path):
+            continue
+        records = csv_records(path)
+        if records:
+            cells, sensors = pack_size(records[0])
+            for record in records:
+                lines.extend(frame_lines(record, cells, sensors))
+    return lines
+
+
+def synthetic_records(count, seed=0, cells=CELL_COUNT):
+    #Random-walk records shaped like the captured sessions (cells around 3.32 V, discharging)
+    rng = random.Random(seed)
+    volts = [33200 + rng.randint(-50, 50) for _ in range(cells)]
+    temps = [-97 + rng.randint(-2, 2) for _ in range(cells)]
+    socs = [800 + rng.randint(-80, 80) for _ in range(cells)]
+    capacity = 88560
+    for _ in range(count):
+        current = -rng.randint(100, 2000)
+        volts = [v + rng.randint(-3, 2) for v in volts]
+        temps = [t + rng.randint(-1, 1) for t in temps]
+        socs = [max(0, s - rng.randint(0, 1)) for s in socs]
+        record = {}
+        for i in range(cells):
+            record['adc' + str(i)] = temps[i]
+            record['volt' + str(i)] = volts[i]
+            record['soc' + str(i)] = socs[i]
+        record['temperature_gradient'] = max(temps) - min(temps)
+        record['mean_temp'] = sum(temps) // cells
+        record['pack_volt'] = sum(volts) // 10
+        record['mean_cell_voltage'] = sum(volts) // cells // 10
+        record['term_volt'] = record['pack_volt'] - rng.randint(1300, 1400)
+        record['drain_volt'] = record['term_volt'] + rng.randint(-80, 80)
+        record['current'] = current
+        record['total_soc'] = sum(socs) // cells
+        record['capacity'] = capacity
+        record['time_remaining'] = rng.randint(60000, 100000)
+        record['Charging_Mode'] = 'CC'
+        record['max_current'] = 0
+        record['Vbus'] = 0
+        record['Vsafe'] = 0
+        record['Error_Codes'] = rng.choice((0, 0, 0, 0, 8))
+        yield record
+
+
+def synthetic_lines(count, seed=0, cells=CELL_COUNT):
+    #Serial lines for count synthetic BMS report cycles
+    lines = []
+    for record in synthetic_records(count, seed, cells):
+        lines.extend(frame_lines(record, cells, cells))
+    return lines
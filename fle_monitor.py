@@ -0,0 +1,217 @@
+#Command line entry point for the FLE BMS monitor.
+#
+#  python fle_monitor.py                                    -> start the GUI
+#  python fle_monitor.py --headless --port /dev/ttyUSB0     -> log to CSV without Tk
+#  python fle_monitor.py --headless --port A --port B ...   -> several packs, one reader thread
+#  python fle_monitor.py --headless --metrics-port 9108     -> also serve Prometheus metrics
+#  python fle_monitor.py --headless --profile               -> time the pipeline stages, dump them on exit
+#
+#The GUI stack (tkinter, ttkbootstrap, matplotlib) is only imported when the GUI is started.
+import argparse
+import sys
+import time
+
+from bms_logger import EXPORT_DIR
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="FLE BMS serial monitor and logger")
+    parser.add_argument("--headless", action="store_true", help="log without starting the GUI")
+    parser.add_argument("--port", action="append", help="serial port of a BMS, repeat for several packs (default: COM3)")
+    parser.add_argument("--baud", type=int, default=115200, help="baud rate (default: %(default)s)")
+    parser.add_argument("--interval", type=float, default=5, help="seconds between logged rows (default: %(default)s)")
+    parser.add_argument("--output", default=EXPORT_DIR, help="directory for CSV logs (default: %(default)s)")
+    parser.add_argument("--rollups", type=int, nargs="*", default=[1, 60],
+                        help="seconds per min/max/mean/last rollup stream, none to disable (default: 1 60)")
+    parser.add_argument("--alarm-rules", default=None, help="JSON file of alarm rules (default: bms_alarms.ALARM_RULES)")
+    parser.add_argument("--columnar", action="store_true", help="also write a columnar session (see bms_columnar.py)")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--status", type=float, default=60, help="seconds between status lines, 0 to disable")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on this port (see bms_exporter.py)")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="address the metrics endpoint listens on (default: %(default)s)")
+    parser.add_argument("--udp", default=None, help="also push InfluxDB line protocol to host:port every second")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every pipeline stage from the start; headless runs write a profile into --output on exit")
+    parser.add_argument("--trace-memory", action="store_true", help="also trace allocations with tracemalloc (slow)")
+    args = parser.parse_args(argv)
+    if not args.port:
+        args.port = ["COM3"]
+    if args.alarm_rules:
+        from bms_alarms import load_rules
+        args.alarm_rules = load_rules(args.alarm_rules)
+    else:
+        from bms_alarms import ALARM_RULES
+        args.alarm_rules = ALARM_RULES
+    return args
+
+
+def start_exporter(args, packs):
+    #Returns the running exporter, or None if neither --metrics-port nor --udp was given
+    if args.metrics_port is None and args.udp is None:
+        return None
+    from bms_exporter import MetricsExporter, parse_address
+
+    udp = None if args.udp is None else parse_address(args.udp, 8089)
+    exporter = MetricsExporter(packs, host=args.metrics_host, port=args.metrics_port, udp=udp)
+    exporter.start()
+    if args.metrics_port is not None:
+        print(f"Metrics on http://{args.metrics_host}:{exporter.port}/metrics")
+    return exporter
+
+
+def start_profiler(args, engines, profiler=None):
+    #Returns the running profiler, or None without --profile / --trace-memory
+    if not (args.profile or args.trace_memory):
+        return None
+    from bms_profiler import Profiler, ENGINE_STAGES
+
+    if profiler is None:
+        profiler = Profiler()
+        for engine in engines:
+            profiler.instrument(engine, ENGINE_STAGES)
+    if args.profile:
+        profiler.enable()
+    if args.trace_memory:
+        profiler.start_tracing()
+    return profiler
+
+
+def dump_profile(args, profiler, engines):
+    from bms_profiler import health_counters
+
+    counters = []
+    for name, engine in engines:
+        counters += [(f"{name} {metric}", value) for metric, value in health_counters(engine)]
+    try:
+        for path in profiler.dump(args.output, counters):
+            print(f"Profile written: {path}")
+    except OSError as e:
+        print(f"Error writing the profile: {str(e)}", file=sys.stderr)
+
+
+def run_headless(args):
+    if len(args.port) > 1:
+        return run_sessions(args)
+    from bms_engine import AcquisitionEngine
+
+    port = args.port[0]
+    engine = AcquisitionEngine(delta_t=args.interval, output=args.output, columnar=args.columnar,
+                               rollups=args.rollups, alarm_rules=args.alarm_rules)
+    try:
+        engine.start(port, args.baud)
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    print(f"Connected to {port} at {args.baud} baud, logging every {args.interval} s to {args.output!r}")
+    try:
+        exporter = start_exporter(args, lambda: [("pack0", engine)])
+    except OSError as e:
+        print(f"Error starting the metrics endpoint: {str(e)}", file=sys.stderr)
+        engine.stop()
+        return 1
+    profiler = start_profiler(args, [engine])
+
+    started = time.monotonic()
+    last_status = started
+    try:
+        while args.duration is None or time.monotonic() - started < args.duration:
+            time.sleep(0.5)
+            if args.status and time.monotonic() - last_status >= args.status:
+                last_status = time.monotonic()
+                print(f"{engine.lines} lines, {engine.records} binary frames, {engine.rows_logged} rows, "
+                      f"{engine.byte_rate:.0f} bytes/s, {engine.parser.errors} parse errors, "
+                      f"{engine.decoder.framing_errors} framing errors, {engine.read_errors} read errors, "
+                      f"{engine.reconnects} reconnects")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if exporter is not None:
+            exporter.stop()
+        engine.stop()
+    if profiler is not None:
+        dump_profile(args, profiler, [("pack0", engine)])
+    for log in (engine.logger, engine.columnar_log):
+        if log is not None:
+            for path in log.paths:
+                print(f"Log written: {path}")
+    return 0
+
+
+def run_sessions(args):
+    from bms_sessions import SessionManager
+
+    manager = SessionManager(delta_t=args.interval, output=args.output, columnar=args.columnar,
+                             rollups=args.rollups, alarm_rules=args.alarm_rules)
+    for port in args.port:
+        try:
+            manager.add(port, args.baud)
+            print(f"Connected to {port} at {args.baud} baud")
+        except Exception as e:
+            print(f"Error opening {port}: {str(e)}", file=sys.stderr)
+    if not manager.sessions:
+        return 1
+    manager.start()
+    try:
+        exporter = start_exporter(args, manager.engines)
+    except OSError as e:
+        print(f"Error starting the metrics endpoint: {str(e)}", file=sys.stderr)
+        manager.stop()
+        return 1
+    #Kept for the profile dump; stop() removes the packs from the manager
+    engines = manager.engines()
+    profiler = start_profiler(args, [engine for _, engine in engines])
+
+    started = time.monotonic()
+    last_status = started
+    try:
+        while args.duration is None or time.monotonic() - started < args.duration:
+            time.sleep(0.5)
+            if args.status and time.monotonic() - last_status >= args.status:
+                last_status = time.monotonic()
+                for pack in manager.overview():
+                    state = "ok" if pack['connected'] else f"down ({pack['error']})"
+                    print(f"{pack['name']} {pack['port']}: {state}, {pack['lines']} lines, {pack['records']} binary frames, "
+                          f"{pack['rows']} rows, "
+                          f"pack {pack['pack_volt']}, current {pack['current']}, "
+                          f"cells {pack['min_cell_volt']}..{pack['max_cell_volt']}, "
+                          f"alarms {', '.join(pack['alarms']) or 'none'}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if exporter is not None:
+            exporter.stop()
+        manager.stop()
+    if profiler is not None:
+        dump_profile(args, profiler, engines)
+    return 0
+
+
+def run_gui(args):
+    import tkinter as tk
+    from serialmonitor_v1 import SerialMonitor
+
+    root = tk.Tk()
+    app = SerialMonitor(root)
+    exporter = start_exporter(args, lambda: [("gui", app.engine)])
+    app.plot_animate()
+    #After the plot exists, so its stages are timed too; dumps are taken from the panel
+    start_profiler(args, [app.engine], app.profiler)
+    app.performance.instrument.set(app.profiler.enabled)
+    app.performance.tracemalloc.set(app.profiler.tracing)
+    app.updateScrollRegion()
+    root.mainloop()
+    if exporter is not None:
+        exporter.stop()
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.headless:
+        return run_headless(args)
+    return run_gui(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
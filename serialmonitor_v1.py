@@ -2,12 +2,11 @@ import tkinter as tk
 from tkinter import ttk
 from tkinter import scrolledtext
 import serial.tools.list_ports
-from serial import Serial
-import xml.etree.ElementTree as ET
-import csv
+import os
+import shutil
 import threading
 from datetime import datetime
-import time
+from collections import deque
 import ttkbootstrap as ttk
 import matplotlib
 matplotlib.use("TkAgg")
@@ -15,9 +14,18 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolb
 from matplotlib.figure import Figure
 import matplotlib.animation as animation
 from matplotlib import style
+from bms_engine import AcquisitionEngine
+from bms_pipeline import TelemetryQueue, FRAME_MS
+from bms_display import FieldBindings
+from bms_celltable import CellTable
+from bms_plot import LivePlot
+from bms_console import LogConsole
+from bms_export import export_xml
+from bms_profiler import Profiler, ENGINE_STAGES, GUI_STAGES
+from bms_perfpanel import PerformancePanel
 
 style.use("ggplot")
-fig = Figure(figsize=(8,3), dpi=100)
+fig = Figure(figsize=(8,4), dpi=100)
 
 class SerialMonitor:
     def __init__(self, master):
@@ -75,23 +83,32 @@ class SerialMonitor:
             self.fTable.grid_columnconfigure(column, weight=1, uniform="column")
 
         self.create_widgets()
+        #Field -> widget bindings, repainted only when a value changes
+        self.bindings = FieldBindings(self)
+        #Shown 1 based like the voltage labels
+        self.bindings.bind('weakest_cell', lambda cell: self.weakestCell_textField.configure(
+            text='' if cell is None else f"Voltage {cell + 1}"))
             
-        #Flag to indicate if the serial connection is active
-        self.connection_active = False
-        #Container for each cell connected to BMS along with information related to each cell
-        self.cells_update = {}
-        self.cells = {}
-        self.cells_update['Timestamp'] = datetime.now().strftime("%m-%d-%y-%H:%M:%S")
-        #List of error codes
+        #Serial reading, parsing and logging; results reach the GUI through the queue
+        self.queue = TelemetryQueue()
+        self.engine = AcquisitionEngine(delta_t=5, queue=self.queue)
+        #Created by plot_animate
+        self.plot = None
+        #Complete BMS cycles from the reader thread, plotted by poll_queue
+        self.frames = deque(maxlen=1000)
+        self.engine.frame_listeners.append(self.frames.append)
+        #Stage timers, off until switched on in the performance panel (F12)
+        self.profiler = Profiler()
+        self.profiler.instrument(self.engine, ENGINE_STAGES)
+        self.profiler.instrument(self, GUI_STAGES)
+        self.performance = PerformancePanel(self)
+        self.master.bind('<F12>', lambda event: self.performance.show())
+        #Frame schema the cell tables were last sized for
+        self.pack_schema = None
+        self.master.after(FRAME_MS, self.poll_queue)
+        #List of error codes, the DTCs shown in the error box
         self.error_codes = set()
-
-        #CSV Logging
-        self.csv_header = []
-        self.firstLog_Flag = True
-        self.parse_data = []
-        
-        #Set logging time
-        self.delta_t = 5
+        self.alarms_shown = 0
          
     def create_widgets(self):
         ############# ALL LABELS AND SCROLLABLE TEXT ###################
@@ -144,54 +161,9 @@ class SerialMonitor:
 
 
         ################## VOLTAGE
-        #Voltage 0 Label
-        self.cell0_label = ttk.Label(self.cell_frame, text='Voltage 1')
-        self.cell0_label.pack()
-        #Voltage 0 scrollable text
-        self.v0_textField = tk.Label(self.cell_frame, height=1, width=10)
-        self.v0_textField.pack()
-        #Voltage 1 Label
-        self.cell0_label = ttk.Label(self.cell_frame, text='Voltage 2')
-        self.cell0_label.pack()
-        #Voltage 1 scrollable text
-        self.v1_textField = tk.Label(self.cell_frame, height=1, width=10)
-        self.v1_textField.pack()
-        #Voltage 2 Label
-        self.cell0_label = ttk.Label(self.cell_frame, text='Voltage 3')
-        self.cell0_label.pack()
-        #Voltage 2 scrollable text
-        self.v2_textField = tk.Label(self.cell_frame, height=1, width=10)
-        self.v2_textField.pack()
-        #Voltage 3 Label
-        self.cell0_label = ttk.Label(self.cell_frame, text='Voltage 4')
-        self.cell0_label.pack()
-        #Voltage 3 scrollable text
-        self.v3_textField = tk.Label(self.cell_frame, height=1, width=10)
-        self.v3_textField.pack()
-        #Voltage 4 Label
-        self.cell0_label = ttk.Label(self.cell_frame, text='Voltage 5')
-        self.cell0_label.pack()
-        #Voltage 4 scrollable text
-        self.v4_textField = tk.Label(self.cell_frame, height=1, width=10)
-        self.v4_textField.pack()
-        #Voltage 5 Label
-        self.cell0_label = ttk.Label(self.cell_frame, text='Voltage 6')
-        self.cell0_label.pack()
-        #Voltage 5 scrollable text
-        self.v5_textField = tk.Label(self.cell_frame, height=1, width=10)
-        self.v5_textField.pack()
-        #Voltage 6 Label
-        self.cell0_label = ttk.Label(self.cell_frame, text='Voltage 7')
-        self.cell0_label.pack()
-        #Voltage 6 scrollable text
-        self.v6_textField = tk.Label(self.cell_frame, height=1, width=10)
-        self.v6_textField.pack()
-        #Voltage 7 Label
-        self.cell0_label = ttk.Label(self.cell_frame, text='Voltage 8')
-        self.cell0_label.pack()
-        #Voltage 7 scrollable text
-        self.v7_textField = tk.Label(self.cell_frame, height=1, width=10)
-        self.v7_textField.pack()
+        #One row per cell, sized from the stream (see bms_display.bind_pack)
+        self.cell_table = CellTable(self.cell_frame, 'Voltage', 10000)
+        self.cell_table.pack()
         #Mean Voltage Label
         self.meanVoltage_label = ttk.Label(self.cell_frame, text='Mean Voltage', font=('bold'))
         self.meanVoltage_label.pack()
@@ -222,6 +194,36 @@ class SerialMonitor:
         #Safe Voltage scrollable text
         self.vSafe_textField = tk.Label(self.pack_frame, height=1, width=10)
         self.vSafe_textField.pack()
+        #Cell Spread Label
+        self.cellSpread_label = ttk.Label(self.pack_frame, text='Cell Spread (mV)')
+        self.cellSpread_label.pack()
+        #Cell Spread text
+        self.cellSpread_textField = tk.Label(self.pack_frame, height=1, width=10)
+        self.cellSpread_textField.pack()
+        #Weakest Cell Label
+        self.weakestCell_label = ttk.Label(self.pack_frame, text='Weakest Cell')
+        self.weakestCell_label.pack()
+        #Weakest Cell text
+        self.weakestCell_textField = tk.Label(self.pack_frame, height=1, width=10)
+        self.weakestCell_textField.pack()
+        #Pack Power Label
+        self.packPower_label = ttk.Label(self.pack_frame, text='Pack Power (W)')
+        self.packPower_label.pack()
+        #Pack Power text
+        self.packPower_textField = tk.Label(self.pack_frame, height=1, width=10)
+        self.packPower_textField.pack()
+        #Max Temperature Label
+        self.tempMax_label = ttk.Label(self.pack_frame, text='Max Temperature (C)')
+        self.tempMax_label.pack()
+        #Max Temperature text
+        self.tempMax_textField = tk.Label(self.pack_frame, height=1, width=10)
+        self.tempMax_textField.pack()
+        #Pack dV/dt Label
+        self.packDvdt_label = ttk.Label(self.pack_frame, text='Pack dV/dt (mV/min)')
+        self.packDvdt_label.pack()
+        #Pack dV/dt text
+        self.packDvdt_textField = tk.Label(self.pack_frame, height=1, width=10)
+        self.packDvdt_textField.pack()
         #Vbus Label
         self.vBus_label = tk.Label(self.cell_frame, text='Vbus', font=('bold'))
         self.vBus_label.pack()
@@ -231,54 +233,9 @@ class SerialMonitor:
         #############################
 
         ############### TEMPERATURE
-        #Temperature 0 label
-        self.temp0_label = ttk.Label(self.temp_frame, text='Temperature 1')
-        self.temp0_label.pack()
-        #Temperature 0 scrollable text
-        self.temp0_textField = tk.Label(self.temp_frame, height=1, width=5)
-        self.temp0_textField.pack()
-        #Temperature 1 label
-        self.temp0_label = ttk.Label(self.temp_frame, text='Temperature 2')
-        self.temp0_label.pack()
-        #Temperature 1 scrollable text
-        self.temp1_textField = tk.Label(self.temp_frame, height=1, width=5)
-        self.temp1_textField.pack()
-        #Temperature 2 label
-        self.temp0_label = ttk.Label(self.temp_frame, text='Temperature 3')
-        self.temp0_label.pack()
-        #Temperature 2 scrollable text
-        self.temp2_textField = tk.Label(self.temp_frame, height=1, width=5)
-        self.temp2_textField.pack()
-        #Temperature 3 label
-        self.temp0_label = ttk.Label(self.temp_frame, text='Temperature 4')
-        self.temp0_label.pack()
-        #Temperature 3 scrollable text
-        self.temp3_textField = tk.Label(self.temp_frame, height=1, width=5)
-        self.temp3_textField.pack()
-        #Temperature 4 label
-        self.temp0_label = ttk.Label(self.temp_frame, text='Temperature 5')
-        self.temp0_label.pack()
-        #Temperature 4 scrollable text
-        self.temp4_textField = tk.Label(self.temp_frame, height=1, width=5)
-        self.temp4_textField.pack()
-        #Temperature 5 label
-        self.temp0_label = ttk.Label(self.temp_frame, text='Temperature 6')
-        self.temp0_label.pack()
-        #Temperature 5 scrollable text
-        self.temp5_textField = tk.Label(self.temp_frame, height=1, width=5)
-        self.temp5_textField.pack()
-        #Temperature 6 label
-        self.temp0_label = ttk.Label(self.temp_frame, text='Temperature 7')
-        self.temp0_label.pack()
-        #Temperature 6 scrollable text
-        self.temp6_textField = tk.Label(self.temp_frame, height=1, width=5)
-        self.temp6_textField.pack()
-        #Temperature 7 label
-        self.temp0_label = ttk.Label(self.temp_frame, text='Temperature 8')
-        self.temp0_label.pack()
-        #Temperature 7 scrollable text
-        self.temp7_textField = tk.Label(self.temp_frame, height=1, width=5)
-        self.temp7_textField.pack()
+        #One row per sensor
+        self.temp_table = CellTable(self.temp_frame, 'Temperature')
+        self.temp_table.pack()
         #Temperature Gradient label
         self.tempGrad_label = ttk.Label(self.temp_frame, text='Temperature Gradient', font=('bold'))
         self.tempGrad_label.pack()
@@ -294,54 +251,9 @@ class SerialMonitor:
         ###################
 
         ############## SOC
-        #SOC 1 Label
-        self.soc0_label = ttk.Label(self.soc_frame, text='SOC 1')
-        self.soc0_label.pack()
-        #SOC 1 scrollable text
-        self.soc0_textField = tk.Label(self.soc_frame, height=1, width=10)
-        self.soc0_textField.pack()
-        #SOC 2 Label
-        self.soc1_label = ttk.Label(self.soc_frame, text='SOC 2')
-        self.soc1_label.pack()
-        #SOC 2 scrollable text
-        self.soc1_textField = tk.Label(self.soc_frame, height=1, width=10)
-        self.soc1_textField.pack()
-        #SOC 3 Label
-        self.soc2_label = ttk.Label(self.soc_frame, text='SOC 3')
-        self.soc2_label.pack()
-        #SOC 3 scrollable text
-        self.soc2_textField = tk.Label(self.soc_frame, height=1, width=10)
-        self.soc2_textField.pack()
-        #SOC 4 Label
-        self.soc3_label = ttk.Label(self.soc_frame, text='SOC 4')
-        self.soc3_label.pack()
-        #SOC 4 scrollable text
-        self.soc3_textField = tk.Label(self.soc_frame, height=1, width=10)
-        self.soc3_textField.pack()
-        #SOC 5 Label
-        self.soc4_label = ttk.Label(self.soc_frame, text='SOC 5')
-        self.soc4_label.pack()
-        #SOC 5 scrollable text
-        self.soc4_textField = tk.Label(self.soc_frame, height=1, width=10)
-        self.soc4_textField.pack()
-        #SOC 6 Label
-        self.soc5_label = ttk.Label(self.soc_frame, text='SOC 6')
-        self.soc5_label.pack()
-        #SOC 6 scrollable text
-        self.soc5_textField = tk.Label(self.soc_frame, height=1, width=10)
-        self.soc5_textField.pack()
-        #SOC 7 Label
-        self.soc6_label = ttk.Label(self.soc_frame, text='SOC 7')
-        self.soc6_label.pack()
-        #SOC 7 scrollable text
-        self.soc6_textField = tk.Label(self.soc_frame, height=1, width=10)
-        self.soc6_textField.pack()
-        #SOC 8 Label
-        self.soc7_label = ttk.Label(self.soc_frame, text='SOC 8')
-        self.soc7_label.pack()
-        #SOC 8 scrollable text
-        self.soc7_textField = tk.Label(self.soc_frame, height=1, width=10)
-        self.soc7_textField.pack()
+        #One row per cell
+        self.soc_table = CellTable(self.soc_frame, 'SOC', 10)
+        self.soc_table.pack()
         ################################
 
         ##### TIME INFORMATION
@@ -383,6 +295,18 @@ class SerialMonitor:
         self.log_button = ttk.Button(self.log_frame, text='Set', command=self.set_deltaT)
         self.log_button.pack()
 
+        #Reader -> GUI queue depth / high water mark and dropped lines
+        self.queue_label = tk.Label(self.log_frame, text='Queue 0/0, dropped 0', font=('Arial', 8))
+        self.queue_label.pack()
+
+        self.performance_button = ttk.Button(self.log_frame, text='Performance', command=lambda: self.performance.show())
+        self.performance_button.pack()
+
+        #XML export progress, set by the export thread and shown by poll_queue
+        self.export_bar = ttk.Progressbar(self.log_frame, maximum=100, length=80)
+        self.export_bar.pack()
+        self.export_progress = None
+
         #All export buttons
         self.export_txt_button = ttk.Button(self.fTable, text="Export as TXT", command=self.export_txt, state=tk.DISABLED)
         self.export_txt_button.grid(row=1, column=4, sticky='nsew', ipady=10)
@@ -397,6 +321,8 @@ class SerialMonitor:
         #Output BMS readouts into textfield
         self.log_text = scrolledtext.ScrolledText(self.fTable, wrap=tk.WORD, width=80, height=20)
         self.log_text.grid(row=3, column=5, columnspan=3, sticky='nsew', pady=12)
+        #Batched inserts, trimmed to the latest lines
+        self.console = LogConsole(self.log_text)
 
         #Error log Readout textfield and label
         self.errorLog_label = tk.Label(self.error_frame, height=1, width=10, text='Error Codes', font=('bold'))
@@ -425,7 +351,8 @@ class SerialMonitor:
             
     def populate_ports(self):
         ports = [port.device for port in serial.tools.list_ports.comports()]
-        self.port_combobox = ttk.Combobox(self.fTable, values=ports, state="readonly")
+        #Editable so virtual ports (e.g. a bms_replay.py --pty) can be typed in
+        self.port_combobox = ttk.Combobox(self.fTable, values=ports)
         self.port_combobox.set('COM3')
         self.port_combobox.grid(row=1, column=0, sticky='nsew')
 
@@ -433,215 +360,94 @@ class SerialMonitor:
         port = self.port_combobox.get()
         baud = int(self.baud_combobox.get())
         try:
-            self.ser = Serial(port, baud, timeout=1)
-            self.log_text.delete(1.0, tk.END)
-            self.log_text.insert(tk.END, f"Connected to {port} at {baud} baud\n")
+            self.engine.start(port, baud)
+            self.console.clear()
+            self.log(f"Connected to {port} at {baud} baud\n")
             self.disconnect_button["state"] = tk.NORMAL
             self.connect_button["state"] = tk.DISABLED
             self.export_txt_button["state"] = tk.NORMAL
             self.export_csv_button["state"] = tk.NORMAL
             self.export_xml_button["state"] = tk.NORMAL
-
-            self.connection_active = True
-
-            self.thread = threading.Thread(target=self.read_from_port)
-            self.thread.start()
-            self.t_ref = time.time()
         except Exception as e:
-            self.log_text.insert(tk.END, f"Error: {str(e)}\n")
+            self.log(f"Error: {str(e)}\n")
 
     def disconnect(self):
-        self.connection_active = False  # Set the flag to False to stop the reading thread
-        if hasattr(self, 'ser') and self.ser.is_open:
-            self.ser.close()
+        self.engine.stop()
         self.connect_button["state"] = tk.NORMAL
         self.disconnect_button["state"] = tk.DISABLED
         self.export_txt_button["state"] = tk.DISABLED
         self.export_csv_button["state"] = tk.DISABLED
         self.export_xml_button["state"] = tk.DISABLED
-        self.log_text.insert(tk.END, "Disconnected\n")
-
-    def read_from_port(self):
-        while self.connection_active:  # Check the flag in the reading loop
-                try:
-                    line = self.ser.readline().decode("utf-8")
-                    lineCopy = line
-                    lineCopy = lineCopy.replace('\r', '')
-                    lineCopy = lineCopy.replace('\n', '')
-                    lineCopy = lineCopy.split(' ')
-                    if line:
-                        self.populate_cells(lineCopy) #Passes each line into a function to check if the line contains desired information
-                        self.log_text.insert(tk.END, str(datetime.now().strftime('%Y-%m-%d %H:%M:%S')) + ': ' + line)
-                        self.log_text.see(tk.END)
-                except Exception as e:
-                    if self.connection_active:  # Only log errors if the connection is still active
-                        self.log_text.insert(tk.END, f"Error reading from port: {str(e)}\n")
-                        continue
-                    #break
+        self.log("Disconnected\n")
+
+    def poll_queue(self):
+        #Runs on the Tk main loop once per frame and applies everything the reader queued
+        carry, items = self.queue.drain(limit=5000)
+        self.bindings.update(carry)
+        log_lines = []
+        for stamp, line, changes in items:
+            if changes:
+                self.bindings.update(changes)
+            if stamp is None:
+                log_lines.append(line)
+            elif line is not None:
+                #Binary frames have no line to show
+                log_lines.append(stamp + ': ' + line)
+        frames = self.frames
+        while frames:
+            frame = frames.popleft()
+            if frame.schema is not self.pack_schema:
+                #New cells or sensors: add their rows and paint what is known of them
+                self.pack_schema = frame.schema
+                added = self.bindings.bind_pack(self, frame.schema)
+                self.bindings.update([(field, frame.values.get(field)) for field in added])
+            if self.plot is not None:
+                self.plot.add(frame.fresh(), frame.monotonic)
+        self.update_data()
+        self.show_alarms()
+        self.console.extend(log_lines)
+        self.console.flush()
+        stats = self.queue.stats()
+        engine = self.engine
+        queue_text = (f"Queue {stats['depth']}/{stats['high_water']}, dropped {stats['dropped']}, "
+                      f"{engine.byte_rate:.0f} B/s, framing errors {engine.decoder.framing_errors}")
+        if queue_text != self.queue_label['text']:
+            self.queue_label.configure(text=queue_text)
+        progress = self.export_progress
+        if progress is not None and progress != self.export_bar['value']:
+            self.export_bar['value'] = progress
+        self.master.after(FRAME_MS, self.poll_queue)
 
     def set_deltaT(self):
             try:
-                input_val = int(self.log_input.get(1.0, "end-1c"))
-                self.delta_t = input_val
-                self.log_text.insert(tk.END, "Logging data every: " + str(self.delta_t) + ' seconds\n')
-                self.log_text.see(tk.END)
+                input_val = float(self.log_input.get(1.0, "end-1c"))
+                if input_val < 0:
+                    raise ValueError("interval can't be negative")
+                self.engine.delta_t = input_val
+                self.log("Logging data every: " + str(self.engine.delta_t) + ' seconds\n')
             except Exception as e:
-                self.log_text.insert(tk.END, f"Value must be an integer: {str(e)}\n")
-                self.log_text.see(tk.END)
-
-    def populate_cells(self, line: list):
-        self.cells_update['Timestamp'] = datetime.now().strftime("%m-%d-%y-%H:%M:%S")
-
-        if (("cell" in line) and ("volt" in line) and (not "dev" in line) and (not "pack" in line)):
-            self.cells_update['volt' + line[1]] = line[3]
-        elif (('mean' in line) and ('cell' in line) and ('voltage' in line)):
-            self.cells_update['mean_cell_voltage'] = line[7]
-            self.cells_update['pack_volt'] = line[3]
-        elif ("term" in line):
-            self.cells_update['term_volt'] = line[2]
-        elif ("drain" in line):
-            self.cells_update['drain_volt'] = line[2]
-        elif (("current" in line) and (not 'Charging' in line)):
-            self.cells_update['current'] = line[2]
-        elif (("soc" in line) and (not "zp" in line) and (not "total" in line)):
-            self.cells_update[line[0] + line[1]] = line[3]
-        elif (("total" in line) and ("soc" in line) and (not 'volt' in line)):
-            self.cells_update['total_soc'] = line[2]
-            self.cells_update['time_remaining'] = line[7]
-            self.cells_update['capacity'] = line[4]
-        elif ('deviation' in line):
-            self.cells_update['temperature_gradient'] = line[3]
-            self.cells_update['mean_temp'] = line[6]
-        elif ('Vsafe' in line):
-            self.cells_update['Vsafe'] = line[1].partition('=')[2]
-        elif ('Charging' in line):
-            self.cells_update['Charging_Mode'] = line[2]
-            self.cells_update['max_current'] = line[5].partition('=')[2]
-            self.cells_update['Vbus'] = line[3].partition('=')[2]
-        elif ("adc" in line):
-            self.cells_update[line[0] + line[1]] = line[3]
-        elif ('DTC' in line):
-            self.cells_update['Error_Codes'] = line[1]
-        #Updating global cells dictionary with freshly grabbed information
-        if not (self.cells == self.cells_update):
-            self.cells.update(self.cells_update)
-            self.update_data()
-        #If self.cells has all of the data needed, start writing to log
-        if len(self.cells) >= 40:
-            self.write_to_parsed_log()
+                self.log(f"Value must be a number of seconds: {str(e)}\n")
 
     def update_data(self):
-        #Check that self.cells is unempty
-        if self.cells:
-            #Live update of the temperature
-            if 'adc0' in self.cells:
-                self.temp0_textField.configure(text=self.cells["adc0"])
-            if 'adc1' in self.cells:
-                self.temp1_textField.configure(text=self.cells["adc1"])
-            if 'adc2' in self.cells:
-                self.temp2_textField.configure(text=self.cells["adc2"])
-            if 'adc3' in self.cells:
-                self.temp3_textField.configure(text=str(self.cells["adc3"]))
-            if 'adc4' in self.cells:
-                self.temp4_textField.configure(text=str(self.cells["adc4"]))
-            if 'adc5' in self.cells:
-                self.temp5_textField.configure(text=str(self.cells["adc5"]))
-            if 'adc6' in self.cells:
-                self.temp6_textField.configure(text=str(self.cells["adc6"]))
-            if 'adc7' in self.cells:
-                self.temp7_textField.configure(text=str(self.cells["adc7"]))
-            if 'mean_temp' in self.cells:
-                self.meanTemp_textField.configure(text=str(self.cells["mean_temp"]))
-            if 'temperature_gradient' in self.cells:
-                self.tempGrad_textField.configure(text=str(self.cells["temperature_gradient"]))
-
-            #Live update of the voltage
-            if 'volt0' in self.cells:
-                self.v0_textField.configure(text=int(self.cells["volt0"])/10000)
-            if 'volt1' in self.cells:
-                self.v1_textField.configure(text=int(self.cells["volt1"])/10000)
-            if 'volt2' in self.cells:
-                self.v2_textField.configure(text=int(self.cells["volt2"])/10000)
-            if 'volt3' in self.cells:
-                self.v3_textField.configure(text=int(self.cells["volt3"])/10000)
-            if 'volt4' in self.cells:
-                self.v4_textField.configure(text=int(self.cells["volt4"])/10000)
-            if 'volt5' in self.cells:
-                self.v5_textField.configure(text=int(self.cells["volt5"])/10000)
-            if 'volt6' in self.cells:
-                self.v6_textField.configure(text=int(self.cells["volt6"])/10000)
-            if 'volt7' in self.cells:
-                self.v7_textField.configure(text=int(self.cells["volt7"])/10000)
-            if 'mean_cell_voltage' in self.cells:
-                self.meanVoltage_textField.configure(text=int(self.cells["mean_cell_voltage"])/1000)
-            if 'pack_volt' in self.cells:
-                self.packVoltage_textField.configure(text=int(self.cells["pack_volt"])/10000)
-            if 'term_volt' in self.cells:
-                self.termVolt_textField.configure(text=int(self.cells["term_volt"])/10000)
-            if 'drain_volt' in self.cells:
-                self.drainVolt_textField.configure(text=int(self.cells["drain_volt"])/10000)
-            if 'Vsafe' in self.cells:
-                self.vSafe_textField.configure(text=int(self.cells["Vsafe"])/1000)
-            if 'Vbus' in self.cells:
-                self.vBus_textField.configure(text=int(self.cells["Vbus"])/10000)
-
-            #Live update of the current
-            if 'current' in self.cells:
-                self.c0_textField.configure(text=str(self.cells["current"]))
-            if 'max_current' in self.cells:
-                self.maxCurr_textField.configure(text=str(self.cells["max_current"]))
-            #Live update of the SOC
-            if 'soc0' in self.cells:
-                self.soc0_textField.configure(text=int(self.cells['soc0'])/10)
-            if 'soc1' in self.cells:
-                self.soc1_textField.configure(text=int(self.cells["soc1"])/10)
-            if 'soc2' in self.cells:
-                self.soc2_textField.configure(text=int(self.cells["soc2"])/10)
-            if 'soc3' in self.cells:
-                self.soc3_textField.configure(text=int(self.cells["soc3"])/10)
-            if 'soc4' in self.cells:
-                self.soc4_textField.configure(text=int(self.cells["soc4"])/10)
-            if 'soc5' in self.cells:
-                self.soc5_textField.configure(text=int(self.cells["soc5"])/10)
-            if 'soc6' in self.cells:
-                self.soc6_textField.configure(text=int(self.cells["soc6"])/10)
-            if 'soc7' in self.cells:
-                self.soc7_textField.configure(text=int(self.cells["soc7"])/10)
-            if 'total_soc' in self.cells:
-                self.packSOC_textField.configure(text=int(self.cells["total_soc"])/10)
-
-            #Live update of Total Capacity
-            if 'capacity' in self.cells:
-                self.packCap_textField.configure(text=int(self.cells["capacity"])/10000)
-            #Live update of time remaining
-            if 'time_remaining' in self.cells:
-                self.timeRem_textField.configure(text=int(self.cells["time_remaining"])/10000)
-            #Live update of charging mode
-            if 'Charging_Mode' in self.cells:
-                self.chargeMode_textField.configure(text=str(self.cells["Charging_Mode"]))
-
-        #Error Code Live Update
-            if 'Error_Codes' in self.cells:
-                self.errorLog.delete('1.0', tk.END)
-                self.errorLog.insert(tk.END, self.cells['Error_Codes'])
-                self.errorLog.see(tk.END)
-
-    #Writes parsed data into a log file
-    def write_to_parsed_log(self):
-        if self.firstLog_Flag == True:
-            self.csv_header = [key for key in self.cells.keys()]
-            self.parse_data.extend(self.csv_header)
-            self.parse_data.append("\n")
-            self.firstLog_Flag = False
-        if (time.time() - self.t_ref) > self.delta_t:
-            self.parse_data.extend([value for value in self.cells.values()])
-            self.parse_data.append("\n")
-            self.t_ref = time.time()
+        #Repaints only the widgets whose value changed since the last frame
+        self.bindings.flush()
+
+    def show_alarms(self):
+        #Error Code Live Update, only redrawn when an alarm or DTC changed
+        alarms = self.engine.alarms
+        if alarms.version == self.alarms_shown:
+            return
+        self.alarms_shown = alarms.version
+        summary = alarms.summary
+        self.error_codes = {name[4:] for name, _ in summary if name.startswith('DTC ')}
+        text = ''.join(f"{datetime.fromtimestamp(since).strftime('%H:%M:%S')} {name}\n" for name, since in summary)
+        self.errorLog.delete('1.0', tk.END)
+        self.errorLog.insert(tk.END, text or 'None')
+        self.errorLog.see(tk.END)
 
     def plot_animate(self):
         navFrame = tk.LabelFrame(self.fTable, bd=3, padx=10, pady=10)
         navFrame.pack_propagate(False)
-        plot1 = fig.add_subplot(111)
         canvas = FigureCanvasTkAgg(fig, master = self.fTable)
         canvas.draw()
         canvas.get_tk_widget().grid(row=4,column=2, columnspan=4, pady=10, sticky='ns', padx=20)
@@ -649,44 +455,67 @@ class SerialMonitor:
         toolbar.update()
         navFrame.grid(row=4,column=0, sticky='nsew', pady=10, columnspan=2)
 
-        xar = []
-        yar = []
-        self.plot_data = self.parse_data
-        for data in self.plot_data:
-            if isinstance(data, datetime):
-                xar.append(data)
-            elif isinstance(data, int):
-                yar.append(data)
-                
-        plot1.clear()
-        plot1.plot(xar,yar)
+        #Live cell voltage / temperature / current / SOC plot, redrawn with blitting
+        self.plot = LivePlot(fig)
+        self.plot.start()
+        #Times the plot's stages if instrumentation was switched on before it existed
+        self.profiler.refresh()
+
+    def log(self, message):
+        #Console message from the GUI itself, also kept in the raw log for exports
+        self.console.write(message)
+        if self.engine.raw_log is not None:
+            self.engine.raw_log.write(message)
 
     def export_txt(self):
-        data = self.log_text.get(1.0, tk.END)
+        #Copies the raw log on disk, the console itself only holds the latest lines
+        raw_log = self.engine.raw_log
+        raw_log.pump()
         filename = f"serial_log_{datetime.now().strftime('%Y%m%d%H%M%S')}.txt"
-        with open(filename, "w") as file:
-            file.write(data)
-        self.log_text.insert(tk.END, f"Log exported as TXT: {filename}\n")
+        threading.Thread(target=self.copy_raw_log, args=(list(raw_log.paths), filename), daemon=True).start()
+
+    def copy_raw_log(self, paths, filename):
+        #Runs on a worker thread, reports back through the queue
+        try:
+            with open(filename, "wb") as file:
+                for path in paths:
+                    with open(path, "rb") as raw:
+                        shutil.copyfileobj(raw, file)
+            self.engine.report(f"Log exported as TXT: {filename}\n")
+        except OSError as e:
+            self.engine.report(f"TXT export failed: {str(e)}\n")
 
     def export_csv(self):
-        data = ' '.join(self.parse_data)
-        filename = f"serial_log_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
-        with open(f"CSV Exports/{filename}", "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerows([line.split() for line in data.splitlines()])
-        self.log_text.insert(tk.END, f"Log exported as CSV: {filename}\n")
+        #The session is already being streamed to disk, exporting only flushes it
+        logger = self.engine.logger
+        logger.pump()
+        if logger.paths:
+            filenames = ', '.join(os.path.basename(path) for path in logger.paths)
+            self.log(f"Log exported as CSV: {filenames}\n")
+        else:
+            self.log("Nothing logged yet, CSV will be written once data arrives\n")
 
     def export_xml(self):
-        data = self.log_text.get(1.0, tk.END)
+        #Streams the raw log on disk into XML on a worker thread
+        if self.export_progress is not None and self.export_progress < 100:
+            self.log("XML export already running\n")
+            return
+        raw_log = self.engine.raw_log
+        raw_log.pump()
         filename = f"serial_log_{datetime.now().strftime('%Y%m%d%H%M%S')}.xml"
-        root = ET.Element("LogData")
-        lines = data.splitlines()
-        for line in lines:
-            entry = ET.SubElement(root, "Entry")
-            ET.SubElement(entry, "Data").text = line
-        tree = ET.ElementTree(root)
-        tree.write(filename)
-        self.log_text.insert(tk.END, f"Log exported as XML: {filename}\n")
+        self.export_progress = 0
+        threading.Thread(target=self.write_xml, args=(list(raw_log.paths), filename), daemon=True).start()
+
+    def write_xml(self, paths, filename):
+        #Runs on a worker thread, reports back through the queue
+        def progress(done, total):
+            self.export_progress = 100 * done / total if total else 100
+        try:
+            entries = export_xml(paths, filename, progress)
+            self.engine.report(f"Log exported as XML: {filename} ({entries} entries)\n")
+        except OSError as e:
+            self.engine.report(f"XML export failed: {str(e)}\n")
+        self.export_progress = 100
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,63 @@
+import pytest
+
+from bms_alarms import AlarmEngine, check_rule
+from bms_frames import Frame
+
+RULE = ('hot', 'temp_max', 'above', 60, 55, 5.0)
+
+
+def frame(second, **values):
+    return Frame(second, 1000 + second, float(second), values, frozenset(), True, ())
+
+
+def names(events):
+    return [(kind, name) for _, kind, name, _ in events]
+
+
+def test_debounce_and_hysteresis():
+    alarms = AlarmEngine([RULE])
+    assert alarms.check(frame(0, temp_max=61)) == []
+    #Dropping back before the debounce ran out cancels it
+    assert alarms.check(frame(2, temp_max=50)) == []
+    assert alarms.check(frame(3, temp_max=61)) == []
+    assert names(alarms.check(frame(8, temp_max=62))) == [('raised', 'hot')]
+    #Between the clear and trip levels the alarm stays up
+    assert alarms.check(frame(20, temp_max=57)) == []
+    assert alarms.check(frame(30, temp_max=54)) == []
+    assert names(alarms.check(frame(35, temp_max=54))) == [('cleared', 'hot')]
+    assert alarms.active_alarms() == []
+
+
+def test_rate_rule():
+    alarms = AlarmEngine([('rise', 'temp_max', 'rate_above', 5, 2, 0.0)])
+    alarms.check(frame(0, temp_max=20))
+    #+10 in 60 s
+    assert names(alarms.check(frame(60, temp_max=30))) == [('raised', 'rise')]
+
+
+def test_error_codes():
+    alarms = AlarmEngine([])
+    assert names(alarms.check(frame(0, Error_Codes='8,12'))) == [('raised', 'DTC 12'), ('raised', 'DTC 8')]
+    assert names(alarms.check(frame(1, Error_Codes='12'))) == [('cleared', 'DTC 8')]
+    assert [name for name, _ in alarms.active_alarms()] == ['DTC 12']
+    assert names(alarms.check(frame(2, Error_Codes='0'))) == [('cleared', 'DTC 12')]
+
+
+def test_event_texts_are_not_parsed_as_bms_lines():
+    from bms_parser import LineParser
+
+    parser = LineParser()
+    alarms = AlarmEngine([('over', 'current', 'above', 100, 50, 0.0)])
+    events = alarms.check(frame(0, current=200, Error_Codes='8'))
+    assert len(events) == 2
+    for _, _, _, text in events:
+        assert parser.parse_line(text) == []
+
+
+def test_bad_rules():
+    with pytest.raises(ValueError):
+        check_rule(('x', 'temp_max', 'above', 60, 65, 1.0))
+    with pytest.raises(ValueError):
+        check_rule(('x', 'Charging_Mode', 'above', 1, 0, 1.0))
+    with pytest.raises(ValueError):
+        check_rule(('x', 'temp_max', 'sideways', 1, 0, 1.0))
@@ -0,0 +1,47 @@
+import csv
+import time
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from bms_analysis import analyze, load_csv
+from bms_columnar import CSV_TIMESTAMP_FORMAT
+from bms_parser import make_fields
+
+START = int(time.mktime(datetime(2024, 8, 8, 13, 40).timetuple()))
+
+
+def write_log(path, cells, rows=10):
+    fields = make_fields(cells, cells)
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(['Timestamp'] + fields)
+        for row in range(rows):
+            record = {field: 0 for field in fields}
+            for cell in range(cells):
+                record['volt' + str(cell)] = 33000
+                record['adc' + str(cell)] = 250
+                record['soc' + str(cell)] = 800
+            #The last cell is the weakest and its sensor the hottest
+            record['volt' + str(cells - 1)] = 32000
+            record['adc' + str(cells - 1)] = 300
+            record['soc' + str(cells - 1)] = 800 - row
+            record['Charging_Mode'] = 'CC'
+            stamp = datetime.fromtimestamp(START + row).strftime(CSV_TIMESTAMP_FORMAT)
+            writer.writerow([stamp] + [record[field] for field in fields])
+
+
+@pytest.mark.parametrize('cells', [8, 16, 24])
+def test_every_cell_is_analysed(tmp_path, cells):
+    path = tmp_path / "serial_log_20240808134000.csv"
+    write_log(path, cells)
+    result = analyze(load_csv(str(path)))
+    assert result['cells'] == cells and result['sensors'] == cells
+    assert result['weakest_cell'] == cells - 1
+    assert result['imbalance_V']['max'] == pytest.approx(0.1)
+    assert result['temp_spread']['max'] == 50
+    assert result['temp_max'] == 300
+    assert len(result['soc_drift_pct']) == cells
+    assert result['soc_drift_pct'][-1] < 0
@@ -0,0 +1,33 @@
+import csv
+import time
+from datetime import datetime
+
+from bms_catalog import build_manifest, query
+from bms_columnar import CSV_TIMESTAMP_FORMAT
+
+START = int(time.mktime(datetime(2024, 8, 8, 13, 40).timetuple()))
+
+
+def write_log(path, rows, start=START, fields=('volt0', 'current')):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(['Timestamp', *fields])
+        for row in range(rows):
+            stamp = datetime.fromtimestamp(start + row).strftime(CSV_TIMESTAMP_FORMAT)
+            writer.writerow([stamp] + [row] * len(fields))
+
+
+def test_query_reads_only_the_range(tmp_path):
+    write_log(tmp_path / "serial_log_20240808134000.csv", 2000)
+    write_log(tmp_path / "serial_log_20240808150000.csv", 10, start=START + 7200)
+    rows = list(query(str(tmp_path), START + 600, START + 610, ['volt0']))
+    assert [stamp for stamp, _ in rows] == list(range(START + 600, START + 610))
+    assert [values['volt0'] for _, values in rows] == [str(value) for value in range(600, 610)]
+
+
+def test_rollups_are_not_sessions(tmp_path):
+    write_log(tmp_path / "serial_log_20240808134000.csv", 100)
+    write_log(tmp_path / "serial_log_1s_20240808134000.csv", 100, fields=('volt0', 'volt0_min'))
+    manifest = build_manifest(str(tmp_path))
+    assert list(manifest) == ["serial_log_20240808134000.csv"]
+    assert len(list(query(str(tmp_path), START, START + 10, ['volt0']))) == 10
@@ -0,0 +1,116 @@
+import csv
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from bms_columnar import CSV_TIMESTAMP_FORMAT, TIMESTAMP
+from bms_convert import PART_SUFFIX, Checkpoint, convert_file, csv_rows, find_exports, plan, txt_rows
+from bms_metrics import DERIVED_FIELDS
+from bms_parser import make_fields
+from bms_replay import TXT_STAMP_FORMAT
+from bms_synth import frame_lines, synthetic_records
+
+START = int(time.mktime(datetime(2024, 8, 8, 13, 40).timetuple()))
+#Derived fields that don't depend on the time between rows
+INSTANT = ['cell_spread', 'min_cell_volt', 'max_cell_volt', 'weakest_cell', 'pack_power', 'temp_max', 'hottest_sensor']
+
+
+def records(count=20):
+    return list(synthetic_records(count))
+
+
+def write_csv(path, rows, fields):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow([TIMESTAMP] + fields)
+        for index, record in enumerate(rows):
+            stamp = datetime.fromtimestamp(START + index).strftime(CSV_TIMESTAMP_FORMAT)
+            writer.writerow([stamp] + [record.get(field) for field in fields])
+
+
+def write_txt(path, rows):
+    with open(path, "w", newline="") as file:
+        for index, record in enumerate(rows):
+            stamp = datetime.fromtimestamp(START + index).strftime(TXT_STAMP_FORMAT)
+            for line in frame_lines(record):
+                file.write(f"{stamp}: {line}")
+
+
+def read(reader, path):
+    fields, rows = reader(str(path))
+    return fields, [(stamp, dict(zip(fields, values))) for stamp, values in rows]
+
+
+def test_column_order_is_normalized(tmp_path):
+    fields = make_fields(8, 8)
+    write_csv(tmp_path / "a.csv", records(), fields)
+    write_csv(tmp_path / "b.csv", records(), list(reversed(fields)))
+    assert read(csv_rows, tmp_path / "a.csv") == read(csv_rows, tmp_path / "b.csv")
+
+
+def test_csv_gets_derived_fields_like_txt(tmp_path):
+    write_csv(tmp_path / "serial_log_1.csv", records(), make_fields(8, 8))
+    write_txt(tmp_path / "serial_log_1.txt", records())
+    csv_fields, from_csv = read(csv_rows, tmp_path / "serial_log_1.csv")
+    txt_fields, from_txt = read(txt_rows, tmp_path / "serial_log_1.txt")
+    assert csv_fields == txt_fields
+    assert csv_fields[-len(DERIVED_FIELDS):] == DERIVED_FIELDS
+    assert len(from_csv) == len(from_txt) == 20
+    for (csv_stamp, csv_values), (txt_stamp, txt_values) in zip(from_csv, from_txt):
+        assert csv_stamp == txt_stamp
+        assert csv_values['cell_spread'] is not None
+        assert {field: csv_values[field] for field in INSTANT} == {field: txt_values[field] for field in INSTANT}
+        assert csv_values['volt3'] == txt_values['volt3']
+
+
+def test_logged_derived_columns_are_kept(tmp_path):
+    rows = records()
+    for record in rows:
+        record['cell_spread'] = 12345
+    write_csv(tmp_path / "a.csv", rows, make_fields(8, 8) + ['cell_spread'])
+    _, values = read(csv_rows, tmp_path / "a.csv")
+    assert {row['cell_spread'] for _, row in values} == {12345}
+    assert all(row['min_cell_volt'] is not None for _, row in values)
+
+
+def test_rollups_are_not_exports(tmp_path):
+    for name in ("serial_log_20240808134000.csv", "serial_log_1s_20240808134000.csv",
+                 "serial_log_60s_20240808134000_1.csv", "serial_log_20240808134000.txt"):
+        (tmp_path / name).write_text("")
+    assert [os.path.basename(path) for path in find_exports([str(tmp_path)])] == [
+        "serial_log_20240808134000.csv", "serial_log_20240808134000.txt"]
+
+
+def test_convert_file_replaces_a_stale_part(tmp_path):
+    pytest.importorskip('numpy')
+    from bms_columnar import open_session
+
+    source = tmp_path / "serial_log_1.csv"
+    write_csv(source, records(), make_fields(8, 8))
+    (_, target), = plan([str(source)])
+    os.makedirs(target + PART_SUFFIX)
+    (tmp_path / ("serial_log_1.bmscol" + PART_SUFFIX) / "junk").write_text("left over")
+    rows, _ = convert_file(str(source), target)
+    assert rows == 20
+    assert not os.path.exists(target + PART_SUFFIX)
+    session = open_session(target)
+    assert len(session) == 20
+    assert session.values('volt0') == [record['volt0'] for record in records()]
+    assert session.timestamps.tolist() == list(range(START, START + 20))
+
+
+def test_checkpoint_resumes_until_the_source_changes(tmp_path):
+    source = tmp_path / "serial_log_1.csv"
+    write_csv(source, records(), make_fields(8, 8))
+    (_, target), = plan([str(source)])
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path)
+    assert not checkpoint.finished(str(source), target)
+    rows, _ = convert_file(str(source), target)
+    checkpoint.record({'path': str(source), 'target': target, 'rows': rows, 'seconds': 0.1})
+    assert Checkpoint(path).finished(str(source), target)
+    with open(source, "a") as file:
+        file.write("\n")
+    assert not Checkpoint(path).finished(str(source), target)
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from bms_exporter import MAX_DATAGRAM, MetricsExporter, render_lines
+from bms_parser import make_fields
+
+
+def snapshot(cells):
+    values = {field: 33000 + index for index, field in enumerate(make_fields(cells, cells))}
+    values['Charging_Mode'] = 'CC'
+    values['Error_Codes'] = '0'
+    health = [('bms_lines_total', 'counter', '', 10), ('bms_queue_depth', 'gauge', '', 0)]
+    return SimpleNamespace(name="pack0", epoch=1723117200.5, values=values, health=health, line_rate=12.5), values
+
+
+def parse(point):
+    head, fields, stamp = point.decode().split(' ')
+    return head, dict(field.split('=', 1) for field in fields.split(',')), stamp
+
+
+def test_small_pack_is_one_point():
+    shot, values = snapshot(8)
+    points = render_lines([shot])
+    assert [parse(point)[0] for point in points] == ['bms,pack=pack0', 'bms_health,pack=pack0']
+    assert len(parse(points[0])[1]) == len(values)
+
+
+def test_large_pack_is_split_into_points_that_fit():
+    shot, values = snapshot(64)
+    points = render_lines([shot])
+    assert all(len(point) <= MAX_DATAGRAM for point in points)
+    bms = [parse(point) for point in points if point.startswith(b'bms,')]
+    assert len(bms) > 1
+    assert {(head, stamp) for head, _, stamp in bms} == {('bms,pack=pack0', '1723117200500000000')}
+    fields = {}
+    for _, part, _ in bms:
+        assert not set(part) & set(fields)
+        fields.update(part)
+    assert fields['volt63'] == f"{values['volt63']}i"
+    assert fields['Charging_Mode'] == '"CC"'
+    assert len(fields) == len(values)
+
+
+def test_push_keeps_datagrams_under_the_limit():
+    shot, _ = snapshot(64)
+    exporter = MetricsExporter(lambda: [])
+    sent = []
+    exporter._send = sent.append
+    exporter.push([shot, shot])
+    assert len(sent) > 2
+    assert all(len(datagram) <= MAX_DATAGRAM for datagram in sent)
+    assert b'\n'.join(sent) == b'\n'.join(render_lines([shot, shot]))
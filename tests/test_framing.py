@@ -0,0 +1,119 @@
+from bms_binary import SYNC, FrameDecoder, encode_frame
+from bms_framing import FALLBACK_BYTES, LineFramer, StreamDecoder
+from bms_parser import make_fields
+
+CELLS = 4
+SENSORS = 2
+
+
+def record(offset=0):
+    values = {field: index + offset for index, field in enumerate(make_fields(CELLS, SENSORS))}
+    values['Charging_Mode'] = 'CHG'
+    values['Error_Codes'] = '12,34'
+    return values
+
+
+def text_lines(count, start=0):
+    return ''.join(f"cell {index % CELLS + 1} volt {3300 + index}\n" for index in range(start, start + count)).encode()
+
+
+def test_round_trip():
+    frames = FrameDecoder().feed(encode_frame(record(), CELLS, SENSORS))
+    assert len(frames) == 1
+    updates = dict(frames[0])
+    assert updates['Charging_Mode'] == 'CHG'
+    assert updates['Error_Codes'] == '12,34'
+    assert frames[0][-1][0] == 'Error_Codes'
+    assert all(updates[field] == value for field, value in record().items()
+               if field not in ('Charging_Mode', 'Error_Codes'))
+
+
+def test_frames_split_across_feeds():
+    data = encode_frame(record(), CELLS, SENSORS) * 3
+    decoder = FrameDecoder()
+    frames = []
+    for index in range(len(data)):
+        frames += decoder.feed(data[index:index + 1])
+    assert len(frames) == 3
+    assert decoder.junk == 0 and not decoder.buffer
+
+
+def test_crc_error_is_counted_and_skipped():
+    good = encode_frame(record(), CELLS, SENSORS)
+    bad = bytearray(good)
+    bad[10] ^= 0xFF
+    decoder = FrameDecoder()
+    frames = decoder.feed(bytes(bad) + good)
+    assert len(frames) == 1
+    assert decoder.crc_errors == 1
+    assert decoder.frames == 1
+
+
+def test_line_framer_keeps_partial_lines():
+    framer = LineFramer()
+    assert framer.feed(b"cell 1 vo") == []
+    assert framer.feed(b"lt 3300\ncell 2") == ["cell 1 volt 3300\n"]
+    assert framer.feed(b" volt 3301\n") == ["cell 2 volt 3301\n"]
+
+
+def test_text_then_binary():
+    decoder = StreamDecoder()
+    frame = encode_frame(record(), CELLS, SENSORS)
+    lines, frames = decoder.feed(text_lines(3) + frame)
+    assert len(lines) == 3
+    assert len(frames) == 1
+    assert decoder.binary
+    assert decoder.switches == 1
+
+
+def test_sync_split_between_reads():
+    decoder = StreamDecoder()
+    frame = encode_frame(record(), CELLS, SENSORS)
+    data = text_lines(2) + frame
+    cut = data.index(SYNC) + 1
+    lines, frames = decoder.feed(data[:cut])
+    more, frames = decoder.feed(data[cut:])
+    assert len(lines + more) == 2
+    assert len(frames) == 1
+    assert decoder.binary
+
+
+def test_stray_sync_in_text_falls_back():
+    decoder = StreamDecoder()
+    data = b"cell 1 volt 3300 \xa5\x5a garbage\n" + text_lines(200)
+    lines = []
+    for index in range(0, len(data), 64):
+        lines += decoder.feed(data[index:index + 64])[0]
+    assert not decoder.binary
+    assert len(lines) == 201
+    assert lines[1:] == text_lines(200).decode().splitlines(keepends=True)
+
+
+def test_binary_then_text_falls_back():
+    #Firmware switched back to text after sending frames
+    decoder = StreamDecoder()
+    frame = encode_frame(record(), CELLS, SENSORS)
+    lines, frames = decoder.feed(frame + frame)
+    assert decoder.binary and len(frames) == 2
+    text = text_lines(200)
+    assert len(text) > FALLBACK_BYTES
+    lines = []
+    for index in range(0, len(text), 100):
+        lines += decoder.feed(text[index:index + 100])[0]
+    assert not decoder.binary
+    assert decoder.switches == 2
+    assert lines == text.decode().splitlines(keepends=True)
+    #And back to binary once frames come again
+    lines, frames = decoder.feed(frame)
+    assert decoder.binary and len(frames) == 1
+
+
+def test_frames_after_junk_stay_binary():
+    decoder = StreamDecoder()
+    frame = encode_frame(record(), CELLS, SENSORS)
+    decoder.feed(frame)
+    for _ in range(10):
+        lines, frames = decoder.feed(b"noise" * 100 + frame)
+        assert len(frames) == 1
+    assert decoder.binary
+    assert decoder.switches == 1
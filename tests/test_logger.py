@@ -0,0 +1,26 @@
+import csv
+
+from bms_logger import StreamingLogger
+
+
+def read(path):
+    with open(path, newline="") as file:
+        return list(csv.reader(file))
+
+
+def test_full_queue_keeps_the_reopen(tmp_path):
+    logger = StreamingLogger(directory=str(tmp_path), fields=['volt0'], max_pending=3)
+    logger.start(background=False)
+    for value in range(5):
+        logger.write(1723117200, {'volt0': value})
+    assert logger.dropped == 2
+    #The pack grew while the writer was behind; the marker must survive the overflow
+    logger.set_fields(['volt0', 'volt1'])
+    logger.write(1723117201, {'volt0': 10, 'volt1': 11})
+    assert logger.dropped == 3
+    logger.pump()
+    logger.write(1723117202, {'volt0': 20, 'volt1': 21})
+    logger.close()
+    first, second = logger.paths
+    assert [row[1:] for row in read(first)] == [['volt0'], ['0'], ['1'], ['2']]
+    assert [row[1:] for row in read(second)] == [['volt0', 'volt1'], ['20', '21']]
@@ -0,0 +1,52 @@
+from bms_metrics import DERIVED_FIELDS, INVALID_VOLT, FrameMetrics
+
+
+def cycle(volts, temps, pack_volt=26000, current=-2000):
+    values = {'pack_volt': pack_volt, 'current': current}
+    values.update(('volt' + str(i), volt) for i, volt in enumerate(volts))
+    values.update(('adc' + str(i), temp) for i, temp in enumerate(temps))
+    return values
+
+
+def test_cell_and_temperature_extremes():
+    metrics = FrameMetrics(cells=4, sensors=3)
+    derived = dict(metrics.compute(cycle([33200, 33100, INVALID_VOLT, 33300], [20, 25, 22]), 0.0))
+    assert list(derived) == DERIVED_FIELDS
+    #The unmeasured cell is left out
+    assert derived['min_cell_volt'] == 33100
+    assert derived['max_cell_volt'] == 33300
+    assert derived['cell_spread'] == 200
+    assert derived['weakest_cell'] == 1
+    assert derived['temp_max'] == 25
+    assert derived['hottest_sensor'] == 1
+    assert derived['pack_power'] == 26000 * -2000 // 1000
+
+
+def test_missing_values():
+    metrics = FrameMetrics(cells=2, sensors=2)
+    derived = dict(metrics.compute({'volt0': INVALID_VOLT}, 0.0))
+    assert derived['min_cell_volt'] is None
+    assert derived['weakest_cell'] is None
+    assert derived['temp_max'] is None
+    assert derived['pack_power'] is None
+    assert derived['pack_dvdt'] is None
+
+
+def test_slopes_over_the_window():
+    metrics = FrameMetrics(cells=1, sensors=1, window=30.0)
+    metrics.compute(cycle([33000], [20], pack_volt=26000), 0.0)
+    derived = dict(metrics.compute(cycle([32900], [20], pack_volt=25900), 30.0))
+    #-100 per 30 s
+    assert derived['pack_dvdt'] == -200
+    assert derived['cell_dvdt'] == -200
+    #Samples older than the window drop out, one sample has no slope
+    derived = dict(metrics.compute(cycle([32900], [20], pack_volt=25900), 61.0))
+    assert derived['pack_dvdt'] is None
+
+
+def test_resize_for_a_larger_pack():
+    metrics = FrameMetrics(cells=2, sensors=2)
+    metrics.resize(4, 4)
+    derived = dict(metrics.compute(cycle([33200, 33200, 33200, 32000], [1, 2, 3, 9]), 0.0))
+    assert derived['weakest_cell'] == 3
+    assert derived['hottest_sensor'] == 3
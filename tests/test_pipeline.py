@@ -0,0 +1,105 @@
+import threading
+from collections import deque
+
+import pytest
+
+from bms_pipeline import COALESCE, DROP_NEWEST, DROP_OLDEST, TelemetryQueue
+
+
+def item(index, updates=()):
+    return (f"stamp{index}", f"line{index}", list(updates))
+
+
+def test_drain_in_order_with_limit():
+    queue = TelemetryQueue(capacity=10)
+    for index in range(5):
+        queue.put(item(index))
+    carry, items = queue.drain(limit=3)
+    assert carry == {}
+    assert [line for _, line, _ in items] == ['line0', 'line1', 'line2']
+    assert [line for _, line, _ in queue.drain()[1]] == ['line3', 'line4']
+
+
+def test_drop_newest():
+    queue = TelemetryQueue(capacity=2, policy=DROP_NEWEST)
+    assert queue.put(item(0))
+    assert queue.put(item(1))
+    assert not queue.put(item(2))
+    assert [line for _, line, _ in queue.drain()[1]] == ['line0', 'line1']
+    assert queue.stats()['dropped'] == 1
+
+
+def test_drop_oldest():
+    queue = TelemetryQueue(capacity=2, policy=DROP_OLDEST)
+    for index in range(4):
+        queue.put(item(index, [('volt0', index)]))
+    carry, items = queue.drain()
+    assert carry == {}
+    assert [line for _, line, _ in items] == ['line2', 'line3']
+    assert queue.stats()['dropped'] == 2
+
+
+def test_coalesce_keeps_the_updates_of_dropped_items():
+    queue = TelemetryQueue(capacity=2, policy=COALESCE)
+    queue.put(item(0, [('volt0', 1), ('volt1', 1)]))
+    queue.put(item(1, [('volt0', 2)]))
+    queue.put(item(2, [('current', 5)]))
+    carry, items = queue.drain()
+    assert carry == {'volt0': 1, 'volt1': 1}
+    assert [line for _, line, _ in items] == ['line1', 'line2']
+    assert queue.stats()['coalesced'] == 1
+    assert queue.drain() == ({}, [])
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        TelemetryQueue(policy="block")
+
+
+class _Overflowing(deque):
+    #Loses its oldest item right after being measured, as when the producer
+    #overflows between drain() counting the queue and popping it
+    def __len__(self):
+        count = super().__len__()
+        if count:
+            self.popleft()
+        return count
+
+
+def test_drain_when_the_producer_pops_meanwhile():
+    queue = TelemetryQueue(capacity=8)
+    for index in range(3):
+        queue.put(item(index))
+    queue.items = _Overflowing(queue.items)
+    carry, items = queue.drain()
+    assert [line for _, line, _ in items] == ['line1', 'line2']
+
+
+class _Racing(deque):
+    #Lets the producer overflow the queue right when drain() measures it
+    def __init__(self, items, queue):
+        super().__init__(items)
+        self.queue = queue
+        self.producer = None
+
+    def __len__(self):
+        if self.producer is None:
+            self.producer = threading.Thread(target=self.queue.put, args=(item(3, [('volt0', 3)]),))
+            self.producer.start()
+            self.producer.join(0.2)
+        return super().__len__()
+
+
+def test_carry_is_never_applied_after_newer_items():
+    queue = TelemetryQueue(capacity=3, policy=COALESCE)
+    for index in range(3):
+        queue.put(item(index, [('volt0', index)]))
+    queue.items = racing = _Racing(queue.items, queue)
+    seen = []
+    for _ in range(2):
+        carry, items = queue.drain()
+        racing.producer.join()
+        seen += [carry['volt0']] if carry else []
+        seen += [dict(updates)['volt0'] for _, _, updates in items]
+    assert seen == sorted(seen)
+    assert seen[-1] == 3
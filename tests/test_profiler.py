@@ -0,0 +1,49 @@
+import matplotlib
+
+matplotlib.use('Agg')
+
+from matplotlib.figure import Figure
+
+from bms_plot import LivePlot
+from bms_profiler import GUI_STAGES, Profiler
+
+
+class Monitor:
+    #The attributes GUI_STAGES needs; the plot is created later, like plot_animate does
+    def __init__(self):
+        self.plot = None
+
+
+def test_enable_and_disable_restore_methods():
+    class Counter:
+        def step(self):
+            return 1
+
+    counter = Counter()
+    profiler = Profiler()
+    profiler.instrument(counter, [('step', 'step')])
+    profiler.enable()
+    assert counter.step() == 1
+    assert profiler.stages['step'].calls == 1
+    profiler.disable()
+    assert 'step' not in vars(counter)
+    counter.step()
+    assert profiler.stages['step'].calls == 1
+
+
+def test_plot_stage_times_animation_frames():
+    monitor = Monitor()
+    profiler = Profiler()
+    profiler.instrument(monitor, GUI_STAGES)
+    profiler.enable()
+    monitor.plot = LivePlot(Figure())
+    animation = monitor.plot.start()
+    profiler.refresh()
+    monitor.plot.add([('volt1', 3300)], now=0.0)
+    #What the animation's timer calls every frame
+    animation._func(0)
+    animation._func(1)
+    assert profiler.stages['plot'].calls == 2
+    profiler.disable()
+    animation._func(2)
+    assert profiler.stages['plot'].calls == 2
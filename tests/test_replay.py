@@ -0,0 +1,16 @@
+import glob
+
+from bms_replay import run_engine
+from bms_synth import synthetic_lines
+
+
+def test_run_engine_logs_the_whole_recording(tmp_path):
+    lines = synthetic_lines(30)
+    result = run_engine([(0.0, line.encode()) for line in lines], output=str(tmp_path))
+    assert result['lines'] == len(lines)
+    assert result['rows'] == 30
+    #Every line reached the raw log before it was closed
+    raw, = glob.glob(str(tmp_path / "raw_*"))
+    with open(raw) as file:
+        logged = [text for text in file if ': ' in text]
+    assert len(logged) >= len(lines)
@@ -0,0 +1,8 @@
+from bms_rollup import is_rollup
+
+
+def test_rollup_names():
+    assert is_rollup("CSV Exports/serial_log_1s_20240808133412.csv")
+    assert is_rollup("serial_log_60s_20240808133412_2.csv")
+    assert not is_rollup("CSV Exports/serial_log_20240808133412.csv")
+    assert not is_rollup("serial_log_20240808133412_1.csv")
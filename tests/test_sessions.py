@@ -0,0 +1,134 @@
+import glob
+import os
+
+import bms_sessions
+from fle_monitor import parse_args, run_sessions
+from bms_engine import RECONNECT_MAX, RECONNECT_MIN, AcquisitionEngine
+
+
+class Broken:
+    #A source whose every read fails, like an unplugged adapter
+    is_open = True
+
+    def __init__(self, engine=None, limit=None):
+        #Stops engine's reader after limit reads, so a reader that never pauses ends too
+        self.engine = engine
+        self.limit = limit
+        self.reads = 0
+
+    @property
+    def in_waiting(self):
+        self.reads += 1
+        if self.limit is not None and self.reads >= self.limit:
+            self.engine.connection_active = False
+        raise OSError("device disconnected")
+
+    def read(self, size=1):
+        return b''
+
+    def close(self):
+        self.is_open = False
+
+
+class Port:
+    #Stands in for serial.Serial; opening fails while Port.fail is set
+    fail = False
+
+    def __init__(self, port, baud, timeout=None):
+        if Port.fail:
+            raise OSError("no such device")
+        self.is_open = True
+        #Something the reader's selector can wait on
+        self.pipe = os.pipe()
+
+    @property
+    def in_waiting(self):
+        return 0
+
+    def read(self, size=1):
+        return b''
+
+    def fileno(self):
+        return self.pipe[0]
+
+    def close(self):
+        if self.is_open:
+            for fd in self.pipe:
+                os.close(fd)
+        self.is_open = False
+
+
+class Pauses:
+    #Stands in for engine.stopping: records the reader's waits instead of sleeping
+    #and stops the reader after a few of them
+    def __init__(self, engine, count):
+        self.engine = engine
+        self.count = count
+        self.delays = []
+
+    def wait(self, delay):
+        self.delays.append(delay)
+        if len(self.delays) >= self.count:
+            self.engine.connection_active = False
+        return False
+
+
+def test_attached_source_backs_off(tmp_path):
+    engine = AcquisitionEngine(output=str(tmp_path))
+    engine.report = lambda message: None
+    engine.ser = Broken(engine, limit=1000)
+    engine.connection_active = True
+    engine.stopping = pauses = Pauses(engine, 8)
+    engine.read_from_port()
+    assert engine.read_errors == 8
+    assert pauses.delays == [min(RECONNECT_MIN * 2 ** attempt, RECONNECT_MAX) for attempt in range(8)]
+
+
+def test_dropped_session_reopens_with_backoff(tmp_path, monkeypatch):
+    monkeypatch.setattr(bms_sessions, 'Serial', Port)
+    manager = bms_sessions.SessionManager(output=str(tmp_path))
+    session = manager.add('/dev/ttyFAKE', 115200)
+    session.engine.report = lambda message: None
+    try:
+        manager._drop(session, OSError("device disconnected"))
+        assert not session.connected
+        assert manager.read_errors == 1 and session.engine.read_errors == 1
+        assert manager._active() == []
+
+        #Not before the first wait is over
+        manager._reconnect()
+        assert not session.connected
+
+        #Failed attempts double the wait up to RECONNECT_MAX
+        Port.fail = True
+        now = session.retry_at
+        delays = []
+        for _ in range(10):
+            assert not session.reopen(now)
+            delays.append(session.delay)
+            now = session.retry_at
+        assert delays[0] == RECONNECT_MIN * 2
+        assert delays[-1] == RECONNECT_MAX
+
+        Port.fail = False
+        session.retry_at = 0.0
+        manager._reconnect()
+        assert session.connected
+        assert session.engine.reconnects == 1
+        assert session.error == ''
+        assert manager._active() == [session]
+    finally:
+        Port.fail = False
+        manager.remove('/dev/ttyFAKE')
+
+
+def test_profile_dump_has_every_pack(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(bms_sessions, 'Serial', Port)
+    args = parse_args(['--headless', '--port', '/dev/ttyA', '--port', '/dev/ttyB', '--duration', '0.1',
+                       '--status', '0', '--profile', '--rollups', '--output', str(tmp_path)])
+    assert run_sessions(args) == 0
+    dump, = glob.glob(str(tmp_path / "bms_profile_*.txt"))
+    with open(dump) as file:
+        text = file.read()
+    assert "pack0 bms_read_errors_total" in text
+    assert "pack1 bms_read_errors_total" in text